@@ -0,0 +1,142 @@
+"""Batches: same outcome as one op at a time, nothing on failure, fewer round trips.
+
+First applies random batches to both playlist implementations and
+replays each one op by op on a copy: a batch that applies must leave the
+same state and results as the ops run singly, and a batch that is
+refused must name the first op that would have failed and leave the
+playlist as it was; exits 1 on the first difference. Then times adding
+ten songs and queuing three of them through the ASGI app as 13 requests
+and as one ``POST /batch``.
+
+    python -m benchmarks.batch --runs 200 --rounds 300
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Any, Optional
+
+os.environ["PLAYLIST_METRICS"] = "0"
+
+import httpx  # noqa: E402
+
+from playlist_api import server  # noqa: E402
+from playlist_app.playlist import BatchError, CircularPlaylist, ListPlaylist  # noqa: E402
+
+
+def _random_batch(pl: Any, rng: random.Random) -> list[dict[str, Any]]:
+    ops: list[dict[str, Any]] = []
+    adds: list[int] = []
+    for i in range(rng.randint(1, 12)):
+        kind = rng.choice(("add", "add", "remove", "enqueue", "next", "previous", "favorite"))
+        if kind == "add":
+            ops.append({"op": "add", "title": f"Song {i}", "artist": "Artist", "duration_sec": rng.randint(0, 300)})
+            adds.append(i)
+        elif kind in ("next", "previous"):
+            ops.append({"op": kind})
+        elif adds and rng.random() < 0.4:
+            ops.append({"op": kind, "ref": rng.choice(adds)})
+        else:
+            # mostly songs that exist, sometimes one that never did
+            ops.append({"op": kind, "song_id": rng.randint(1, pl._next_song_id + 1), "lane": rng.choice(("next", "end"))})
+    return ops
+
+
+def _one_by_one(pl: Any, ops: list[dict[str, Any]]) -> tuple[list[Any], Optional[int]]:
+    """Results of running ``ops`` singly, and the index of the first that failed."""
+    results: list[Any] = []
+    added: dict[int, int] = {}
+    for i, op in enumerate(ops):
+        kind = op["op"]
+        song_id = added.get(op["ref"], -1) if "ref" in op else op.get("song_id")
+        if kind == "add":
+            song = pl.add_song(op["title"], op["artist"], op["duration_sec"])
+            added[i] = song.id
+            results.append(song)
+        elif kind == "next":
+            results.append(pl.next())
+        elif kind == "previous":
+            results.append(pl.previous())
+        else:
+            if kind == "enqueue":
+                done = pl.enqueue_next(song_id, op.get("lane", "end"))
+            else:
+                done = (pl.remove_song if kind == "remove" else pl.add_favorite)(song_id)
+            if done is None or done is False:
+                return results, i
+            results.append(done)
+    return results, None
+
+
+def _ids(results: list[Any]) -> list[Any]:
+    return [getattr(r, "id", r) for r in results]
+
+
+def check(seed: int, rounds: int) -> None:
+    rng = random.Random(seed)
+    for cls in (CircularPlaylist, ListPlaylist):
+        pl = cls()
+        pl.add_songs_bulk((f"Seed {i}", "Artist", 100, None) for i in range(rng.randint(0, 6)))
+        if rng.random() < 0.3:
+            pl.set_shuffle(True, seed)
+        for step in range(rounds):
+            ops = _random_batch(pl, rng)
+            before = pl.dump_state()
+            copy = cls.load_state(before)
+            want, failed = _one_by_one(copy, ops)
+            try:
+                got = pl.apply_batch(ops)
+            except BatchError as exc:
+                if exc.index != failed or pl.dump_state() != before:
+                    print(f"seed {seed} step {step}: {cls.__name__} refused at {exc.index}, expected {failed}, state kept: {pl.dump_state() == before}")
+                    sys.exit(1)
+                continue
+            if failed is not None or _ids(got) != _ids(want) or pl.dump_state() != copy.dump_state():
+                print(f"seed {seed} step {step}: {cls.__name__} batch {ops} gave {_ids(got)}, one by one {_ids(want)} (failed at {failed})")
+                sys.exit(1)
+            pl.check()
+
+
+async def timings(n: int) -> dict[str, Any]:
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        r = await client.get("/play", headers={"x-session-token": "new"})
+        headers = {"x-session-token": r.headers["set-cookie"].split(";", 1)[0].split("=", 1)[1]}
+        # songs with audio URLs skip the background preview lookups
+        song = {"title": "Song", "artist": "Artist", "duration_sec": 180, "audio_url": "https://example.com/a.mp3"}
+        single, batched = [], []
+        for _ in range(n):
+            t0 = time.perf_counter()
+            ids = [(await client.post("/songs", json=song, headers=headers)).json()["id"] for _ in range(10)]
+            for song_id in ids[:3]:
+                await client.post("/queue", json={"song_id": song_id}, headers=headers)
+            single.append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            ops = [{"op": "add", **song} for _ in range(10)] + [{"op": "enqueue", "ref": k} for k in range(3)]
+            r = await client.post("/batch", json={"ops": ops}, headers=headers)
+            batched.append(time.perf_counter() - t0)
+            r.raise_for_status()
+    return {
+        "13_requests_ms": round(statistics.median(single) * 1e3, 2),
+        "one_batch_ms": round(statistics.median(batched) * 1e3, 2),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=200)
+    ap.add_argument("--rounds", type=int, default=300)
+    ap.add_argument("--requests", type=int, default=300)
+    args = ap.parse_args()
+    for seed in range(args.runs):
+        check(seed, args.rounds)
+    print(f"{args.runs} runs x {args.rounds} batches: batches match their ops run one by one")
+    print(asyncio.run(timings(args.requests)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""Concurrency stress test for the HTTP API.
+
+Drives the ASGI app in-process with thousands of concurrent requests
+(next/previous, seeks, adds and deletes, queue edits, favorites, shuffle,
+radio, impl switches, imports, batches, undo/redo, smart playlists, plus paged and full reads) spread over a few sessions,
+while background threads mutate the same sessions under their locks and
+the journal compacts underneath. Every event also goes through the SSE
+delta encoder. Afterwards every playlist must pass its ``check()`` (ring
+links, key index, cursor, queue lanes, favorites) and a store reopened
+from disk must rebuild exactly the live state. Reports throughput,
+latency and how long single event-loop steps take, which stays small
+even while a thread sits on a session lock for ``--hold-ms`` at a time
+(the longest step is usually a garbage collection); exits 1 on any
+failure.
+
+    python -m benchmarks.concurrency --requests 20000 --clients 200
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from typing import Any
+
+import httpx
+
+from playlist_api import events, server
+from playlist_api.sessions import SessionManager
+from playlist_api.store import PlaylistStore
+
+OPS = (
+    ("next", 25),
+    ("previous", 10),
+    ("add", 10),
+    ("delete", 12),
+    ("queue", 12),
+    ("unqueue", 5),
+    ("move", 5),
+    ("fav", 4),
+    ("unfav", 2),
+    ("shuffle", 2),
+    ("radio", 1),
+    ("impl", 1),
+    ("import", 1),
+    ("songs", 2),
+    ("page", 4),
+    ("window", 2),
+    ("get_queue", 3),
+    ("history", 2),
+    ("search", 2),
+    ("seek", 2),
+    ("duration", 1),
+    ("batch", 2),
+    ("undo", 2),
+    ("redo", 1),
+    ("smart", 1),
+    ("smart_step", 3),
+    ("smart_queue", 1),
+)
+
+
+def _request(op: str, rng: random.Random, top: int) -> tuple[str, str, Any, tuple[int, ...]]:
+    """(method, url, json body or raw bytes, acceptable status codes) for one random request."""
+    song = rng.randint(1, top)
+    entry = rng.randint(1, 400)
+    if op == "next":
+        return "POST", "/next", None, (200,)
+    if op == "previous":
+        return "POST", "/previous", None, (200,)
+    if op == "add":
+        return "POST", "/songs", {"title": f"Song {song}", "artist": "Stress", "duration_sec": 60, "audio_url": "x"}, (201,)
+    if op == "delete":
+        return "DELETE", f"/songs/{song}", None, (200, 404)
+    if op == "queue":
+        return "POST", "/queue", {"song_id": song, "lane": rng.choice(("next", "end"))}, (201, 404)
+    if op == "unqueue":
+        return "DELETE", f"/queue/{entry}", None, (200, 404)
+    if op == "move":
+        return "POST", f"/queue/{entry}/move", {"index": rng.randint(0, 20)}, (200, 404)
+    if op == "fav":
+        return "POST", "/favorites", {"song_id": song}, (200, 404)
+    if op == "unfav":
+        return "DELETE", f"/favorites/{song}", None, (200,)
+    if op == "shuffle":
+        return "POST", "/shuffle", {"on": rng.random() < 0.5}, (200,)
+    if op == "radio":
+        return "POST", "/radio", {"on": rng.random() < 0.7}, (200,)
+    if op == "impl":
+        return "POST", "/impl", {"impl": rng.choice(("circular", "list"))}, (200,)
+    if op == "import":
+        rows = "".join(f"Imported {song}.{i},Stress,30,x\n" for i in range(rng.randint(1, 20)))
+        return "POST", "/songs/import?format=csv", ("title,artist,duration_sec,audio_url\n" + rows).encode(), (201,)
+    if op == "songs":
+        return "GET", "/songs", None, (200,)
+    if op == "page":
+        return "GET", f"/songs?limit=50&cursor={song}", None, (200,)
+    if op == "window":
+        return "GET", "/songs?window=5", None, (200,)
+    if op == "get_queue":
+        return "GET", "/queue?limit=20", None, (200,)
+    if op == "history":
+        return "GET", "/history?limit=20", None, (200,)
+    if op == "seek":
+        return "POST", "/seek", {"offset_sec": rng.randint(0, top * 60)}, (200, 404)
+    if op == "duration":
+        return "GET", "/duration", None, (200,)
+    if op == "batch":
+        ops = [{"op": "add", "title": f"Batched {song}", "artist": "Stress", "duration_sec": 45, "audio_url": "x"}, {"op": "enqueue", "ref": 0}]
+        ops += [{"op": rng.choice(("remove", "enqueue", "favorite")), "song_id": rng.randint(1, top)}, {"op": rng.choice(("next", "previous"))}]
+        return "POST", "/batch", {"ops": ops}, (200, 422)
+    if op in ("undo", "redo"):
+        return "POST", f"/{op}", None, (200, 409)
+    name = rng.choice(("short", "stress"))
+    if op == "smart":
+        rule = {"max_sec": 50} if name == "short" else {"artist": "stress", "title_contains": str(song % 10)}
+        return "PUT", f"/smart/{name}", rule, (200,)
+    if op == "smart_step":
+        return "POST", f"/smart/{name}/{rng.choice(('next', 'previous'))}", None, (200, 404)
+    if op == "smart_queue":
+        return "POST", f"/smart/{name}/queue", {"song_id": song}, (201, 404)
+    return "GET", f"/search?q=song+{song % 100}", None, (200,)
+
+
+def _meddle(manager: SessionManager, stop: threading.Event, seed: int, top: int) -> None:
+    # another writer on the same sessions, taking the lock from outside the event loop
+    rng = random.Random(seed)
+    while not stop.is_set():
+        for session in manager.snapshot():
+            with session.lock:
+                pl = session.active()
+                r = rng.random()
+                if r < 0.4:
+                    pl.next()
+                elif r < 0.6:
+                    pl.remove_song(rng.randint(1, top))
+                elif r < 0.8:
+                    pl.add_song("Meddled", "Thread", 10, "x")
+                else:
+                    pl.enqueue_next(rng.randint(1, top), rng.choice(("next", "end")))
+        time.sleep(0.0005)
+
+
+def _hog(manager: SessionManager, stop: threading.Event, hold: float) -> None:
+    # a slow holder of each lock in turn, like a store snapshot of a big session
+    rng = random.Random(-1)
+    while not stop.is_set():
+        session = rng.choice(manager.snapshot())
+        with session.lock:
+            time.sleep(hold)
+        time.sleep(hold)
+
+
+def _time_loop_steps(steps: list[float]) -> Any:
+    """Record how long each callback the event loop runs takes; returns an undo function."""
+    run = asyncio.events.Handle._run
+
+    def timed(handle: Any) -> None:
+        t0 = time.perf_counter()
+        run(handle)
+        steps.append(time.perf_counter() - t0)
+
+    asyncio.events.Handle._run = timed  # type: ignore[method-assign]
+    return lambda: setattr(asyncio.events.Handle, "_run", run)
+
+
+async def run(args: argparse.Namespace, data_dir: str) -> dict[str, Any]:
+    store = PlaylistStore(data_dir, compact_every=args.compact_every)
+    store.open(server.sessions)
+    frames = [0]
+
+    def on_event(session: Any, impl: Any, op: str, data: dict[str, Any]) -> None:
+        frames[0] += len(events.delta(session, impl, op, data))
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://stress", timeout=None) as client:
+        tokens = []
+        for _ in range(args.sessions):
+            # an unknown token always gets a new session
+            cookie = (await client.get("/play", headers={"x-session-token": "new"})).headers["set-cookie"]
+            token = cookie.split(";", 1)[0].split("=", 1)[1]
+            tokens.append(token)
+            rows = "".join(f"Seed {i},Stress,60,x\n" for i in range(args.songs))
+            await client.post("/songs/import?format=csv", content=b"title,artist,duration_sec,audio_url\n" + rows.encode(), headers={"x-session-token": token})
+            session = server.sessions.get(token)
+            assert session is not None
+            with session.lock:
+                session.subscribe(on_event)
+
+        top = args.songs * 2
+        stop = threading.Event()
+        threads = [threading.Thread(target=_meddle, args=(server.sessions, stop, i, top), daemon=True) for i in range(args.threads)]
+        if args.hold_ms:
+            threads.append(threading.Thread(target=_hog, args=(server.sessions, stop, args.hold_ms / 1e3), daemon=True))
+        for t in threads:
+            t.start()
+
+        rng = random.Random(args.seed)
+        names, weights = zip(*OPS)
+        latencies: list[float] = []
+        failures: list[str] = []
+
+        async def worker(n: int, wrng: random.Random) -> None:
+            for _ in range(n):
+                op = wrng.choices(names, weights)[0]
+                method, url, body, ok = _request(op, wrng, top)
+                headers = {"x-session-token": wrng.choice(tokens)}
+                t0 = time.perf_counter()
+                if isinstance(body, bytes):
+                    r = await client.request(method, url, content=body, headers=headers)
+                else:
+                    r = await client.request(method, url, json=body, headers=headers)
+                latencies.append(time.perf_counter() - t0)
+                if r.status_code not in ok:
+                    failures.append(f"{method} {url} -> {r.status_code} {r.text[:200]}")
+                # the in-process transport never waits on a socket, so yield to let requests interleave
+                await asyncio.sleep(0)
+
+        steps: list[float] = []
+        undo = _time_loop_steps(steps)
+        per_client = args.requests // args.clients
+        t0 = time.perf_counter()
+        try:
+            await asyncio.gather(*(worker(per_client, random.Random(rng.getrandbits(64))) for _ in range(args.clients)))
+        finally:
+            undo()
+        elapsed = time.perf_counter() - t0
+        stop.set()
+        for t in threads:
+            t.join()
+
+    for message in failures[:10]:
+        print(message)
+    checked = 0
+    live = {}
+    for session in server.sessions.snapshot():
+        with session.lock:
+            session.unsubscribe(on_event)
+            for impl in ("circular", "list"):
+                session.playlist(impl).check()
+                checked += 1
+            live[session.token] = session.dump_state()
+    store.close()
+
+    reopened = SessionManager(max_sessions=len(live) + 1, idle_ttl=None, playlist_options=server.sessions.playlist_options)
+    replay = PlaylistStore(data_dir)
+    replay.open(reopened)
+    diverged = [token for token, state in live.items() if (s := reopened.get(token)) is None or s.dump_state() != state]
+    replay.close()
+
+    latencies.sort()
+    steps.sort()
+    done_requests = per_client * args.clients
+    return {
+        "requests": done_requests,
+        "failed": len(failures),
+        "elapsed_sec": round(elapsed, 2),
+        "requests_per_sec": round(done_requests / elapsed),
+        "p50_ms": round(statistics.median(latencies) * 1e3, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1e3, 2),
+        "loop_step_p999_ms": round(steps[int(len(steps) * 0.999)] * 1e3, 2),
+        "longest_loop_step_ms": round(steps[-1] * 1e3, 2),
+        "sse_frames": frames[0],
+        "playlists_checked": checked,
+        "replay_diverged": len(diverged),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sessions", type=int, default=4)
+    ap.add_argument("--songs", type=int, default=500, help="songs imported into each session up front")
+    ap.add_argument("--requests", type=int, default=20_000)
+    ap.add_argument("--clients", type=int, default=200, help="concurrent request loops")
+    ap.add_argument("--threads", type=int, default=2, help="background threads mutating the same sessions")
+    ap.add_argument("--hold-ms", type=float, default=50, help="a thread holds one session lock this long at a time (0 = off)")
+    ap.add_argument("--compact-every", type=int, default=5000, help="journal records between snapshots")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    with tempfile.TemporaryDirectory() as data_dir:
+        out = asyncio.run(run(args, data_dir))
+    print(out)
+    if out["failed"] or out["replay_diverged"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
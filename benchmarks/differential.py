@@ -0,0 +1,182 @@
+"""Differential check: ListPlaylist and CircularPlaylist must agree.
+
+Runs the same random mix of operations (adds, removes, next/previous,
+jumps and seeks, queue lanes and reordering, favorites, shuffle toggles,
+undo/redo, radio, save/restore) against both
+implementations and compares every return value and the visible state
+after each step. Exits 1 with the failing seed and step on the first
+divergence, then also reports ListPlaylist timings for a few operations.
+
+    python -m benchmarks.differential --runs 200 --steps 500
+    python -m benchmarks.differential --history-cap 8 --sizes
+"""
+from __future__ import annotations
+import argparse
+import random
+import sys
+import time
+from typing import Any, Optional
+
+from playlist_app.playlist import CircularPlaylist, ListPlaylist
+
+
+def _ids(songs: Any) -> list[int]:
+    return [s.id for s in songs]
+
+
+def _state(pl: Any, probe: int) -> tuple[Any, ...]:
+    current = pl.play()
+    return (
+        current.id if current else None,
+        len(pl),
+        _ids(pl.list_songs()),
+        _ids(pl.history),
+        [(entry, lane, song.id) for entry, lane, song in pl.up_next.entries()],
+        _ids(pl.favorites),
+        _ids(pl.window(2, 3)),
+        _ids(pl.songs_after(probe, 5)),
+        pl.shuffle,
+        pl.radio,
+        pl.progress(),
+    )
+
+
+def _step(pl: Any, op: str, arg: Any) -> Any:
+    if op == "add":
+        return pl.add_song(*arg).id
+    if op == "bulk":
+        return _ids(pl.add_songs_bulk(arg))
+    if op == "remove":
+        return pl.remove_song(arg)
+    if op == "next":
+        song = pl.next()
+        return song.id if song else None
+    if op == "previous":
+        song = pl.previous()
+        return song.id if song else None
+    if op == "enqueue":
+        return pl.enqueue_next(*arg)
+    if op == "unqueue":
+        return pl.unqueue(arg)
+    if op == "move":
+        return pl.move_queued(*arg)
+    if op == "fav":
+        return pl.add_favorite(arg)
+    if op == "unfav":
+        return pl.remove_favorite(arg)
+    if op == "shuffle":
+        return pl.set_shuffle(*arg)
+    if op == "jump":
+        song = pl.jump_to(arg)
+        return song.id if song else None
+    if op == "seek":
+        hit = pl.seek(arg)
+        return (hit[0].id, hit[1]) if hit else None
+    if op == "radio":
+        return pl.set_radio(*arg)
+    if op == "undo":
+        return pl.undo()
+    if op == "redo":
+        return pl.redo()
+    raise ValueError(op)
+
+
+OPS = (
+    ("add", 12),
+    ("bulk", 2),
+    ("remove", 14),
+    ("next", 25),
+    ("previous", 12),
+    ("enqueue", 12),
+    ("unqueue", 3),
+    ("move", 3),
+    ("fav", 6),
+    ("unfav", 3),
+    ("shuffle", 1),
+    ("jump", 3),
+    ("seek", 3),
+    ("undo", 4),
+    ("redo", 2),
+    ("radio", 1),
+    ("reload", 1),
+)
+
+
+def run(seed: int, steps: int, options: dict[str, Any]) -> Optional[str]:
+    """Where the implementations first diverge for ``seed``, or None if they agree throughout."""
+    rng = random.Random(seed)
+    pls: list[Any] = [CircularPlaylist(**options), ListPlaylist(**options)]
+    names, weights = zip(*OPS)
+    for step in range(steps):
+        op = rng.choices(names, weights)[0]
+        top = pls[0]._next_song_id + 1
+        if op == "add":
+            arg: Any = (f"Song {step}", "Artist", rng.randint(0, 300))
+        elif op == "bulk":
+            arg = [(f"Bulk {step}.{i}", "Artist", 60, None) for i in range(rng.randint(0, 5))]
+        elif op in ("shuffle", "radio"):
+            arg = (rng.random() < 0.7, rng.getrandbits(32))
+        elif op == "enqueue":
+            arg = (rng.randint(0, top), rng.choice(("next", "end")))
+        elif op == "unqueue":
+            arg = rng.randint(0, pls[0].up_next.next_entry_id)
+        elif op == "seek":
+            arg = rng.randint(-5, pls[0].total_duration() + 5)
+        elif op == "move":
+            arg = (rng.randint(0, pls[0].up_next.next_entry_id), rng.randint(-1, len(pls[0].up_next) + 1))
+        else:
+            arg = rng.randint(0, top)
+        if op == "reload":
+            pls = [type(pl).load_state(pl.dump_state(), **options) for pl in pls]
+            results = [None, None]
+        else:
+            results = [_step(pl, op, arg) for pl in pls]
+        probe = rng.randint(0, top)
+        states = [_state(pl, probe) for pl in pls]
+        if results[0] != results[1] or states[0] != states[1]:
+            lines = [f"seed {seed} step {step}: {op}({arg!r}) diverged"]
+            lines += [f"  {type(pl).__name__}: {res!r} {st!r}" for pl, res, st in zip(pls, results, states)]
+            return "\n".join(lines)
+    return None
+
+
+def timings(n: int) -> dict[str, float]:
+    pl = ListPlaylist()
+    pl.add_songs_bulk((f"Song {i}", "Artist", 180, None) for i in range(n))
+    rng = random.Random(n)
+    out = {"songs": n}
+    for name, fn in (
+        ("enqueue_next_us", lambda: pl.enqueue_next(rng.randint(1, n))),
+        ("next_us", pl.next),
+        ("previous_us", pl.previous),
+        ("remove_song_us", lambda: pl.remove_song(rng.randint(1, n))),
+    ):
+        t0 = time.perf_counter()
+        for _ in range(10_000):
+            fn()
+        out[name] = round((time.perf_counter() - t0) / 10_000 * 1e6, 2)
+    out["slots"] = len(pl._songs)
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=200)
+    ap.add_argument("--steps", type=int, default=500)
+    ap.add_argument("--seed", type=int, default=0, help="first seed")
+    ap.add_argument("--sizes", type=int, nargs="*", default=[100_000, 1_000_000])
+    ap.add_argument("--history-cap", type=int, help="bound history, spilling older entries to a temp file")
+    args = ap.parse_args()
+    options = {"history_cap": args.history_cap, "spill_dir": ""} if args.history_cap else {}
+    for seed in range(args.seed, args.seed + args.runs):
+        diverged = run(seed, args.steps, options)
+        if diverged:
+            print(diverged)
+            sys.exit(1)
+    print(f"{args.runs} runs x {args.steps} steps: implementations agree")
+    for n in args.sizes:
+        print(timings(n))
+
+
+if __name__ == "__main__":
+    main()
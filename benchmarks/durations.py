@@ -0,0 +1,120 @@
+"""Duration index: agreement with a full walk, then latency at scale.
+
+First checks ``total_duration``, ``progress``, ``song_at``,
+``song_at_offset`` and ``seek`` against sums over ``list_songs()`` on
+small random playlists with adds, bulk adds and removes in between, for
+both implementations; exits 1 on the first difference. Then builds large
+libraries and compares index build time and per-query latency with one
+full walk of the songs.
+
+    python -m benchmarks.durations --sizes 100000 1000000
+"""
+from __future__ import annotations
+import argparse
+import random
+import statistics
+import sys
+import time
+from typing import Any, Optional
+
+from playlist_app.playlist import CircularPlaylist, ListPlaylist
+
+
+def _walk_offset(songs: list[Any], seconds: int) -> Optional[tuple[int, int]]:
+    start = 0
+    for song in songs:
+        if start <= seconds < start + song.duration_sec:
+            return song.id, seconds - start
+        start += song.duration_sec
+    return None
+
+
+def check(seed: int, steps: int) -> None:
+    rng = random.Random(seed)
+    for cls in (CircularPlaylist, ListPlaylist):
+        pl = cls()
+        pl.add_songs_bulk((f"Song {i}", "Artist", rng.randint(0, 300), None) for i in range(rng.randint(0, 40)))
+        for step in range(steps):
+            r = rng.random()
+            if r < 0.2:
+                pl.add_song("Added", "Artist", rng.randint(0, 300))
+            elif r < 0.25:
+                pl.add_songs_bulk(("Bulk", "Artist", rng.randint(0, 5), None) for _ in range(rng.randint(0, 70)))
+            elif r < 0.45 and len(pl):
+                pl.remove_song(rng.choice(pl.list_songs()).id)
+            elif r < 0.55:
+                pl.next()
+            songs = pl.list_songs()
+            total = sum(s.duration_sec for s in songs)
+            k = rng.randint(-1, len(songs))
+            t = rng.randint(-2, total + 2)
+            hit = pl.song_at(k)
+            got = (pl.total_duration(), (hit[0].id, hit[1]) if hit else None, pl.song_at_offset(t))
+            want = (
+                total,
+                (songs[k].id, sum(s.duration_sec for s in songs[:k])) if 0 <= k < len(songs) else None,
+                _walk_offset(songs, t),
+            )
+            if got[2] is not None:
+                got = (got[0], got[1], (got[2][0].id, got[2][1]))
+            if rng.random() < 0.3 and want[2] is not None:
+                pl.seek(t)
+            current = pl.play()
+            if current is not None:
+                i = songs.index(current)
+                got += (pl.progress()["position"], pl.progress()["elapsed_sec"])
+                want += (i, sum(s.duration_sec for s in songs[:i]))
+            if got != want:
+                print(f"seed {seed} step {step}: {cls.__name__} got {got}, expected {want}")
+                sys.exit(1)
+            pl.check()
+
+
+def _us(fn: Any, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return round(statistics.median(samples) * 1e6, 2)
+
+
+def timings(n: int, repeat: int) -> dict[str, Any]:
+    rng = random.Random(n)
+    out: dict[str, Any] = {"songs": n}
+    for cls in (CircularPlaylist, ListPlaylist):
+        pl = cls()
+        pl.add_songs_bulk((f"Song {i}", "Artist", rng.randint(60, 600), None) for i in range(n))
+        for _ in range(n // 10):
+            pl.remove_song(rng.randint(1, n))
+        name = cls.__name__
+        t0 = time.perf_counter()
+        total = pl.total_duration()
+        out[f"{name}_build_ms"] = round((time.perf_counter() - t0) * 1e3, 1)
+        t0 = time.perf_counter()
+        sum(s.duration_sec for s in pl.list_songs())
+        out[f"{name}_walk_ms"] = round((time.perf_counter() - t0) * 1e3, 1)
+        out[f"{name}_progress_us"] = _us(pl.progress, repeat)
+        out[f"{name}_song_at_us"] = _us(lambda: pl.song_at(rng.randrange(len(pl))), repeat)
+        out[f"{name}_seek_us"] = _us(lambda: pl.seek(rng.randrange(total)), repeat)
+        out[f"{name}_add_song_us"] = _us(lambda: pl.add_song("Added", "Artist", 200), repeat)
+        out[f"{name}_remove_song_us"] = _us(lambda: pl.remove_song(rng.randint(1, n)), repeat)
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=100)
+    ap.add_argument("--steps", type=int, default=60)
+    ap.add_argument("--sizes", type=int, nargs="*", default=[100_000, 1_000_000])
+    ap.add_argument("--repeat", type=int, default=2000)
+    args = ap.parse_args()
+    for seed in range(args.runs):
+        check(seed, args.steps)
+    print(f"{args.runs} runs x {args.steps} steps: duration queries match a full walk")
+    for n in args.sizes:
+        print(timings(n, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
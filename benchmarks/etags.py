@@ -0,0 +1,165 @@
+"""Version counters and conditional GETs.
+
+First drives both playlist implementations through random mutations and,
+after each one, checks that every facet whose listing changed also has a
+new version (an unchanged ETag must mean an unchanged body); exits 1 on
+the first miss. Then times the listing endpoints through the ASGI app
+for a large playlist, with and without ``If-None-Match``.
+
+    python -m benchmarks.etags --songs 10000 --requests 500
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Any
+
+os.environ["PLAYLIST_METRICS"] = "0"
+
+import httpx  # noqa: E402
+
+from playlist_api import server  # noqa: E402
+from playlist_app.playlist import CircularPlaylist, ListPlaylist  # noqa: E402
+
+FACETS = ("library", "cursor", "queue", "history", "favorites")
+
+
+def _listings(pl: Any) -> dict[str, Any]:
+    current = pl.play()
+    return {
+        "library": [s.to_json() for s in pl.list_songs()],
+        "cursor": current.id if current else None,
+        "queue": [(e, lane, s.to_json()) for e, lane, s in pl.up_next.entries()],
+        "history": [s.to_json() for s in pl.history],
+        "favorites": [s.to_json() for s in pl.favorites],
+    }
+
+
+def _step(pl: Any, rng: random.Random) -> str:
+    songs = pl.list_songs()
+    some = rng.choice(songs).id if songs else 1
+    r = rng.random()
+    if r < 0.15:
+        pl.add_song("Added", "Artist", rng.randint(0, 300))
+        return "add_song"
+    if r < 0.2:
+        pl.add_songs_bulk(("Bulk", "Artist", 10, None) for _ in range(rng.randint(0, 5)))
+        return "add_songs_bulk"
+    if r < 0.3:
+        pl.remove_song(some)
+        return "remove_song"
+    if r < 0.45:
+        pl.next()
+        return "next"
+    if r < 0.55:
+        pl.previous()
+        return "previous"
+    if r < 0.6:
+        pl.jump_to(some)
+        return "jump_to"
+    if r < 0.7:
+        pl.enqueue_next(some, rng.choice(("next", "end")))
+        return "enqueue_next"
+    if r < 0.75:
+        entries = pl.up_next.entries()
+        if entries:
+            pl.unqueue(rng.choice(entries)[0])
+        return "unqueue"
+    if r < 0.8:
+        entries = pl.up_next.entries()
+        if entries:
+            pl.move_queued(rng.choice(entries)[0], rng.randrange(len(entries)))
+        return "move_queued"
+    if r < 0.87:
+        pl.add_favorite(some)
+        return "add_favorite"
+    if r < 0.92:
+        pl.remove_favorite(some)
+        return "remove_favorite"
+    if r < 0.94:
+        pl.clear_favorites()
+        return "clear_favorites"
+    if r < 0.96:
+        pl.set_shuffle(not pl.shuffle, rng.getrandbits(32))
+        return "set_shuffle"
+    if r < 0.975:
+        pl.undo()
+        return "undo"
+    if r < 0.985:
+        pl.redo()
+        return "redo"
+    pl.seek(rng.randint(0, max(pl.total_duration(), 1)))
+    return "seek"
+
+
+def check(seed: int, steps: int) -> None:
+    rng = random.Random(seed)
+    for cls in (CircularPlaylist, ListPlaylist):
+        pl = cls(history_cap=rng.choice((None, 5)))
+        pl.add_songs_bulk((f"Song {i}", "Artist", 100, None) for i in range(rng.randint(0, 8)))
+        before, tags = _listings(pl), {f: pl.versions.tag(f) for f in FACETS}
+        for step in range(steps):
+            op = _step(pl, rng)
+            after = _listings(pl)
+            for facet in FACETS:
+                tag = pl.versions.tag(facet)
+                if after[facet] != before[facet] and tag == tags[facet]:
+                    print(f"seed {seed} step {step}: {cls.__name__}.{op} changed {facet} but kept version {tag}")
+                    sys.exit(1)
+                tags[facet] = tag
+            before = after
+
+
+async def _median_us(client: httpx.AsyncClient, path: str, headers: dict[str, str], n: int) -> tuple[float, int]:
+    samples = []
+    status = 0
+    for _ in range(n):
+        t0 = time.perf_counter()
+        r = await client.get(path, headers=headers)
+        samples.append(time.perf_counter() - t0)
+        status = r.status_code
+    return statistics.median(samples) * 1e6, status
+
+
+async def timings(songs: int, n: int) -> dict[str, Any]:
+    transport = httpx.ASGITransport(app=server.app)
+    out: dict[str, Any] = {"songs": songs}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        r = await client.get("/play", headers={"x-session-token": "new"})
+        token = r.headers["set-cookie"].split(";", 1)[0].split("=", 1)[1]
+        headers = {"x-session-token": token}
+        # songs that come with audio URLs need no preview lookups, which would bump the versions mid-run
+        body = "".join('{"title":"Song %d","artist":"Artist","duration_sec":180,"audio_url":"https://example.com/%d.mp3"}\n' % (i, i) for i in range(songs))
+        r = await client.post("/songs/import?format=ndjson", content=body, headers=headers)
+        r.raise_for_status()
+        for i in range(1, songs, max(songs // 500, 1)):
+            await client.post("/queue", json={"song_id": i}, headers=headers)
+            await client.post("/favorites", json={"song_id": i}, headers=headers)
+            await client.post("/next", headers=headers)
+        for path in ("/songs", "/queue", "/history", "/favorites"):
+            etag = (await client.get(path, headers=headers)).headers["etag"]
+            full, _ = await _median_us(client, path, headers, n)
+            cached, status = await _median_us(client, path, {**headers, "if-none-match": etag}, n)
+            out[path] = f"{full:.0f}us -> {cached:.0f}us ({status})"
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=100)
+    ap.add_argument("--steps", type=int, default=200)
+    ap.add_argument("--songs", type=int, default=10_000)
+    ap.add_argument("--requests", type=int, default=500)
+    args = ap.parse_args()
+    for seed in range(args.runs):
+        check(seed, args.steps)
+    print(f"{args.runs} runs x {args.steps} steps: every changed listing got a new version")
+    print(asyncio.run(timings(args.songs, args.requests)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Memory benchmark for song storage.
+
+Builds a CircularPlaylist of N songs in a fresh subprocess per variant and
+reports the traced heap size and the process's peak RSS.
+
+    python -m benchmarks.memory --sizes 100000 1000000
+"""
+from __future__ import annotations
+import argparse
+import json
+import subprocess
+import sys
+
+_CHILD = r"""
+import json, resource, sys, tracemalloc
+from playlist_app.playlist import CircularPlaylist
+from playlist_app.songtable import SongTable
+
+variant, n = sys.argv[1], int(sys.argv[2])
+tracemalloc.start()
+pl = CircularPlaylist(SongTable() if variant == "table" else None)
+for i in range(n):
+    # fresh strings per song, as they would arrive from requests or a file
+    pl.add_song("Song %d" % i, "Artist %d" % (i % 5000), 180 + i % 120)
+current, _ = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+print(json.dumps({"traced_mb": current / 2**20, "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+"""
+
+
+def measure(variant: str, n: int) -> dict[str, float]:
+    out = subprocess.run([sys.executable, "-c", _CHILD, variant, str(n)], check=True, capture_output=True, text=True)
+    res = json.loads(out.stdout)
+    return {"variant": variant, "songs": n, **{k: round(v, 1) for k, v in res.items()}, "bytes_per_song": round(res["traced_mb"] * 2**20 / n)}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = ap.parse_args()
+    for n in args.sizes:
+        for variant in ("objects", "table"):
+            print(measure(variant, n))
+
+
+if __name__ == "__main__":
+    main()
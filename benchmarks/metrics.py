@@ -0,0 +1,88 @@
+"""Cost of the metrics layer.
+
+Times ``next()`` on both playlist implementations with and without the
+``PLAYLIST_METRICS_TIMING`` wrappers, requests through the ASGI app with
+and without the HTTP metrics middleware, and rendering ``/metrics`` for
+many live sessions.
+
+    python -m benchmarks.metrics --requests 5000 --sessions 10000
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from typing import Any
+
+# the app is built without the middleware; the benchmark adds it itself
+os.environ["PLAYLIST_METRICS"] = "0"
+
+import httpx  # noqa: E402
+
+from playlist_api import metrics, server  # noqa: E402
+from playlist_api.commands import TIMED_OPS, Commands, _seed_demo, make_resolver  # noqa: E402
+from playlist_api.sessions import _FACTORIES, SessionManager  # noqa: E402
+
+
+def _next_ns(n: int) -> dict[str, float]:
+    out = {}
+    for impl, cls in _FACTORIES.items():
+        pl = cls()
+        pl.add_songs_bulk((f"Song {i}", "Artist", 180, None) for i in range(1000))
+        pl.play()
+        t0 = time.perf_counter()
+        for _ in range(n):
+            pl.next()
+        out[impl] = (time.perf_counter() - t0) / n * 1e9
+    return out
+
+
+async def _requests_us(app: Any, n: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        headers = {"x-session-token": "bench"}
+        await client.post("/next", headers=headers)
+        samples = []
+        for _ in range(n):
+            t0 = time.perf_counter()
+            await client.post("/next", headers=headers)
+            samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1e6
+
+
+def run(args: argparse.Namespace) -> dict[str, Any]:
+    out: dict[str, Any] = {}
+    plain = _next_ns(args.ops)
+    for impl, cls in _FACTORIES.items():
+        metrics.time_methods(cls, impl, TIMED_OPS)
+    timed = _next_ns(args.ops)
+    for impl in _FACTORIES:
+        out[f"{impl}_next_ns"] = f"{plain[impl]:.0f} -> {timed[impl]:.0f} timed"
+
+    bare = asyncio.run(_requests_us(server.app, args.requests))
+    measured = asyncio.run(_requests_us(metrics.HTTPMetricsMiddleware(server.app), args.requests))
+    out["request_us"] = f"{bare:.0f} -> {measured:.0f} with middleware"
+
+    manager = SessionManager(max_sessions=args.sessions, idle_ttl=None, seed=_seed_demo)
+    for _ in range(args.sessions):
+        manager.get_or_create(None)[0].active()
+    Commands(manager, make_resolver())
+    t0 = time.perf_counter()
+    body = metrics.REGISTRY.render()
+    out["render_ms"] = round((time.perf_counter() - t0) * 1e3, 1)
+    out["render_bytes"] = len(body)
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--ops", type=int, default=200_000)
+    ap.add_argument("--requests", type=int, default=5000)
+    ap.add_argument("--sessions", type=int, default=10_000)
+    args = ap.parse_args()
+    print(run(args))
+
+
+if __name__ == "__main__":
+    main()
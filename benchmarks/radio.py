@@ -0,0 +1,151 @@
+"""Radio mode: seeded picks that replay exactly, drawn only from learned neighbours, and their cost.
+
+First drives both playlist implementations through random plays (next,
+queued songs, jumps, previous), favorites, adds, removes and radio
+toggles, three times over: twice straight through and once reloading from
+``dump_state`` along the way. The three must play the same songs in the
+same order, and every song radio picks must be one that has been played
+next to the current song, is still in the library and is not among the
+last ``Radio.RECENT`` played; exits 1 on the first difference. Then
+trains radio offline on a large library with a listener who has a few
+favourite follow-ups per song, and times ``next()`` with radio on against
+the plain ring step, reporting how often each plays one of the
+listener's follow-ups.
+
+    python -m benchmarks.radio --sizes 100000 1000000
+"""
+from __future__ import annotations
+import argparse
+import random
+import statistics
+import sys
+import time
+from typing import Any, Optional
+
+from playlist_app.playlist import CircularPlaylist, ListPlaylist
+from playlist_app.radio import Radio
+
+
+def _candidates(pl: Any) -> Optional[set[int]]:
+    """What radio may pick on the next ``next()``; None when radio will not pick."""
+    current = pl.play()
+    if pl._radio is None or current is None or not pl.up_next.is_empty():
+        return None
+    recent = {s.id for s in pl.history.items(0, Radio.RECENT - 1)} | {current.id}
+    row = pl._radio._rows.get(current.id, {})
+    return {b for b in row if b not in recent and pl.get_song(b) is not None} or None
+
+
+def _play(cls: Any, seed: int, steps: int, reload_every: int) -> list[Optional[int]]:
+    rng = random.Random(seed)
+    # a bounded history halves when full; keep the half above Radio.RECENT so "recent" stays whole
+    cap = rng.choice((None, 2 * Radio.RECENT + 8))
+    pl = cls(history_cap=cap)
+    pl.add_songs_bulk((f"Song {i}", "Artist", 120, None) for i in range(40))
+    pl.set_radio(True, seed)
+    played: list[Optional[int]] = []
+    for step in range(steps):
+        top = pl._next_song_id
+        r = rng.random()
+        if r < 0.5:
+            allowed = _candidates(pl)
+            song = pl.next()
+            if allowed is not None and (song is None or song.id not in allowed):
+                print(f"seed {seed} step {step}: {cls.__name__} radio picked {song}, allowed {sorted(allowed)}")
+                sys.exit(1)
+        elif r < 0.65:
+            pl.enqueue_next(rng.randint(1, top))
+            song = pl.next()
+        elif r < 0.72:
+            song = pl.jump_to(rng.randint(1, top))
+        elif r < 0.8:
+            song = pl.previous()
+        elif r < 0.85:
+            pl.add_favorite(rng.randint(1, top))
+            song = pl.play()
+        elif r < 0.9:
+            pl.remove_song(rng.randint(1, top))
+            song = pl.play()
+        elif r < 0.95:
+            pl.add_song(f"Added {step}", "Artist", 100)
+            song = pl.play()
+        elif r < 0.97:
+            pl.set_radio(not pl.radio, seed + step)
+            song = pl.play()
+        else:
+            pl.remove_favorite(rng.randint(1, top))
+            song = pl.play()
+        played.append(song.id if song else None)
+        if reload_every and step % reload_every == reload_every - 1:
+            pl = cls.load_state(pl.dump_state(), history_cap=cap)
+        pl.check()
+    return played
+
+
+def check(seed: int, steps: int) -> None:
+    for cls in (CircularPlaylist, ListPlaylist):
+        first = _play(cls, seed, steps, 0)
+        for again in (_play(cls, seed, steps, 0), _play(cls, seed, steps, 17)):
+            if again != first:
+                step = next(i for i, (a, b) in enumerate(zip(first, again)) if a != b)
+                print(f"seed {seed} step {step}: {cls.__name__} played {again[step]}, first run {first[step]}")
+                sys.exit(1)
+
+
+def _follow_ups(song_id: int, n: int, rng_seed: int) -> list[int]:
+    # the listener's favourite songs after song_id: a few fixed, mostly nearby, ids
+    rng = random.Random(song_id * 7919 + rng_seed)
+    return [max(1, min(n, song_id + rng.randint(-500, 500))) for _ in range(4)]
+
+
+def timings(n: int, transitions: int, repeat: int) -> dict[str, Any]:
+    out: dict[str, Any] = {"songs": n, "transitions": transitions}
+    rng = random.Random(n)
+    for cls in (CircularPlaylist, ListPlaylist):
+        name = cls.__name__
+        pl = cls()
+        pl.add_songs_bulk((f"Song {i}", "Artist", 180, None) for i in range(n))
+        pl.set_radio(True, 1)
+        # the listener queues one of their follow-ups after each song, over and over
+        for _ in range(transitions):
+            current = pl.play()
+            pl.enqueue_next(rng.choice(_follow_ups(current.id, n, 0)))
+            pl.next()
+        out[f"{name}_rows"] = len(pl._radio)
+        out[f"{name}_entries"] = pl._radio.entries()
+        for mode in ("radio", "ring"):
+            pl.set_radio(mode == "radio", 1)
+            samples, hits = [], 0
+            for _ in range(repeat):
+                before = pl.play().id
+                t0 = time.perf_counter()
+                song = pl.next()
+                samples.append(time.perf_counter() - t0)
+                hits += song.id in _follow_ups(before, n, 0)
+                if rng.random() < 0.05:
+                    # wander off now and then, like a listener picking something else
+                    pl.jump_to(rng.randint(1, n))
+            samples.sort()
+            out[f"{name}_{mode}_next_us"] = round(statistics.median(samples) * 1e6, 2)
+            out[f"{name}_{mode}_next_p99_us"] = round(samples[int(len(samples) * 0.99)] * 1e6, 2)
+            out[f"{name}_{mode}_follow_up_rate"] = round(hits / repeat, 3)
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=100)
+    ap.add_argument("--steps", type=int, default=300)
+    ap.add_argument("--sizes", type=int, nargs="*", default=[100_000, 1_000_000])
+    ap.add_argument("--transitions", type=int, default=200_000)
+    ap.add_argument("--repeat", type=int, default=5000)
+    args = ap.parse_args()
+    for seed in range(args.runs):
+        check(seed, args.steps)
+    print(f"{args.runs} runs x {args.steps} steps: radio picks replay exactly and stay within learned neighbours")
+    for n in args.sizes:
+        print(timings(n, args.transitions, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Search index: agreement with a brute-force scan, then latency at scale.
+
+First checks ``search`` against a direct scan of every song (same
+matching and ranking rules) on small random libraries with adds and
+removes in between, for both playlist implementations; exits 1 on the
+first difference. Then builds a large library of word titles and reports
+index build time plus median and p99 latency for a mix of queries.
+
+    python -m benchmarks.search --sizes 100000 1000000
+"""
+from __future__ import annotations
+import argparse
+import random
+import statistics
+import sys
+import time
+from typing import Any
+
+from playlist_app.playlist import CircularPlaylist, ListPlaylist
+from playlist_app.search import ARTIST, ARTIST_PREFIX, TITLE, TITLE_PREFIX, tokenize
+
+WORDS = (
+    "love night blue rain summer heart fire dance dream sky gold wild city "
+    "road home light dark river moon star time girl boy baby sweet lonely "
+    "forever young crazy heaven angel paradise sunset midnight ocean storm "
+    "café beyoncé señorita"
+).split()
+
+
+def _expected(pl: Any, query: str, limit: int) -> list[int]:
+    words = list(dict.fromkeys(tokenize(query)))
+    if not words:
+        return []
+    prefix = not query[-1:].isspace()
+    ranked = []
+    for song in pl.list_songs():
+        title, artist = set(tokenize(song.title)), set(tokenize(song.artist))
+        score = 0
+        for i, word in enumerate(words):
+            partial = prefix and i == len(words) - 1
+            if word in title:
+                score += TITLE
+            elif partial and any(t.startswith(word) for t in title):
+                score += TITLE_PREFIX
+            elif word in artist:
+                score += ARTIST
+            elif partial and any(t.startswith(word) for t in artist):
+                score += ARTIST_PREFIX
+            else:
+                break
+        else:
+            ranked.append((-score, song.id))
+    ranked.sort()
+    return [song_id for _, song_id in ranked[:limit]]
+
+
+def _title(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))
+
+
+def check(seed: int, steps: int) -> None:
+    rng = random.Random(seed)
+    for cls in (CircularPlaylist, ListPlaylist):
+        pl = cls()
+        pl.add_songs_bulk((_title(rng), _title(rng), 60, None) for _ in range(rng.randint(0, 50)))
+        for step in range(steps):
+            r = rng.random()
+            if r < 0.3:
+                pl.add_song(_title(rng), _title(rng), 60)
+            elif r < 0.5 and len(pl):
+                pl.remove_song(rng.choice(pl.list_songs()).id)
+            words = [rng.choice(WORDS)[: rng.randint(1, 6)] for _ in range(rng.randint(1, 3))]
+            query = " ".join(words) + rng.choice(("", "", " "))
+            limit = rng.randint(1, 10)
+            got = [s.id for s in pl.search(query, limit)]
+            want = _expected(pl, query, limit)
+            if got != want:
+                print(f"seed {seed} step {step}: {cls.__name__}.search({query!r}, {limit}) = {got}, expected {want}")
+                sys.exit(1)
+
+
+QUERIES = ("love", "lo", "night rain", "midnight oce", "beyonce", "sweet dream", "s", "wild heart fire", "zzz", "artist 7", "song 12345")
+
+
+def timings(n: int, repeat: int) -> dict[str, Any]:
+    rng = random.Random(n)
+    pl = CircularPlaylist()
+    pl.add_songs_bulk((f"{_title(rng)} {i}", f"Artist {i % 500}", 180, None) for i in range(n))
+    t0 = time.perf_counter()
+    pl.search("")
+    pl.search("warm up")
+    out: dict[str, Any] = {"songs": n, "build_s": round(time.perf_counter() - t0, 2)}
+    for query in QUERIES:
+        samples = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            pl.search(query)
+            samples.append(time.perf_counter() - t0)
+        samples.sort()
+        out[query] = f"{statistics.median(samples) * 1e6:.0f}us p99 {samples[int(len(samples) * 0.99)] * 1e6:.0f}us"
+    t0 = time.perf_counter()
+    for i in range(10_000):
+        pl.add_song(_title(rng), "Added", 180)
+    out["add_song_indexed_us"] = round((time.perf_counter() - t0) / 10_000 * 1e6, 2)
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=100)
+    ap.add_argument("--steps", type=int, default=60)
+    ap.add_argument("--sizes", type=int, nargs="*", default=[100_000, 1_000_000])
+    ap.add_argument("--repeat", type=int, default=200)
+    args = ap.parse_args()
+    for seed in range(args.runs):
+        check(seed, args.steps)
+    print(f"{args.runs} runs x {args.steps} steps: search matches a full scan")
+    for n in args.sizes:
+        print(timings(n, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Load benchmark for the session manager.
+
+Creates N live sessions, then hammers random sessions from a thread pool
+with a next/enqueue/play mix, reporting throughput.
+
+    python -m benchmarks.sessions_load --sessions 10000 --ops 200000 --threads 16
+"""
+from __future__ import annotations
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from playlist_api.commands import _seed_demo
+from playlist_api.sessions import SessionManager
+
+
+def run(sessions: int, ops: int, threads: int) -> dict[str, float]:
+    mgr = SessionManager(max_sessions=sessions, idle_ttl=None, seed=_seed_demo)
+    t0 = time.perf_counter()
+    tokens = [mgr.get_or_create(None)[0].token for _ in range(sessions)]
+    created = time.perf_counter() - t0
+
+    def worker(seed: int) -> None:
+        rng = random.Random(seed)
+        for _ in range(ops // threads):
+            session = mgr.get(rng.choice(tokens))
+            assert session is not None
+            with session.lock:
+                pl = session.active()
+                r = rng.random()
+                if r < 0.6:
+                    pl.next()
+                elif r < 0.8:
+                    pl.enqueue_next(rng.randint(1, 4))
+                else:
+                    pl.play()
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, range(threads)))
+    elapsed = time.perf_counter() - t0
+    done = (ops // threads) * threads
+    return {
+        "sessions": sessions,
+        "create_sec": round(created, 3),
+        "ops": done,
+        "elapsed_sec": round(elapsed, 3),
+        "ops_per_sec": round(done / elapsed),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sessions", type=int, default=10_000)
+    ap.add_argument("--ops", type=int, default=200_000)
+    ap.add_argument("--threads", type=int, default=16)
+    args = ap.parse_args()
+    print(run(args.sessions, args.ops, args.threads))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""Smart playlists: views kept up to date against filtering the library, then their cost.
+
+First drives both playlist implementations through random adds, bulk
+adds, removes, undos and redos with a few smart playlists defined, and
+plays those around (next, previous, queue) next to a model that filters
+the library afresh and steps through it: a view must always hold exactly
+the matching songs in playlist order, play the same song as the model,
+and come back the same from ``dump_state``; exits 1 on the first
+difference. Then builds large libraries and compares what a view costs
+each add and remove, and a step through it, with filtering the whole
+library (what clients did with ``/songs`` before).
+
+    python -m benchmarks.smart --sizes 100000 1000000
+"""
+from __future__ import annotations
+import argparse
+import random
+import statistics
+import sys
+import time
+from typing import Any, Optional
+
+from playlist_app.playlist import CircularPlaylist, ListPlaylist
+from playlist_app.smart import Rule
+
+ARTISTS = ("Adele", "Dua Lipa", "Ed Sheeran", "The Weeknd")
+WORDS = ("Love", "Night", "Light", "Song")
+
+
+def _random_rule(rng: random.Random) -> Rule:
+    lo = rng.choice((None, rng.randint(0, 200)))
+    hi = rng.choice((None, rng.randint(lo or 0, 300)))
+    return Rule(
+        rng.choice((None, None, rng.choice(ARTISTS).lower())),
+        rng.choice((None, rng.choice(WORDS).upper()[:3])),
+        lo,
+        hi,
+    )
+
+
+def _row(rng: random.Random) -> tuple[str, str, int, None]:
+    return f"{rng.choice(WORDS)} {rng.randint(0, 99)}", rng.choice(ARTISTS), rng.randint(0, 300), None
+
+
+class _Model:
+    """A view recomputed from the library on every step: the cursor, queue and history by song id."""
+
+    def __init__(self, rule: Rule) -> None:
+        self.rule = rule
+        self.current: Optional[int] = None
+        self.queue: list[int] = []
+        self.history: list[int] = []
+
+    def members(self, pl: Any) -> list[int]:
+        r = self.rule
+        return [
+            s.id
+            for s in pl.list_songs()
+            if (r.artist is None or s.artist.casefold() == r.artist.casefold())
+            and (r.title_contains is None or r.title_contains.casefold() in s.title.casefold())
+            and (r.min_sec is None or s.duration_sec >= r.min_sec)
+            and (r.max_sec is None or s.duration_sec <= r.max_sec)
+        ]
+
+    def settle(self, ids: list[int]) -> None:
+        # the library changed: a cursor on a song that left moves to the next member
+        if self.current is None or self.current not in ids:
+            later = [i for i in ids if self.current is not None and i > self.current]
+            self.current = (later or ids or [None])[0]
+
+    def next(self, ids: list[int]) -> Optional[int]:
+        while self.queue:
+            song_id = self.queue.pop(0)
+            if song_id in ids:
+                self.history.append(self.current)  # type: ignore[arg-type]
+                self.current = song_id
+                return song_id
+        if self.current is None:
+            return None
+        later = [i for i in ids if i > self.current]
+        self.history.append(self.current)
+        self.current = (later or ids)[0]
+        return self.current
+
+    def previous(self, ids: list[int]) -> Optional[int]:
+        while self.history:
+            song_id = self.history.pop()
+            if song_id in ids:
+                self.current = song_id
+                return song_id
+        if self.current is None:
+            return None
+        earlier = [i for i in ids if i < self.current]
+        self.current = (earlier or ids)[-1]
+        return self.current
+
+
+def _fail(seed: int, step: int, pl: Any, what: str) -> None:
+    print(f"seed {seed} step {step}: {type(pl).__name__} {what}")
+    sys.exit(1)
+
+
+def check(seed: int, steps: int) -> None:
+    rng = random.Random(seed)
+    for cls in (CircularPlaylist, ListPlaylist):
+        pl = cls()
+        pl.add_songs_bulk(_row(rng) for _ in range(rng.randint(0, 30)))
+        models: dict[str, _Model] = {}
+        for step in range(steps):
+            r = rng.random()
+            songs = pl.list_songs()
+            if r < 0.05 or not models:
+                name = rng.choice("abc")
+                rule = _random_rule(rng)
+                pl.set_smart(name, rule)
+                models[name] = _Model(rule)
+                models[name].settle(models[name].members(pl))
+            elif r < 0.07:
+                name = rng.choice(sorted(models))
+                pl.drop_smart(name)
+                del models[name]
+                continue
+            elif r < 0.25:
+                pl.add_song(*_row(rng)[:3])
+            elif r < 0.3:
+                pl.add_songs_bulk(_row(rng) for _ in range(rng.randint(0, 10)))
+            elif r < 0.45 and songs:
+                pl.remove_song(rng.choice(songs).id)
+            elif r < 0.5:
+                pl.undo()
+            elif r < 0.53:
+                pl.redo()
+            name = rng.choice(sorted(models))
+            model = models[name]
+            for m in models.values():
+                m.settle(m.members(pl))
+            ids = model.members(pl)
+            r = rng.random()
+            if r < 0.35:
+                got, want = pl.smart_next(name), model.next(ids)
+            elif r < 0.55:
+                got, want = pl.smart_previous(name), model.previous(ids)
+            elif r < 0.7 and ids:
+                song_id = rng.choice(ids + [pl._next_song_id])
+                entry = pl.smart_enqueue(name, song_id)
+                if (entry is not None) != (song_id in ids):
+                    _fail(seed, step, pl, f"smart_enqueue({song_id}) gave {entry} for members {ids}")
+                if entry is not None:
+                    model.queue.append(song_id)
+                got, want = pl.smart[name].play(), model.current
+            else:
+                got, want = pl.smart[name].play(), model.current
+            if (got.id if got else None) != want:
+                _fail(seed, step, pl, f"smart playlist {name} ({model.rule}) is on {got}, expected {want}")
+            for n, m in models.items():
+                if [s.id for s in pl.smart[n].snapshot()] != m.members(pl):
+                    _fail(seed, step, pl, f"smart playlist {n} holds {[s.id for s in pl.smart[n].snapshot()]}, expected {m.members(pl)}")
+            pl.check()
+            if rng.random() < 0.05:
+                state = pl.dump_state()
+                if cls.load_state(state).dump_state() != state:
+                    _fail(seed, step, pl, "smart playlists changed through dump_state/load_state")
+
+
+def _us(fn: Any, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return round(statistics.median(samples) * 1e6, 2)
+
+
+def timings(n: int, repeat: int) -> dict[str, Any]:
+    rng = random.Random(n)
+    out: dict[str, Any] = {"songs": n}
+    rules = {"artist": Rule(artist="adele"), "title": Rule(title_contains="night"), "short": Rule(max_sec=120)}
+    for cls in (CircularPlaylist, ListPlaylist):
+        name = cls.__name__
+        pl = cls()
+        pl.add_songs_bulk(_row(rng) for _ in range(n))
+        out[f"{name}_add_song_us"] = _us(lambda: pl.add_song(*_row(rng)[:3]), repeat)
+        out[f"{name}_remove_song_us"] = _us(lambda: pl.remove_song(rng.randint(1, n)), repeat)
+        t0 = time.perf_counter()
+        for key, rule in rules.items():
+            pl.set_smart(key, rule)
+        out[f"{name}_set_3_smart_ms"] = round((time.perf_counter() - t0) * 1e3, 1)
+        out[f"{name}_add_song_3_smart_us"] = _us(lambda: pl.add_song(*_row(rng)[:3]), repeat)
+        out[f"{name}_remove_song_3_smart_us"] = _us(lambda: pl.remove_song(rng.randint(1, n)), repeat)
+        out[f"{name}_smart_next_us"] = _us(lambda: pl.smart_next("artist"), repeat)
+        out[f"{name}_smart_previous_us"] = _us(lambda: pl.smart_previous("title"), repeat)
+        view = pl.smart["artist"]
+        out[f"{name}_refilter_library_ms"] = round(_us(lambda: [s for s in pl.list_songs() if view.matches(s)], 3) / 1e3, 1)
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=100)
+    ap.add_argument("--steps", type=int, default=200)
+    ap.add_argument("--sizes", type=int, nargs="*", default=[100_000, 1_000_000])
+    ap.add_argument("--repeat", type=int, default=2000)
+    args = ap.parse_args()
+    for seed in range(args.runs):
+        check(seed, args.steps)
+    print(f"{args.runs} runs x {args.steps} steps: smart playlists match the library filtered afresh")
+    for n in args.sizes:
+        print(timings(n, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Latency of GET /songs with cached song JSON versus per-request dict encoding.
+
+"dicts" rebuilds a dict per song and encodes it through FastAPI's
+jsonable_encoder + JSONResponse (how /songs used to respond); "cached"
+is ``songs_json``, which splices cached bytes for up to
+``SONG_JSON_CACHE`` songs and encodes longer listings in one pass.
+"request" is the full GET /songs round trip through the ASGI app.
+
+    python -m benchmarks.songs_endpoint --sizes 10000 100000
+"""
+from __future__ import annotations
+import argparse
+import statistics
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from playlist_api import server
+from playlist_api.commands import _songs_json
+
+
+def _median_ms(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return round(statistics.median(times) * 1000, 2)
+
+
+def run(n: int, repeat: int) -> dict[str, float]:
+    with TestClient(server.app) as client:
+        client.get("/me")
+        session = server.sessions.get(client.cookies.get(server.SESSION_COOKIE))
+        assert session is not None
+        pl = session.active()
+        pl.add_songs_bulk((f"Song {i}", f"Artist {i % 500}", 180, None) for i in range(n - len(pl)))
+
+        def dicts():
+            songs = pl.list_songs()
+            body = [{"id": s.id, "title": s.title, "artist": s.artist, "duration_sec": s.duration_sec, "audio_url": s.audio_url} for s in songs]
+            JSONResponse(jsonable_encoder(body))
+
+        def cached():
+            server.RawJSONResponse(_songs_json(pl.list_songs()))
+
+        cached()  # warm the song cache
+        return {
+            "songs": n,
+            "dicts_ms": _median_ms(dicts, repeat),
+            "cached_ms": _median_ms(cached, repeat),
+            "request_ms": _median_ms(lambda: client.get("/songs"), repeat),
+        }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+    for n in args.sizes:
+        print(run(n, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
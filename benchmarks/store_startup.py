@@ -0,0 +1,63 @@
+"""Startup-time benchmark for the persistent store.
+
+Builds a session with N songs, compacts it into a snapshot, appends a log
+tail of cursor moves, then times rebuilding the session from disk.
+
+    python -m benchmarks.store_startup --songs 1000000 --tail 100000
+"""
+from __future__ import annotations
+import argparse
+import tempfile
+import time
+
+from playlist_api.sessions import SessionManager
+from playlist_api.store import PlaylistStore
+
+
+def run(songs: int, tail: int, directory: str) -> dict[str, float]:
+    mgr = SessionManager(idle_ttl=None)
+    store = PlaylistStore(directory, compact_every=songs + tail + 1)
+    store.open(mgr)
+    session, _ = mgr.get_or_create(None)
+    pl = session.active()
+    t0 = time.perf_counter()
+    for i in range(songs):
+        pl.add_song(f"Song {i}", f"Artist {i % 5000}", 180 + i % 120)
+    build = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    store.compact()
+    compact = time.perf_counter() - t0
+    for i in range(tail):
+        if i % 10 == 0:
+            pl.enqueue_next(i + 1)
+        pl.next()
+    store.sync()
+    store.close()
+
+    fresh = SessionManager(idle_ttl=None)
+    reopened = PlaylistStore(directory)
+    stats = reopened.open(fresh)
+    reopened.close()
+    restored = fresh.get(session.token)
+    assert restored is not None and len(restored.active()) == songs
+    assert restored.active().play() == pl.play()
+    return {
+        "songs": songs,
+        "tail_records": stats["replayed"],
+        "build_sec": round(build, 3),
+        "compact_sec": round(compact, 3),
+        "startup_sec": round(stats["seconds"], 3),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--songs", type=int, default=1_000_000)
+    ap.add_argument("--tail", type=int, default=100_000)
+    args = ap.parse_args()
+    with tempfile.TemporaryDirectory() as d:
+        print(run(args.songs, args.tail, d))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""Benchmark suite: playlist operations, Queue/Stack and the HTTP API.
+
+Times add_song, remove_song, next, previous, enqueue_next and list_songs
+for both playlist implementations, plus Queue/Stack operations, at each
+size. Then drives the FastAPI app in-process (httpx over ASGI, no network)
+with concurrent clients and reports per-endpoint latency.
+
+Every result is a record with a lower-is-better ``value``; ``--json``
+writes them out, ``--save-baseline`` stores them, and ``--baseline``
+compares against a stored run and exits 1 when anything got slower by
+more than ``--threshold``. The values are absolute timings, so a
+baseline only means something on the machine that recorded it: record
+one before a change and compare after it (``benchmarks/baseline.json``
+is ignored by git).
+
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import gc
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from typing import Any, Callable
+
+import httpx
+
+from playlist_app.playlist import CircularPlaylist, ListPlaylist
+from playlist_app.structures import Queue, Stack
+
+IMPLS = {"circular": CircularPlaylist, "list": ListPlaylist}
+# operations per timed batch; the linear ones get fewer at large sizes
+BATCH = 2000
+SLOW_BUDGET = 2_000_000
+
+
+def _record(name: str, value: float, unit: str, **extra: Any) -> dict[str, Any]:
+    return {"name": name, "value": round(value, 1), "unit": unit, **extra}
+
+
+def _best_ns(fn: Callable[[int], None], ops: int, repeat: int) -> float:
+    # best of ``repeat`` batches with the collector paused, as timeit does
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            t0 = time.perf_counter_ns()
+            fn(ops)
+            best = min(best, time.perf_counter_ns() - t0)
+        finally:
+            gc.enable()
+    return best / ops
+
+
+def _build(impl: str, n: int) -> Any:
+    pl = IMPLS[impl]()
+    pl.add_songs_bulk((f"Song {i}", f"Artist {i % 500}", 180, None) for i in range(n))
+    return pl
+
+
+def bench_playlist(impl: str, n: int, repeat: int) -> list[dict[str, Any]]:
+    rng = random.Random(n)
+    pl = _build(impl, n)
+    # linear-time operations get a smaller batch so 1M sizes stay in seconds
+    slow = max(10, min(BATCH, SLOW_BUDGET // max(n, 1)))
+    linear = impl == "list"
+    out = []
+
+    def add(ops: int) -> None:
+        for _ in range(ops):
+            pl.add_song("Added", "Bench", 200)
+
+    victims = list(range(1, n + 1))
+    rng.shuffle(victims)
+
+    def remove(ops: int) -> None:
+        for _ in range(ops):
+            pl.remove_song(victims.pop())
+            pl.add_song("Refill", "Bench", 200)
+
+    def enqueue(ops: int) -> None:
+        for song_id in rng.choices(range(n + 1, n + 1 + BATCH), k=ops):
+            pl.enqueue_next(song_id)
+
+    def step_next(ops: int) -> None:
+        for _ in range(ops):
+            pl.next()
+
+    def step_previous(ops: int) -> None:
+        for _ in range(ops):
+            pl.previous()
+
+    def list_all(ops: int) -> None:
+        for _ in range(ops):
+            pl.list_songs()
+
+    # size-sensitive reads first, before add_song grows the playlist
+    for op, fn, ops in (
+        ("list_songs", list_all, max(1, min(100, 10_000_000 // max(n, 1)))),
+        ("remove_song", remove, min(slow if linear else BATCH, n // repeat)),
+        ("add_song", add, BATCH),
+        ("enqueue_next", enqueue, slow if linear else BATCH),
+        ("next", step_next, BATCH),
+        ("previous", step_previous, BATCH),
+    ):
+        out.append(_record(f"playlist/{impl}/{op}/{n}", _best_ns(fn, ops, repeat), "ns/op", ops=ops))
+    return out
+
+
+def bench_structures(n: int, repeat: int) -> list[dict[str, Any]]:
+    out = []
+    q: Queue[int] = Queue()
+    s: Stack[int] = Stack()
+    for i in range(n):
+        q.enqueue(i)
+        s.push(i)
+
+    def enqueue_dequeue(ops: int) -> None:
+        for i in range(ops):
+            q.enqueue(i)
+            q.dequeue()
+
+    def push_pop(ops: int) -> None:
+        for i in range(ops):
+            s.push(i)
+            s.pop()
+
+    def queue_page(ops: int) -> None:
+        for _ in range(ops):
+            q.items(n // 2, 100)
+
+    def stack_page(ops: int) -> None:
+        for _ in range(ops):
+            s.items(n // 2, 100)
+
+    for name, fn in (
+        ("queue/enqueue+dequeue", enqueue_dequeue),
+        ("stack/push+pop", push_pop),
+        ("queue/items", queue_page),
+        ("stack/items", stack_page),
+    ):
+        out.append(_record(f"structures/{name}/{n}", _best_ns(fn, BATCH, repeat), "ns/op", ops=BATCH))
+    return out
+
+
+# --- in-process HTTP load ---
+
+ENDPOINT_MIX = (
+    ("GET /play", 0.3),
+    ("POST /next", 0.25),
+    ("POST /previous", 0.1),
+    ("POST /enqueue", 0.15),
+    ("GET /songs?limit=100", 0.1),
+    ("GET /queue?limit=100", 0.1),
+)
+
+
+async def _call(client: httpx.AsyncClient, endpoint: str, rng: random.Random) -> None:
+    method, path = endpoint.split(" ", 1)
+    if path == "/enqueue":
+        res = await client.post(path, json={"song_id": rng.randint(1, 4)})
+    else:
+        res = await client.request(method, path)
+    res.raise_for_status()
+
+
+async def _load(clients: int, requests: int, songs: int) -> tuple[dict[str, list[float]], float]:
+    from playlist_api import server
+
+    transport = httpx.ASGITransport(app=server.app)
+    latencies: dict[str, list[float]] = {endpoint: [] for endpoint, _ in ENDPOINT_MIX}
+    endpoints = [e for e, _ in ENDPOINT_MIX]
+    weights = [w for _, w in ENDPOINT_MIX]
+
+    async def user(i: int, per_user: int) -> None:
+        rng = random.Random(i)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await client.post("/login", json={"username": f"bench{i}"})
+            if songs:
+                session = server.sessions.get(client.cookies.get(server.SESSION_COOKIE))
+                assert session is not None
+                with session.lock:
+                    session.active().add_songs_bulk((f"Song {k}", "Bench", 180, None) for k in range(songs))
+            for endpoint in rng.choices(endpoints, weights, k=per_user):
+                t0 = time.perf_counter()
+                await _call(client, endpoint, rng)
+                latencies[endpoint].append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(user(i, requests // clients) for i in range(clients)))
+    return latencies, time.perf_counter() - t0
+
+
+def bench_http(clients: int, requests: int, songs: int) -> list[dict[str, Any]]:
+    latencies, elapsed = asyncio.run(_load(clients, requests, songs))
+    total = sum(len(v) for v in latencies.values())
+    out = []
+    for endpoint, samples in latencies.items():
+        if not samples:
+            continue
+        samples.sort()
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+        out.append(
+            _record(
+                f"http/{endpoint}",
+                statistics.median(samples) * 1e6,
+                "us/req",
+                p99_us=round(p99 * 1e6, 1),
+                requests=len(samples),
+            )
+        )
+    out.append(_record("http/all", elapsed / total * 1e6, "us/req", clients=clients, requests=total, req_per_sec=round(total / elapsed)))
+    return out
+
+
+# --- baseline comparison ---
+
+
+def compare(results: list[dict[str, Any]], baseline: list[dict[str, Any]], threshold: float) -> list[str]:
+    """Lines describing each result against the baseline; regressions are marked."""
+    base = {r["name"]: r["value"] for r in baseline}
+    lines = []
+    for r in results:
+        old = base.get(r["name"])
+        if not old:
+            continue
+        ratio = r["value"] / old
+        mark = "REGRESSION" if ratio > 1 + threshold else ("faster" if ratio < 1 - threshold else "")
+        lines.append(f"{r['name']:<48} {old:>12.1f} -> {r['value']:>12.1f} {r['unit']:<6} x{ratio:5.2f} {mark}")
+    return lines
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000])
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--clients", type=int, default=32)
+    ap.add_argument("--requests", type=int, default=5_000)
+    ap.add_argument("--http-songs", type=int, default=1_000, help="extra songs in each HTTP client's playlist")
+    ap.add_argument("--skip-http", action="store_true")
+    ap.add_argument("--json", help="write results to this file")
+    ap.add_argument("--baseline", help="compare against results stored in this file")
+    ap.add_argument("--save-baseline", help="store these results as a baseline")
+    ap.add_argument("--threshold", type=float, default=0.5, help="allowed slowdown before flagging (0.5 = 50%%)")
+    args = ap.parse_args()
+
+    results: list[dict[str, Any]] = []
+    for n in args.sizes:
+        for impl in IMPLS:
+            results += bench_playlist(impl, n, args.repeat)
+        results += bench_structures(n, args.repeat)
+    if not args.skip_http:
+        results += bench_http(args.clients, args.requests, args.http_songs)
+
+    for r in results:
+        print(f"{r['name']:<48} {r['value']:>12.1f} {r['unit']}")
+    report = {"python": platform.python_version(), "machine": platform.machine(), "results": results}
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as fh:
+                json.dump(report, fh, indent=1)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            lines = compare(results, json.load(fh)["results"], args.threshold)
+        print()
+        print("\n".join(lines))
+        if any(line.endswith("REGRESSION") for line in lines):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Library versions: frozen snapshots and undo/redo, then their cost at scale.
+
+First drives both playlist implementations through random adds, bulk
+adds, removes, batches, undos and redos next to a model that keeps every
+library state: an undo must bring back the library as it was before the
+change (favorites it dropped included), a redo the one after it, and
+every snapshot taken along the way must still list exactly what it did
+when it was taken; exits 1 on the first difference. Then builds large
+libraries and compares taking a snapshot with copying the song list (the
+time a full ``/songs`` listing holds the session lock), times add,
+remove, undo and redo, and measures the memory each undo version keeps.
+
+    python -m benchmarks.undo --sizes 100000 1000000
+"""
+from __future__ import annotations
+import argparse
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any
+
+from playlist_app.playlist import BatchError, CircularPlaylist, ListPlaylist
+
+
+def _ids(songs: Any) -> list[int]:
+    return [s.id for s in songs]
+
+
+def _favorites(pl: Any) -> set[int]:
+    return {s.id for s in pl.favorites}
+
+
+def check(seed: int, steps: int) -> None:
+    rng = random.Random(seed)
+    for cls in (CircularPlaylist, ListPlaylist):
+        pl = cls()
+        if rng.random() < 0.3:
+            pl.set_shuffle(True, seed)
+        # (library ids, favorites) before each change that can be undone, and after each undone one
+        undo: list[tuple[list[int], set[int]]] = []
+        redo: list[tuple[list[int], set[int]]] = []
+        frozen: list[tuple[Any, list[int]]] = []
+        for step in range(steps):
+            songs = pl.list_songs()
+            before = (_ids(songs), _favorites(pl))
+            r = rng.random()
+            changed = False
+            if r < 0.2:
+                pl.add_song("Added", "Artist", rng.randint(0, 300))
+                changed = True
+            elif r < 0.25:
+                changed = bool(pl.add_songs_bulk(("Bulk", "Artist", 60, None) for _ in range(rng.randint(0, 40))))
+            elif r < 0.45 and songs:
+                changed = pl.remove_song(rng.choice(songs).id)
+            elif r < 0.5 and songs:
+                try:
+                    pl.apply_batch([{"op": "add", "title": "Batched", "artist": "Artist"}, {"op": "remove", "song_id": rng.choice(songs).id}])
+                    changed = True
+                except BatchError:
+                    pass
+            elif r < 0.62:
+                done = pl.undo()
+                if done != bool(undo):
+                    print(f"seed {seed} step {step}: {cls.__name__}.undo returned {done} with {len(undo)} changes recorded")
+                    sys.exit(1)
+                if done:
+                    want = undo.pop()
+                    redo.append(before)
+                    _expect_state(pl, want, seed, step, "undo")
+            elif r < 0.7:
+                done = pl.redo()
+                if done != bool(redo):
+                    print(f"seed {seed} step {step}: {cls.__name__}.redo returned {done} with {len(redo)} undone")
+                    sys.exit(1)
+                if done:
+                    want = redo.pop()
+                    undo.append(before)
+                    _expect_state(pl, want, seed, step, "redo")
+            elif r < 0.8 and songs:
+                pl.add_favorite(rng.choice(songs).id)
+            else:
+                pl.next()
+            if changed:
+                undo = (undo + [before])[-pl.UNDO_DEPTH :]
+                redo.clear()
+            if rng.random() < 0.2:
+                frozen.append((pl.snapshot(), _ids(pl.list_songs())))
+            pl.check()
+        for snapshot, ids in frozen:
+            if _ids(snapshot) != ids:
+                print(f"seed {seed}: {cls.__name__} snapshot changed after it was taken")
+                sys.exit(1)
+
+
+def _expect_state(pl: Any, want: tuple[list[int], set[int]], seed: int, step: int, what: str) -> None:
+    ids, favorites = want
+    if _ids(pl.list_songs()) != ids or not favorites <= _favorites(pl):
+        print(f"seed {seed} step {step}: {type(pl).__name__}.{what} gave {_ids(pl.list_songs())} {sorted(_favorites(pl))}, expected {ids} {sorted(favorites)}")
+        sys.exit(1)
+
+
+def _us(fn: Any, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return round(statistics.median(samples) * 1e6, 2)
+
+
+def timings(n: int, repeat: int) -> dict[str, Any]:
+    rng = random.Random(n)
+    out: dict[str, Any] = {"songs": n}
+    for cls in (CircularPlaylist, ListPlaylist):
+        pl = cls()
+        pl.add_songs_bulk((f"Song {i}", "Artist", 180, None) for i in range(n))
+        name = cls.__name__
+        out[f"{name}_snapshot_us"] = _us(pl.snapshot, repeat)
+        out[f"{name}_list_songs_us"] = _us(pl.list_songs, 5)
+        out[f"{name}_add_song_us"] = _us(lambda: pl.add_song("Added", "Artist", 200), repeat)
+        out[f"{name}_remove_song_us"] = _us(lambda: pl.remove_song(rng.randint(1, n)), repeat)
+        out[f"{name}_undo_us"] = _us(pl.undo, min(repeat, pl.UNDO_DEPTH))
+        out[f"{name}_redo_us"] = _us(pl.redo, min(repeat, pl.UNDO_DEPTH))
+        # what a full undo stack of single-song removals keeps alive beyond the library itself
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        for _ in range(pl.UNDO_DEPTH):
+            pl.remove_song(rng.randint(1, n))
+        out[f"{name}_bytes_per_version"] = (tracemalloc.get_traced_memory()[0] - base) // pl.UNDO_DEPTH
+        tracemalloc.stop()
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=100)
+    ap.add_argument("--steps", type=int, default=200)
+    ap.add_argument("--sizes", type=int, nargs="*", default=[100_000, 1_000_000])
+    ap.add_argument("--repeat", type=int, default=2000)
+    args = ap.parse_args()
+    for seed in range(args.runs):
+        check(seed, args.steps)
+    print(f"{args.runs} runs x {args.steps} steps: undo, redo and snapshots match the model")
+    for n in args.sizes:
+        print(timings(n, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
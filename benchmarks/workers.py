@@ -0,0 +1,188 @@
+"""Throughput of the API with 1..N worker processes sharing one state server.
+
+For each worker count, starts a state server (``python -m
+playlist_api.backends --state-only``) and the web workers on a local port
+pointed at its socket (so every count, one worker included, goes through
+the socket), creates a few hundred sessions, then drives a next/previous/enqueue/play
+mix at it over TCP from several load-generator processes for a fixed
+time. Reports requests per second, speedup over the first count and
+latency. Then checks that the workers really share state: many
+concurrent ``POST /queue`` calls for one session, each on a fresh
+connection so they land on different workers, must all show up in its
+``GET /queue``; exits 1 if any went missing or a request failed.
+
+Scaling needs spare cores for the extra workers (and the load
+generators); on a single-CPU machine the numbers stay flat.
+
+    python -m benchmarks.workers --workers 1 2 4 --seconds 10
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any
+
+import httpx
+
+OPS = (("/next", 50), ("/previous", 15), ("/queue", 20), ("/play", 15))
+
+
+def _start(workers: int, port: int, sock: str) -> list[subprocess.Popen[bytes]]:
+    backends = [sys.executable, "-m", "playlist_api.backends", "--socket", sock]
+    procs = [
+        subprocess.Popen(backends + ["--state-only"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL),
+        # waits for the state server's socket before starting the workers
+        subprocess.Popen(backends + ["--workers", str(workers), "--port", str(port)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL),
+    ]
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                return procs
+        except httpx.TransportError:
+            pass
+        if any(proc.poll() is not None for proc in procs):
+            break
+        time.sleep(0.1)
+    _stop(procs)
+    raise RuntimeError(f"server with {workers} workers did not come up on port {port}")
+
+
+def _stop(procs: list[subprocess.Popen[bytes]]) -> None:
+    # web workers first, then the state server they talk to
+    for proc in reversed(procs):
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+
+async def _sessions(base: str, n: int) -> list[str]:
+    async with httpx.AsyncClient(base_url=base) as client:
+
+        async def one() -> str:
+            # an unknown token always gets a new session
+            r = await client.get("/play", headers={"x-session-token": "new"})
+            return r.headers["set-cookie"].split(";", 1)[0].split("=", 1)[1]
+
+        return list(await asyncio.gather(*(one() for _ in range(n))))
+
+
+async def _drive(base: str, tokens: list[str], clients: int, seconds: float, seed: int) -> tuple[list[float], int]:
+    rng = random.Random(seed)
+    names, weights = zip(*OPS)
+    latencies: list[float] = []
+    failed = 0
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=30) as client:
+        deadline = time.perf_counter() + seconds
+
+        async def loop() -> None:
+            nonlocal failed
+            while time.perf_counter() < deadline:
+                path = rng.choices(names, weights)[0]
+                headers = {"x-session-token": rng.choice(tokens)}
+                t0 = time.perf_counter()
+                if path == "/queue":
+                    r = await client.post(path, json={"song_id": rng.randint(1, 4)}, headers=headers)
+                elif path == "/play":
+                    r = await client.get(path, headers=headers)
+                else:
+                    r = await client.post(path, headers=headers)
+                latencies.append(time.perf_counter() - t0)
+                if r.status_code >= 300:
+                    failed += 1
+
+        await asyncio.gather(*(loop() for _ in range(clients)))
+    return latencies, failed
+
+
+def _generator(base: str, tokens: list[str], clients: int, seconds: float, seed: int, out: Any) -> None:
+    out.put(asyncio.run(_drive(base, tokens, clients, seconds, seed)))
+
+
+def _load(base: str, tokens: list[str], procs: int, clients: int, seconds: float) -> tuple[list[float], int, float]:
+    out: Any = multiprocessing.Queue()
+    gens = [multiprocessing.Process(target=_generator, args=(base, tokens, clients, seconds, i, out)) for i in range(procs)]
+    t0 = time.perf_counter()
+    for g in gens:
+        g.start()
+    results = [out.get() for _ in gens]
+    elapsed = time.perf_counter() - t0
+    for g in gens:
+        g.join()
+    latencies = sorted(x for lat, _ in results for x in lat)
+    return latencies, sum(f for _, f in results), elapsed
+
+
+async def _shared_queue(base: str, token: str, n: int) -> int:
+    async def one() -> int:
+        # a client per request, so each one opens its own connection
+        async with httpx.AsyncClient(base_url=base) as client:
+            r = await client.post("/queue", json={"song_id": 1, "lane": "end"}, headers={"x-session-token": token})
+            return r.status_code
+
+    codes = await asyncio.gather(*(one() for _ in range(n)))
+    async with httpx.AsyncClient(base_url=base) as client:
+        r = await client.get("/queue", headers={"x-session-token": token})
+    seen = len(r.json()) if r.status_code == 200 else 0
+    return seen if all(c == 201 for c in codes) else -1
+
+
+def run(args: argparse.Namespace, sock: str) -> list[dict[str, Any]]:
+    rows: list[dict[str, Any]] = []
+    for workers in args.workers:
+        base = f"http://127.0.0.1:{args.port}"
+        procs = _start(workers, args.port, sock)
+        try:
+            tokens = asyncio.run(_sessions(base, args.sessions))
+            _load(base, tokens, args.generators, args.clients, min(1.0, args.seconds))  # warm up every worker
+            latencies, failed, elapsed = _load(base, tokens, args.generators, args.clients, args.seconds)
+            check = asyncio.run(_sessions(base, 1))[0]
+            queued = asyncio.run(_shared_queue(base, check, args.check))
+        finally:
+            _stop(procs)
+        rps = len(latencies) / elapsed
+        rows.append({
+            "workers": workers,
+            "requests": len(latencies),
+            "failed": failed,
+            "requests_per_sec": round(rps),
+            "speedup": round(rps / rows[0]["requests_per_sec"], 2) if rows else 1.0,
+            "p50_ms": round(statistics.median(latencies) * 1e3, 2),
+            "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1e3, 2),
+            "shared_queue": f"{queued}/{args.check}",
+        })
+        print(rows[-1], flush=True)
+    return rows
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, nargs="*", default=[1, 2, 4])
+    ap.add_argument("--seconds", type=float, default=10)
+    ap.add_argument("--sessions", type=int, default=200)
+    ap.add_argument("--generators", type=int, default=max(2, (os.cpu_count() or 1) // 2), help="load-generator processes")
+    ap.add_argument("--clients", type=int, default=32, help="concurrent requests per generator")
+    ap.add_argument("--check", type=int, default=200, help="concurrent enqueues in the shared-state check")
+    ap.add_argument("--port", type=int, default=8765)
+    args = ap.parse_args()
+    print({"cpus": os.cpu_count(), "generators": args.generators, "clients": args.generators * args.clients})
+    with tempfile.TemporaryDirectory() as tmp:
+        rows = run(args, os.path.join(tmp, "state.sock"))
+    if any(r["failed"] or r["shared_queue"] != f"{args.check}/{args.check}" for r in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,16 @@ async function api(path, opts = {}) {
   return res.json();
 }
 
+// fetch one page of a paginated list; next is the cursor for the following page (or null)
+async function apiPage(path) {
+  const res = await fetch(API + path, { headers: { 'Content-Type': 'application/json' } });
+  if (!res.ok) throw new Error(await res.text());
+  return { items: await res.json(), next: res.headers.get('X-Next-Cursor') };
+}
+
+const PAGE_SIZE = 200;
+let songsCursor = null;
+
 // remember-me helpers
 function getRememberedUser() {
   try { return localStorage.getItem('rememberUser'); } catch { return null; }
@@ -29,7 +39,10 @@ function el(tag, attrs = {}, children = []) {
 
 let favIds = new Set();
 
+const songCache = new Map();
+
 function liSong(s, withFav = true) {
+  songCache.set(s.id, s);
   const text = `${s.id}: ${s.title} - ${s.artist}`;
   if (!withFav) return el('li', {}, [text]);
   const btn = el('button', { className: 'favBtn', title: 'Toggle Favorite' }, [ favIds.has(s.id) ? '★' : '☆' ]);
@@ -37,17 +50,145 @@ function liSong(s, withFav = true) {
     e.stopPropagation();
     if (favIds.has(s.id)) {
       await api(`/favorites/${s.id}`, { method: 'DELETE' });
-      favIds.delete(s.id);
     } else {
       await api('/favorites', { method: 'POST', body: JSON.stringify({ song_id: s.id }) });
-      favIds.add(s.id);
     }
-    btn.textContent = favIds.has(s.id) ? '★' : '☆';
-    await refreshFavoritesOnly();
+    if (!events) await refreshFavoritesOnly();
   });
   return el('li', {}, [ text, ' ', btn ]);
 }
 
+// --- live updates: the server pushes deltas over /events, so actions need one request ---
+let events = null;
+
+function connectEvents() {
+  if (events || !window.EventSource) return;
+  events = new EventSource(API + '/events');
+  events.onmessage = (e) => applyDelta(JSON.parse(e.data));
+}
+
+function disconnectEvents() {
+  if (events) { events.close(); events = null; }
+}
+
+// refresh everything only when live updates are unavailable
+async function afterAction() {
+  if (!events) await refresh();
+}
+
+function songItem(s, withFav) {
+  const li = liSong(s, withFav);
+  li.dataset.id = s.id;
+  return li;
+}
+
+// queue rows carry their entry id; the Up Next view also gets move-up and remove controls
+function queueItem(s, entry, withFav) {
+  const li = songItem(s, withFav);
+  li.dataset.entry = entry;
+  if (!withFav) {
+    const up = document.createElement('button');
+    up.textContent = '↑';
+    up.title = 'Move up';
+    up.addEventListener('click', async () => {
+      const index = Math.max([...li.parentNode.children].indexOf(li) - 1, 0);
+      await api(`/queue/${entry}/move`, { method: 'POST', body: JSON.stringify({ index }) });
+      await afterAction();
+    });
+    const rm = document.createElement('button');
+    rm.textContent = '✕';
+    rm.title = 'Remove from queue';
+    rm.addEventListener('click', async () => {
+      await api(`/queue/${entry}`, { method: 'DELETE' });
+      await afterAction();
+    });
+    li.append(up, rm);
+  }
+  return li;
+}
+
+function removeFirst(listIds, n) {
+  listIds.forEach((id) => {
+    const list = document.getElementById(id);
+    for (let i = 0; i < n && list && list.firstChild; i++) list.removeChild(list.firstChild);
+  });
+}
+
+let shuffleOn = false;
+
+function showShuffle(on) {
+  shuffleOn = !!on;
+  document.getElementById('shuffleBtn').textContent = `🔀 Shuffle: ${shuffleOn ? 'on' : 'off'}`;
+}
+
+let radioOn = false;
+
+function showRadio(on) {
+  radioOn = !!on;
+  document.getElementById('radioBtn').textContent = `📻 Radio: ${radioOn ? 'on' : 'off'}`;
+}
+
+function applyDelta(d) {
+  const songsEl = document.getElementById('songs');
+  if (d.type === 'reset') {
+    refresh();
+  } else if (d.type === 'added') {
+    // songs beyond the loaded pages arrive with "Load more"
+    if (!songsCursor) d.songs.forEach((s) => songsEl.appendChild(songItem(s, true)));
+    progressSoon();
+  } else if (d.type === 'removed') {
+    // removed songs also drop out of favorites
+    favIds.delete(d.id);
+    ['songs', 'searchResults', 'favorites'].forEach((id) => document.getElementById(id).querySelectorAll(`li[data-id="${d.id}"]`).forEach((li) => li.remove()));
+    progressSoon();
+  } else if (d.type === 'restored') {
+    // an undo put a song back: it goes in front of the first larger id, or last once every page is loaded
+    const after = [...songsEl.children].find((li) => Number(li.dataset.id) > d.song.id);
+    if (after || !songsCursor) songsEl.insertBefore(songItem(d.song, true), after || null);
+    progressSoon();
+  } else if (d.type === 'enqueued') {
+    // "next" entries land in front of the first "end" entry
+    if (d.song) ['queue', 'queueOnly'].forEach((id) => {
+      const list = document.getElementById(id);
+      const before = d.before === null ? null : list.querySelector(`li[data-entry="${d.before}"]`);
+      list.insertBefore(queueItem(d.song, d.entry, id === 'queue'), before);
+    });
+  } else if (d.type === 'unqueued') {
+    document.querySelectorAll(`li[data-entry="${d.entry}"]`).forEach((li) => li.remove());
+  } else if (d.type === 'moved') {
+    ['queue', 'queueOnly'].forEach((id) => {
+      const list = document.getElementById(id);
+      const li = list.querySelector(`li[data-entry="${d.entry}"]`);
+      if (!li) return;
+      li.remove();
+      list.insertBefore(li, list.children[d.index] || null);
+    });
+  } else if (d.type === 'cursor') {
+    removeFirst(['queue', 'queueOnly'], d.queue_pop);
+    removeFirst(['history', 'historyOnly'], d.history_pop);
+    if (d.history_push) {
+      ['history', 'historyOnly'].forEach((id) => {
+        const list = document.getElementById(id);
+        list.insertBefore(songItem(d.history_push, id === 'history'), list.firstChild);
+      });
+    }
+    document.getElementById('nowPlaying').textContent = d.song ? `${d.song.title} - ${d.song.artist}` : 'None';
+    progressSoon();
+  } else if (d.type === 'shuffle') {
+    showShuffle(d.on);
+  } else if (d.type === 'radio') {
+    showRadio(d.on);
+  } else if (d.type === 'favorite') {
+    if (d.on) favIds.add(d.id); else favIds.delete(d.id);
+    document.querySelectorAll(`li[data-id="${d.id}"] .favBtn`).forEach((b) => { b.textContent = d.on ? '★' : '☆'; });
+    const favEl = document.getElementById('favorites');
+    favEl.querySelectorAll(`li[data-id="${d.id}"]`).forEach((li) => li.remove());
+    const s = d.song || songCache.get(d.id);
+    if (d.on && s) favEl.appendChild(songItem(s, true));
+    else if (d.on) refreshFavoritesOnly();
+  }
+}
+
 function setPlayer(song, shouldPlay = false) {
   const player = document.getElementById('player');
   if (!player) return;
@@ -64,6 +205,17 @@ function setPlayer(song, shouldPlay = false) {
   }
 }
 
+// preview URLs are resolved in the background; poll briefly until one arrives
+async function playWhenReady(song) {
+  for (let i = 0; song && !song.audio_url && i < 10; i++) {
+    await new Promise((r) => setTimeout(r, 300));
+    const res = await api('/play');
+    if (!res.song || res.song.id !== song.id) return;
+    song = res.song;
+  }
+  if (song) setPlayer(song, true);
+}
+
 async function refresh() {
   // Check auth first
   const me = await api('/me');
@@ -85,8 +237,10 @@ async function refresh() {
     if (input && u && input.value !== u) input.value = u;
     const player = document.getElementById('player');
     if (player) { try { player.pause(); } catch {} player.removeAttribute('src'); }
+    disconnectEvents();
     return; // do not fetch app data when logged out
   }
+  connectEvents();
 
   // logged in: show app
   loginScreen.classList.add('hidden');
@@ -94,13 +248,19 @@ async function refresh() {
   appRoot.classList.remove('hidden');
   loginBtn.textContent = `Logout (${me.user})`;
 
-  const [songs, queue, history, play, fav] = await Promise.all([
-    api('/songs'),
-    api('/queue'),
-    api('/history'),
+  const [songsPage, queue, history, play, fav, shuffle, radio] = await Promise.all([
+    apiPage(`/songs?limit=${PAGE_SIZE}`),
+    api(`/queue?limit=${PAGE_SIZE}`),
+    api(`/history?limit=${PAGE_SIZE}`),
     api('/play'),
     api('/favorites'),
+    api('/shuffle'),
+    api('/radio'),
   ]);
+  showShuffle(shuffle.shuffle);
+  showRadio(radio.radio);
+  const songs = songsPage.items;
+  songsCursor = songsPage.next;
   favIds = new Set(fav.map(x => x.id));
   const songsEl = document.getElementById('songs');
   const queueEl = document.getElementById('queue');
@@ -110,9 +270,10 @@ async function refresh() {
   queueEl.innerHTML = '';
   historyEl.innerHTML = '';
 
-  songs.forEach((s) => songsEl.appendChild(liSong(s, true)));
-  queue.forEach((s) => queueEl.appendChild(liSong(s)));
-  history.forEach((s) => historyEl.appendChild(liSong(s)));
+  songs.forEach((s) => songsEl.appendChild(songItem(s, true)));
+  updateMoreSongs();
+  queue.forEach((s) => queueEl.appendChild(queueItem(s, s.entry, true)));
+  history.forEach((s) => historyEl.appendChild(songItem(s, true)));
 
   document.getElementById('nowPlaying').textContent = play.song ? `${play.song.title} - ${play.song.artist}` : 'None';
   // Do not auto-play on refresh/login; only update the source silently
@@ -122,6 +283,56 @@ async function refresh() {
   renderFavoritesList(fav);
   renderQueueOnly(queue);
   renderHistoryOnly(history);
+  progressSoon();
+}
+
+function fmtTime(sec) {
+  const h = Math.floor(sec / 3600), m = Math.floor(sec / 60) % 60, s = String(sec % 60).padStart(2, '0');
+  return h ? `${h}:${String(m).padStart(2, '0')}:${s}` : `${m}:${s}`;
+}
+
+// where the current song sits in the whole playlist (O(log n) on the server); bursts of changes share one request
+let progressTimer = null;
+function progressSoon() {
+  clearTimeout(progressTimer);
+  progressTimer = setTimeout(async () => {
+    const p = await api('/duration');
+    const seek = document.getElementById('seekBar');
+    document.getElementById('playlistProgress').textContent = p.position === null
+      ? `${p.songs} songs · ${fmtTime(p.total_sec)}`
+      : `Song ${p.position + 1} of ${p.songs} · ${fmtTime(p.elapsed_sec)} in · ${fmtTime(p.remaining_sec)} left of ${fmtTime(p.total_sec)}`;
+    seek.max = p.total_sec;
+    seek.value = p.elapsed_sec;
+  }, 150);
+}
+
+function updateMoreSongs() {
+  const btn = document.getElementById('moreSongsBtn');
+  if (btn) btn.classList.toggle('hidden', !songsCursor);
+}
+
+async function loadMoreSongs() {
+  if (!songsCursor) return;
+  const page = await apiPage(`/songs?limit=${PAGE_SIZE}&cursor=${songsCursor}`);
+  const songsEl = document.getElementById('songs');
+  page.items.forEach((s) => songsEl.appendChild(songItem(s, true)));
+  songsCursor = page.next;
+  updateMoreSongs();
+}
+
+// search as you type; the server treats the last word as a prefix
+let searchTimer = null;
+
+function searchSoon() {
+  clearTimeout(searchTimer);
+  searchTimer = setTimeout(async () => {
+    const q = document.getElementById('searchBox').value;
+    const el = document.getElementById('searchResults');
+    const results = q.trim() ? await api(`/search?q=${encodeURIComponent(q)}&limit=20`) : [];
+    if (q !== document.getElementById('searchBox').value) return;
+    el.innerHTML = '';
+    results.forEach((s) => el.appendChild(songItem(s, true)));
+  }, 120);
 }
 
 async function refreshFavoritesOnly() {
@@ -134,21 +345,21 @@ function renderFavoritesList(fav) {
   const favEl = document.getElementById('favorites');
   if (!favEl) return;
   favEl.innerHTML = '';
-  fav.forEach(s => favEl.appendChild(liSong(s, true)));
+  fav.forEach(s => favEl.appendChild(songItem(s, true)));
 }
 
 function renderQueueOnly(queue) {
   const elq = document.getElementById('queueOnly');
   if (!elq) return;
   elq.innerHTML = '';
-  queue.forEach(s => elq.appendChild(liSong(s, false)));
+  queue.forEach(s => elq.appendChild(queueItem(s, s.entry, false)));
 }
 
 function renderHistoryOnly(history) {
   const elh = document.getElementById('historyOnly');
   if (!elh) return;
   elh.innerHTML = '';
-  history.forEach(s => elh.appendChild(liSong(s, false)));
+  history.forEach(s => elh.appendChild(songItem(s, false)));
 }
 
 async function init() {
@@ -172,50 +383,85 @@ async function init() {
     if (!title || !artist) return;
     await api('/songs', { method: 'POST', body: JSON.stringify({ title, artist, duration_sec: duration, audio_url }) });
     e.target.reset();
-    await refresh();
+    await afterAction();
   });
 
+  document.getElementById('moreSongsBtn').addEventListener('click', loadMoreSongs);
+  document.getElementById('searchBox').addEventListener('input', searchSoon);
+
   document.getElementById('removeBtn').addEventListener('click', async () => {
     const id = parseInt(document.getElementById('removeId').value, 10);
     if (!id) return;
     await api(`/songs/${id}`, { method: 'DELETE' });
-    await refresh();
+    await afterAction();
   });
 
-  document.getElementById('enqueueBtn').addEventListener('click', async () => {
+  const enqueue = (lane) => async () => {
     const id = parseInt(document.getElementById('enqueueId').value, 10);
     if (!id) return;
-    await api('/enqueue', { method: 'POST', body: JSON.stringify({ song_id: id }) });
-    await refresh();
-  });
+    await api('/queue', { method: 'POST', body: JSON.stringify({ song_id: id, lane }) });
+    await afterAction();
+  };
+  document.getElementById('enqueueBtn').addEventListener('click', enqueue('end'));
+  document.getElementById('playNextBtn').addEventListener('click', enqueue('next'));
 
   document.getElementById('playBtn').addEventListener('click', async () => {
     const res = await api('/play');
-    if (res && res.song) setPlayer(res.song, true);
-    await refresh();
+    if (res && res.song) playWhenReady(res.song);
+    await afterAction();
   });
 
   document.getElementById('nextBtn').addEventListener('click', async () => {
     const res = await api('/next', { method: 'POST' });
-    if (res && res.song) setPlayer(res.song, true);
-    await refresh();
+    if (res && res.song) playWhenReady(res.song);
+    await afterAction();
+  });
+
+  document.getElementById('shuffleBtn').addEventListener('click', async () => {
+    const res = await api('/shuffle', { method: 'POST', body: JSON.stringify({ on: !shuffleOn }) });
+    if (res) showShuffle(res.shuffle);
+  });
+
+  document.getElementById('radioBtn').addEventListener('click', async () => {
+    const res = await api('/radio', { method: 'POST', body: JSON.stringify({ on: !radioOn }) });
+    if (res) showRadio(res.radio);
   });
 
   document.getElementById('prevBtn').addEventListener('click', async () => {
     const res = await api('/previous', { method: 'POST' });
-    if (res && res.song) setPlayer(res.song, true);
-    await refresh();
+    if (res && res.song) playWhenReady(res.song);
+    await afterAction();
+  });
+
+  document.getElementById('seekBar').addEventListener('change', async (e) => {
+    const res = await api('/seek', { method: 'POST', body: JSON.stringify({ offset_sec: parseInt(e.target.value, 10) }) });
+    if (res && res.song) {
+      await playWhenReady(res.song);
+      // previews are short clips, so this lands at most at their end
+      document.getElementById('player').currentTime = res.offset_sec;
+    }
+    await afterAction();
   });
 
   document.getElementById('applyImpl').addEventListener('click', async () => {
     const v = document.getElementById('implSelect').value;
     await api('/impl', { method: 'POST', body: JSON.stringify({ impl: v }) });
-    await refresh();
+    await afterAction();
   });
 
+  // undo and redo change only the library; 409 means there is nothing left to step through
+  ['undo', 'redo'].forEach((what) => document.getElementById(`${what}Btn`).addEventListener('click', async () => {
+    try {
+      await api(`/${what}`, { method: 'POST' });
+    } catch {
+      return;
+    }
+    await afterAction();
+  }));
+
   document.getElementById('seedBtn').addEventListener('click', async () => {
     await api('/seed_fast', { method: 'POST' });
-    await refresh();
+    await afterAction();
   });
 
   // nav/view switching
@@ -232,6 +478,7 @@ async function init() {
     const me = await api('/me');
     if (me.user) {
       await api('/logout', { method: 'POST' });
+      disconnectEvents();
       clearRememberedUser();
       // Immediately show login screen to avoid flicker
       const loginScreen = document.getElementById('loginScreen');
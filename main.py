@@ -1,6 +1,6 @@
 from __future__ import annotations
 from typing import Optional
-from playlist_app.playlist import CircularPlaylist, ListPlaylist
+from playlist_app.playlist import BatchError, CircularPlaylist, ListPlaylist
 
 
 def print_menu() -> None:
@@ -15,6 +15,11 @@ def print_menu() -> None:
     print("8. Show queue")
     print("9. Show history")
     print("10. Switch playlist implementation (Circular/List)")
+    print("11. Toggle shuffle")
+    print("12. Run a batch of operations")
+    print("13. Undo last library change")
+    print("14. Redo")
+    print("15. Toggle radio (pick the next song from what was played together before)")
     print("0. Exit")
 
 
@@ -22,6 +27,26 @@ def describe_song(song: Optional[object]) -> str:
     return str(song) if song else "<no song>"
 
 
+def parse_batch_line(line: str) -> dict:
+    """One batch op from ``add Title | Artist [| seconds]``, ``remove 3``, ``enqueue #0``, ``next``...
+
+    ``#k`` names the song added by line k (counting from 0) of the same batch.
+    """
+    kind, _, rest = line.strip().partition(" ")
+    if kind == "add":
+        parts = [p.strip() for p in rest.split("|")]
+        op = {"op": "add", "title": parts[0], "artist": parts[1] if len(parts) > 1 else ""}
+        if len(parts) > 2 and parts[2].isdigit():
+            op["duration_sec"] = int(parts[2])
+        return op
+    if kind in ("remove", "enqueue", "favorite"):
+        target = rest.strip()
+        if target.startswith("#"):
+            return {"op": kind, "ref": int(target[1:])}
+        return {"op": kind, "song_id": int(target)}
+    return {"op": kind}
+
+
 def run_cli() -> None:
     impl = "circular"
     circular = CircularPlaylist()
@@ -107,6 +132,43 @@ def run_cli() -> None:
             impl = "list" if impl == "circular" else "circular"
             print(f"Switched to {impl.capitalize()} playlist")
 
+        elif choice == "11":
+            active.set_shuffle(not active.shuffle)
+            print("Shuffle on" if active.shuffle else "Shuffle off")
+
+        elif choice == "12":
+            print("One op per line (add Title | Artist | secs, remove ID, enqueue ID, favorite ID, next, previous);")
+            print("#k means the song added on line k. Empty line to run.")
+            ops = []
+            try:
+                while True:
+                    line = input("> ").strip()
+                    if not line:
+                        break
+                    ops.append(parse_batch_line(line))
+            except ValueError:
+                print("Invalid line; batch discarded")
+                continue
+            try:
+                results = active.apply_batch(ops)
+            except BatchError as exc:
+                print(f"Line {exc.index}: {exc}; nothing changed")
+                continue
+            for op, result in zip(ops, results):
+                shown = describe_song(result) if op["op"] in ("add", "next", "previous") else result
+                print(f"{op['op']}: {shown}")
+
+        elif choice in ("13", "14"):
+            done = active.undo() if choice == "13" else active.redo()
+            if not done:
+                print("Nothing to " + ("undo" if choice == "13" else "redo"))
+            else:
+                print("Undone" if choice == "13" else "Redone")
+
+        elif choice == "15":
+            active.set_radio(not active.radio)
+            print("Radio on" if active.radio else "Radio off")
+
         else:
             print("Invalid choice")
 
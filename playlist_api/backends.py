@@ -0,0 +1,394 @@
+"""Where session commands run: in this process, or in a shared state server.
+
+By default every web process keeps its own sessions (``LocalBackend``), so
+running several workers would give each one a different playlist. With
+``PLAYLIST_STATE_SOCKET`` set, workers send commands to one state server
+over a Unix socket instead (``RemoteBackend``); the server owns the
+sessions, the store and the preview lookups, and runs each command
+atomically under its session lock. Workers keep HTTP parsing, validation
+and encoding to themselves, which is where most of a request's time goes.
+
+Frames are a 4-byte big-endian length and a payload. Requests are JSON
+``[id, kind, token, name, args]`` with ``kind`` "call", "stream" or
+"metrics" (the server's own metrics, for the workers' ``/metrics``);
+replies are a JSON header ``[id, status, new_token, cursor, more, etag]``,
+a newline and the body bytes.
+
+    python -m playlist_api.backends --workers 4 --port 8000
+
+Or run the state server on its own and point the web workers at it (it
+keeps the sessions while they restart):
+
+    python -m playlist_api.backends --state-only --socket /tmp/playlist.sock
+    python -m playlist_api.backends --workers 4 --socket /tmp/playlist.sock
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import struct
+import tempfile
+import time
+from typing import Any, AsyncIterator, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from .commands import Commands, CommandError, Reply, make_resolver, make_sessions, open_store
+from .metrics import REGISTRY
+
+_LENGTH = struct.Struct("!I")
+
+
+def _frame(payload: bytes) -> bytes:
+    return _LENGTH.pack(len(payload)) + payload
+
+
+def _reply_frame(
+    rid: int, status: int, token: Optional[str], cursor: Optional[int], more: bool, body: bytes, etag: Optional[str] = None
+) -> bytes:
+    return _frame(json.dumps([rid, status, token, cursor, more, etag]).encode() + b"\n" + body)
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> bytes:
+    (n,) = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+    return await reader.readexactly(n)
+
+
+async def _read_reply(reader: asyncio.StreamReader) -> tuple[list[Any], bytes]:
+    header, _, body = (await _read_frame(reader)).partition(b"\n")
+    return json.loads(header), body
+
+
+def _error(status: int, token: Optional[str], body: bytes) -> CommandError:
+    return CommandError(status, json.loads(body), token)
+
+
+class LocalBackend:
+    """Commands run in this process against its own sessions."""
+
+    def __init__(self, commands: Commands) -> None:
+        self.commands = commands
+
+    async def call(self, token: Optional[str], name: str, *args: Any) -> tuple[Optional[str], Reply]:
+        return await self.commands.call(token, name, list(args))
+
+    async def stream(self, token: Optional[str], name: str, *args: Any) -> tuple[Optional[str], AsyncIterator[bytes]]:
+        return self.commands.stream(token, name, list(args))
+
+    async def metrics(self) -> bytes:
+        # the sessions are in this process, so its registry already has everything
+        return b""
+
+    async def aclose(self) -> None:
+        await self.commands.resolver.aclose()
+
+
+class RemoteBackend:
+    """Commands sent to a ``StateServer`` listening on the Unix socket ``path``.
+
+    Calls share one connection per process, tagged with request ids so
+    replies can come back in any order; each stream gets a connection of
+    its own, closed when the stream ends. A lost connection fails the
+    calls in flight and is reopened by the next call.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._connecting: Optional[asyncio.Lock] = None
+        self._reading: Optional[asyncio.Task[None]] = None
+        self._pending: dict[int, asyncio.Future[tuple[list[Any], bytes]]] = {}
+        self._ids = itertools.count(1)
+
+    async def _connection(self) -> asyncio.StreamWriter:
+        if self._writer is not None:
+            return self._writer
+        if self._connecting is None:
+            self._connecting = asyncio.Lock()
+        async with self._connecting:
+            if self._writer is None:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+                self._reading = asyncio.create_task(self._read_replies(reader, writer))
+                self._writer = writer
+        return self._writer
+
+    async def _read_replies(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                header, body = await _read_reply(reader)
+                fut = self._pending.pop(header[0], None)
+                if fut is not None and not fut.done():
+                    fut.set_result((header, body))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if self._writer is writer:
+                self._writer = None
+            writer.close()
+            pending, self._pending = self._pending, {}
+            for fut in pending.values():
+                if not fut.done():
+                    fut.set_exception(ConnectionError("state server connection lost"))
+
+    async def _request(self, kind: str, token: Optional[str], name: str, args: Any) -> tuple[list[Any], bytes]:
+        writer = await self._connection()
+        rid = next(self._ids)
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[rid] = fut
+        writer.write(_frame(json.dumps([rid, kind, token, name, args]).encode()))
+        return await fut
+
+    async def call(self, token: Optional[str], name: str, *args: Any) -> tuple[Optional[str], Reply]:
+        (_, status, created, cursor, _, etag), body = await self._request("call", token, name, args)
+        if status >= 400:
+            raise _error(status, created, body)
+        return created, Reply(body, cursor, etag, status)
+
+    async def metrics(self) -> bytes:
+        _, body = await self._request("metrics", None, "", [])
+        return body
+
+    async def stream(self, token: Optional[str], name: str, *args: Any) -> tuple[Optional[str], AsyncIterator[bytes]]:
+        reader, writer = await asyncio.open_unix_connection(self.path)
+        writer.write(_frame(json.dumps([0, "stream", token, name, args]).encode()))
+        try:
+            # the first reply opens the stream (or refuses it) before any data
+            (_, status, created, _, _, _), body = await _read_reply(reader)
+        except BaseException:
+            writer.close()
+            raise
+        if status != 200:
+            writer.close()
+            raise _error(status, created, body)
+
+        async def chunks() -> AsyncIterator[bytes]:
+            try:
+                while True:
+                    (_, status, _, _, more, _), body = await _read_reply(reader)
+                    if status != 200:
+                        return
+                    if body:
+                        yield body
+                    if not more:
+                        return
+            finally:
+                writer.close()
+
+        return created, chunks()
+
+    async def aclose(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        if self._reading is not None:
+            await asyncio.gather(self._reading, return_exceptions=True)
+
+
+class StateServer:
+    """Serves ``commands`` to ``RemoteBackend`` clients on a Unix socket.
+
+    Each call runs as its own task, so a slow command (a big listing in the
+    threadpool) does not hold up the calls behind it on the connection;
+    per-session ordering comes from the session lock as it does in-process.
+    """
+
+    def __init__(self, commands: Commands, path: str) -> None:
+        self.commands = commands
+        self.path = path
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_unix_server(self._serve, path=self.path)
+
+    async def serve_forever(self) -> None:
+        assert self._server is not None
+        await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                rid, kind, token, name, args = json.loads(await _read_frame(reader))
+                if kind == "stream":
+                    # a stream has the connection to itself until it ends
+                    await self._stream(writer, token, name, args)
+                    return
+                if kind == "metrics":
+                    task = asyncio.create_task(self._metrics(writer, rid))
+                else:
+                    task = asyncio.create_task(self._call(writer, rid, token, name, args))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _call(self, writer: asyncio.StreamWriter, rid: int, token: Optional[str], name: str, args: list[Any]) -> None:
+        try:
+            created, reply = await self.commands.call(token, name, args)
+        except CommandError as exc:
+            writer.write(_reply_frame(rid, exc.status, exc.token, None, False, json.dumps(exc.detail).encode()))
+        except Exception:
+            # answer anyway so the worker is not left waiting, then let the loop log it
+            writer.write(_reply_frame(rid, 500, None, None, False, b'"Internal Server Error"'))
+            raise
+        else:
+            writer.write(_reply_frame(rid, reply.status, created, reply.cursor, False, reply.body, reply.etag))
+        await writer.drain()
+
+    async def _metrics(self, writer: asyncio.StreamWriter, rid: int) -> None:
+        body = await run_in_threadpool(REGISTRY.render)
+        writer.write(_reply_frame(rid, 200, None, None, False, body))
+        await writer.drain()
+
+    async def _stream(self, writer: asyncio.StreamWriter, token: Optional[str], name: str, args: list[Any]) -> None:
+        try:
+            created, chunks = self.commands.stream(token, name, args)
+        except CommandError as exc:
+            writer.write(_reply_frame(0, exc.status, exc.token, None, False, json.dumps(exc.detail).encode()))
+            return
+        writer.write(_reply_frame(0, 200, created, None, True, b""))
+        try:
+            async for chunk in chunks:
+                writer.write(_reply_frame(0, 200, None, None, True, chunk))
+                # raises once the worker hangs up, which ends the stream
+                await writer.drain()
+            writer.write(_reply_frame(0, 200, None, None, False, b""))
+            await writer.drain()
+        finally:
+            await chunks.aclose()  # type: ignore[attr-defined]
+
+
+async def _orphaned(parent: int) -> None:
+    # returns once the process that started us has gone
+    while os.getppid() == parent:
+        await asyncio.sleep(1)
+
+
+def listening(path: str) -> bool:
+    """Whether a state server accepts connections on ``path``."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+def _claim(path: str) -> None:
+    # a socket file left behind by a server that is gone is replaced; a live server never is
+    if listening(path):
+        raise RuntimeError(f"a state server is already listening on {path}")
+    if os.path.exists(path):
+        os.unlink(path)
+
+
+def serve(path: str, parent: Optional[int] = None) -> None:
+    """Run a state server on ``path`` (with the store and settings from the environment) until stopped.
+
+    Raises RuntimeError if another one is listening there. With ``parent``,
+    it also stops when that process exits: uvicorn ends by re-raising the
+    signal that stopped it, so ``main`` never gets to stop us.
+    """
+    _claim(path)
+
+    async def run() -> None:
+        sessions = make_sessions()
+        store = open_store(sessions)
+        commands = Commands(sessions, make_resolver())
+        server = StateServer(commands, path)
+        await server.start()
+        serving = asyncio.create_task(server.serve_forever())
+        # terminate() sends SIGTERM: stop serving but still flush and close the store
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, serving.cancel)
+        if parent is not None:
+            asyncio.create_task(_orphaned(parent)).add_done_callback(lambda _: serving.cancel())
+        try:
+            await serving
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await server.close()
+            await commands.resolver.aclose()
+            if store is not None:
+                store.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+def start_state_server(path: str, timeout: float = 10.0) -> multiprocessing.Process:
+    """Start ``serve(path)`` in a child process and wait until it accepts connections."""
+    _claim(path)
+    proc = multiprocessing.Process(target=serve, args=(path, os.getpid()), name="playlist-state", daemon=True)
+    proc.start()
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path):
+        if not proc.is_alive() or time.monotonic() > deadline:
+            proc.terminate()
+            raise RuntimeError(f"state server did not start on {path}")
+        time.sleep(0.01)
+    return proc
+
+
+def main() -> None:
+    import uvicorn
+
+    ap = argparse.ArgumentParser(description="Run the API, sharing sessions between workers when there are several.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8000)
+    ap.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", "1")))
+    ap.add_argument(
+        "--socket",
+        default=os.environ.get("PLAYLIST_STATE_SOCKET"),
+        help="socket of a state server to use (or, with --state-only, to serve on); default: start one on a temp file",
+    )
+    ap.add_argument("--state-only", action="store_true", help="run just the state server, on --socket, for web workers started separately")
+    args = ap.parse_args()
+    if args.state_only:
+        if not args.socket:
+            ap.error("--state-only needs --socket")
+        if listening(args.socket):
+            ap.error(f"a state server is already listening on {args.socket}")
+        serve(args.socket)
+        return
+    if args.socket:
+        # someone else runs the state server: use it, never replace it
+        deadline = time.monotonic() + 10.0
+        while not listening(args.socket):
+            if time.monotonic() > deadline:
+                ap.error(f"no state server on {args.socket}; start one with --state-only --socket {args.socket}")
+            time.sleep(0.05)
+        os.environ["PLAYLIST_STATE_SOCKET"] = args.socket
+        uvicorn.run("playlist_api.server:app", host=args.host, port=args.port, workers=args.workers)
+        return
+    if args.workers <= 1:
+        # one process: sessions stay in it
+        uvicorn.run("playlist_api.server:app", host=args.host, port=args.port)
+        return
+    path = os.path.join(tempfile.mkdtemp(prefix="playlist-"), "state.sock")
+    state = start_state_server(path)
+    os.environ["PLAYLIST_STATE_SOCKET"] = path
+    try:
+        uvicorn.run("playlist_api.server:app", host=args.host, port=args.port, workers=args.workers)
+    finally:
+        state.terminate()
+        state.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,714 @@
+"""Session commands: everything the HTTP API does to a session, by name.
+
+A command is a coroutine ``(commands, session, *args) -> Reply`` that runs
+wherever the sessions live: in the web process by default, or in the state
+server that several web workers share (see ``backends``). Arguments are
+plain JSON values and replies are encoded JSON bytes, so they cross a
+socket unchanged. Streams (exports, server-sent events) are async
+generators of byte chunks.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+from itertools import islice
+from typing import Any, AsyncIterator, Callable, NamedTuple, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from playlist_app.models import songs_json as _songs_json
+from playlist_app.playlist import BatchError
+from playlist_app.smart import Rule
+
+from .previews import ITUNES_SEARCH_URL, PreviewResolver
+from .sessions import _FACTORIES, Playlist, Session, SessionManager, run_locked
+from .store import PlaylistStore
+from . import events, metrics, transfer
+
+# Demo MP3 fallback URLs (royalty-free for testing)
+DEMO_URLS: dict[str, str] = {
+    # Popular song names mapped to demo audio (compat)
+    "Blinding Lights": "https://www.soundhelix.com/examples/mp3/SoundHelix-Song-1.mp3",
+    "Shape of You": "https://www.soundhelix.com/examples/mp3/SoundHelix-Song-2.mp3",
+    "Levitating": "https://www.soundhelix.com/examples/mp3/SoundHelix-Song-3.mp3",
+    "Someone Like You": "https://www.soundhelix.com/examples/mp3/SoundHelix-Song-4.mp3",
+    # SoundHelix exact titles for better UX alignment
+    "SoundHelix Song 1": "https://www.soundhelix.com/examples/mp3/SoundHelix-Song-1.mp3",
+    "SoundHelix Song 2": "https://www.soundhelix.com/examples/mp3/SoundHelix-Song-2.mp3",
+    "SoundHelix Song 3": "https://www.soundhelix.com/examples/mp3/SoundHelix-Song-3.mp3",
+    "SoundHelix Song 4": "https://www.soundhelix.com/examples/mp3/SoundHelix-Song-4.mp3",
+}
+
+
+def _demo_url_for(title: str) -> str | None:
+    key = (title or "").strip()
+    return DEMO_URLS.get(key)
+
+
+_DEMO_SAMPLES = [
+    ("SoundHelix Song 1", "SoundHelix", 200),
+    ("SoundHelix Song 2", "SoundHelix", 233),
+    ("SoundHelix Song 3", "SoundHelix", 203),
+    ("SoundHelix Song 4", "SoundHelix", 285),
+]
+
+
+# New playlists start with the demo tracks (no preview lookups)
+def _seed_demo(pl: Playlist) -> None:
+    for t, a, d in _DEMO_SAMPLES:
+        pl.add_song(t, a, d, _demo_url_for(t))
+
+
+# what PLAYLIST_METRICS_TIMING=1 times, on both implementations
+TIMED_OPS = (
+    "play", "next", "previous", "add_song", "add_songs_bulk", "remove_song",
+    "list_songs", "songs_after", "window", "search", "enqueue_next", "unqueue", "move_queued",
+    "set_shuffle", "add_favorite", "remove_favorite", "jump_to", "seek", "song_at", "progress", "apply_batch",
+    "undo", "redo", "set_radio", "set_smart", "smart_next", "smart_previous", "smart_enqueue",
+)
+
+
+def make_sessions() -> SessionManager:
+    """The session manager as configured by the environment."""
+    # history keeps the newest PLAYLIST_HISTORY_CAP entries in memory (0 = unbounded);
+    # older ones spill to temp files unless PLAYLIST_HISTORY_SPILL=0, which drops them
+    history_cap = int(os.environ.get("PLAYLIST_HISTORY_CAP", "10000"))
+    return SessionManager(
+        max_sessions=int(os.environ.get("PLAYLIST_MAX_SESSIONS", "10000")),
+        idle_ttl=float(os.environ.get("PLAYLIST_SESSION_TTL", "3600")),
+        seed=_seed_demo,
+        playlist_options={
+            "history_cap": history_cap or None,
+            "spill_dir": "" if os.environ.get("PLAYLIST_HISTORY_SPILL", "1") != "0" else None,
+        },
+    )
+
+
+def open_store(sessions: SessionManager) -> Optional[PlaylistStore]:
+    # opt-in persistence: journal every session mutation under PLAYLIST_DATA_DIR
+    data_dir = os.environ.get("PLAYLIST_DATA_DIR")
+    if not data_dir:
+        return None
+    store = PlaylistStore(data_dir)
+    store.open(sessions)
+    return store
+
+
+def make_resolver() -> PreviewResolver:
+    # preview lookups run on the event loop; point PREVIEW_SEARCH_URL at a stand-in server for testing
+    return PreviewResolver(
+        search_url=os.environ.get("PREVIEW_SEARCH_URL", ITUNES_SEARCH_URL),
+        fallback=_demo_url_for,
+    )
+
+
+class Reply(NamedTuple):
+    body: bytes
+    # cursor for the next page, if more remain
+    cursor: Optional[int] = None
+    # validator for listings; with status 304 the body is empty
+    etag: Optional[str] = None
+    status: int = 200
+
+
+class CommandError(Exception):
+    """A command refused; ``status`` and ``detail`` become the HTTP error."""
+
+    def __init__(self, status: int, detail: Any, token: Optional[str] = None) -> None:
+        super().__init__(status, detail)
+        self.status = status
+        self.detail = detail
+        # set when the failing request created its session, so the cookie still goes out
+        self.token = token
+
+
+STREAM_PAGE = 5000
+# batches with more ops than this wait for the lock in the threadpool instead of on the loop
+BATCH_INLINE = 100
+
+
+def _json(value: Any) -> Reply:
+    return Reply(json.dumps(value, separators=(",", ":")).encode())
+
+
+def _current(s) -> Reply:
+    return Reply(b'{"song":' + (s.to_json() if s else b"null") + b"}")
+
+
+def _queue_json(entries) -> bytes:
+    # queue items are songs with their entry id and lane spliced in front
+    return b"[" + b",".join([b'{"entry":%d,"lane":"%s",' % (e, lane.encode()) + s.to_json()[1:] for e, lane, s in entries]) + b"]"
+
+
+def _etag(pl: Playlist, facets: tuple[str, ...]) -> str:
+    return '"%s"' % pl.versions.tag(*facets)
+
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    # If-None-Match compares weakly, so a W/ prefix added by a proxy still matches
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+async def _unchanged(session: Session, facets: tuple[str, ...], if_none_match: Optional[str]) -> Optional[Reply]:
+    """A 304 reply if ``If-None-Match`` names the current listing; reads only the version counters."""
+    if not if_none_match:
+        return None
+    etag = await run_locked(session, lambda: _etag(session.active(), facets))
+    return Reply(b"", etag=etag, status=304) if _matches(if_none_match, etag) else None
+
+
+async def _paged(session: Session, fetch, cursor, limit: int, facets: tuple[str, ...], encode=_songs_json) -> Reply:
+    """One page from ``fetch(playlist, cursor, n) -> (items, next_cursor)``."""
+
+    def page():
+        pl = session.active()
+        return fetch(pl, cursor, limit), _etag(pl, facets)
+
+    (items, next_cursor), etag = await run_locked(session, page)
+    return Reply(encode(items), next_cursor, etag)
+
+
+async def _snapshot(session: Session, read, offload: bool = True):
+    """``read(playlist)`` under the lock, in the threadpool unless ``offload`` is off.
+
+    ``read`` returns a copy or a frozen version (see ``_EXPORTS``): the
+    listing as of one instant, so it can be encoded and sent after the
+    lock is released while mutations carry on.
+    """
+    return await run_locked(session, lambda: read(session.active()), offload=offload)
+
+
+async def _snapshot_json(session: Session, read, facets: tuple[str, ...], encode=_songs_json, offload: bool = True) -> Reply:
+    """Like ``_snapshot``, encoded, with the ETag of the copy taken under the same lock."""
+
+    def copy():
+        pl = session.active()
+        return read(pl), _etag(pl, facets)
+
+    items, etag = await run_locked(session, copy, offload=offload)
+    return Reply(await run_in_threadpool(encode, items), etag=etag)
+
+
+async def _songs_paged(session: Session, cursor, limit: int, facets: tuple[str, ...]) -> Reply:
+    """A page of the library, read from a frozen version after the lock is released."""
+
+    def take():
+        pl = session.active()
+        return pl.snapshot(), _etag(pl, facets)
+
+    library, etag = await run_locked(session, take)
+    page = library.after(cursor, limit + 1)
+    return Reply(_songs_json(page[:limit]), page[limit - 1].id if len(page) > limit else None, etag)
+
+
+def _changed(session: Session) -> Callable[[], None]:
+    """Callback for a preview URL filled in after the fact: the song's JSON changed wherever it is listed."""
+
+    def bump() -> None:
+        for _, pl in session.loaded():
+            pl.versions.songs += 1
+
+    return bump
+
+
+def _window(pl: Playlist, cursor, n: int):
+    return pl.window(n, n), None
+
+
+def _queue_entries_page(pl: Playlist, cursor, n: int):
+    offset = cursor or 0
+    page = pl.up_next.entries(offset, n + 1)
+    return page[:n], (offset + n if len(page) > n else None)
+
+
+def _history_page(pl: Playlist, cursor, n: int):
+    # cursors are positions in the history, so a bounded history skipping removed songs pages on past a short page
+    offset = cursor or 0
+    return pl.history.items(offset, n), (offset + n if offset + n < len(pl.history) else None)
+
+
+def _favorites_page(pl: Playlist, cursor, n: int):
+    return pl.favorites.page(cursor, n)
+
+
+# what a listing reads under the lock: a frozen version of the library (O(1)), copies of the rest
+_EXPORTS: dict[str, Callable[[Playlist], Any]] = {
+    "songs": lambda pl: pl.snapshot(),
+    "queue": lambda pl: list(pl.up_next),
+    "history": lambda pl: list(pl.history),
+}
+
+Command = Callable[..., Any]
+_CALLS: dict[str, Command] = {}
+_STREAMS: dict[str, Command] = {}
+
+
+def _call(fn: Command) -> Command:
+    _CALLS[fn.__name__] = fn
+    return fn
+
+
+def _stream(fn: Command) -> Command:
+    _STREAMS[fn.__name__] = fn
+    return fn
+
+
+class Commands:
+    """Runs commands by name against ``sessions``, creating sessions for unknown tokens."""
+
+    def __init__(self, sessions: SessionManager, resolver: PreviewResolver) -> None:
+        self.sessions = sessions
+        self.resolver = resolver
+        # sessions are reported (and playlist operations timed) by whichever process runs the commands
+        metrics.REGISTRY.collector("sessions", self._gauges)
+        if metrics.TIMING:
+            for impl, cls in _FACTORIES.items():
+                metrics.time_methods(cls, impl, TIMED_OPS)
+
+    def _gauges(self):
+        """Library, queue and history sizes: totals and largest per implementation.
+
+        With PLAYLIST_METRICS_PER_PLAYLIST=1 also one series per playlist,
+        labelled with a hash of the session token (the token itself is a secret).
+        """
+        per_playlist = os.environ.get("PLAYLIST_METRICS_PER_PLAYLIST") == "1"
+        sizes: dict[str, dict[str, list[int]]] = {what: {} for what in ("songs", "queue", "history")}
+        rows = []
+        sessions = self.sessions.snapshot()
+        for session in sessions:
+            for impl, pl in session.loaded():
+                # len() on each structure is a single read, so no lock is needed for a gauge
+                row = {"songs": len(pl), "queue": len(pl.up_next), "history": len(pl.history)}
+                for what, n in row.items():
+                    sizes[what].setdefault(impl, []).append(n)
+                if per_playlist:
+                    rows.append((hashlib.sha256(session.token.encode()).hexdigest()[:12], impl, row))
+        yield "playlist_sessions", "Live sessions.", (), [((), len(sessions))]
+        yield "playlist_playlists", "Playlists built, by implementation.", ("impl",), [((impl,), len(ns)) for impl, ns in sorted(sizes["songs"].items())]
+        for what, help in (("songs", "Songs in the library"), ("queue", "Queued entries"), ("history", "Play history entries")):
+            by_impl = sorted(sizes[what].items())
+            yield f"playlist_{what}_total", f"{help}, summed over playlists.", ("impl",), [((impl,), sum(ns)) for impl, ns in by_impl]
+            yield f"playlist_{what}_max", f"{help} of the largest playlist.", ("impl",), [((impl,), max(ns)) for impl, ns in by_impl]
+            if per_playlist:
+                yield f"playlist_{what}", f"{help}, per playlist.", ("session", "impl"), [((sid, impl), row[what]) for sid, impl, row in rows]
+
+    def _session(self, token: Optional[str]) -> tuple[Session, Optional[str]]:
+        session, created = self.sessions.get_or_create(token)
+        return session, session.token if created else None
+
+    async def call(self, token: Optional[str], name: str, args: list[Any]) -> tuple[Optional[str], Reply]:
+        """Run command ``name``; returns the new session's token (if one was made) and the reply."""
+        fn = _CALLS.get(name)
+        if fn is None:
+            raise CommandError(400, f"unknown command {name!r}")
+        session, created = self._session(token)
+        try:
+            return created, await fn(self, session, *args)
+        except CommandError as exc:
+            exc.token = created
+            raise
+
+    def stream(self, token: Optional[str], name: str, args: list[Any]) -> tuple[Optional[str], AsyncIterator[bytes]]:
+        fn = _STREAMS.get(name)
+        if fn is None:
+            raise CommandError(400, f"unknown stream {name!r}")
+        session, created = self._session(token)
+        return created, fn(self, session, *args)
+
+
+# --- commands ---
+
+
+@_call
+async def songs(
+    cmds: Commands, session: Session, limit: Optional[int], cursor: Optional[int], window: Optional[int], if_none_match: Optional[str] = None
+) -> Reply:
+    facets = ("library",) if window is None else ("library", "cursor")
+    unchanged = await _unchanged(session, facets, if_none_match)
+    if unchanged is not None:
+        return unchanged
+    if window is not None:
+        return await _paged(session, _window, None, window, facets)
+    if limit is None and cursor is None:
+        return await _snapshot_json(session, _EXPORTS["songs"], facets, offload=False)
+    return await _songs_paged(session, cursor, limit or 100, facets)
+
+
+@_call
+async def search(cmds: Commands, session: Session, q: str, limit: int) -> Reply:
+    # the first search builds the index, so this one always leaves the loop
+    return Reply(_songs_json(await run_locked(session, lambda: session.active().search(q, limit), offload=True)))
+
+
+@_call
+async def add_song(cmds: Commands, session: Session, title: str, artist: str, duration_sec: int, audio_url: Optional[str]) -> Reply:
+    s = await run_locked(session, lambda: session.active().add_song(title, artist, duration_sec, audio_url))
+    cmds.resolver.fill_soon(s, _changed(session))
+    return Reply(s.to_json())
+
+
+@_call
+async def add_songs(cmds: Commands, session: Session, rows: list[list[Any]]) -> Reply:
+    """Add parsed import rows in bulk (no preview lookups)."""
+    await run_locked(session, lambda: session.active().add_songs_bulk(rows), offload=True)
+    return _json(len(rows))
+
+
+def _batch_result(kind: str, op: dict[str, Any], result: Any) -> bytes:
+    if kind == "add":
+        return result.to_json()
+    if kind == "remove":
+        return b'{"removed":true}'
+    if kind == "enqueue":
+        return b'{"entry":%d,"lane":"%s"}' % (result, op.get("lane", "end").encode())
+    if kind == "favorite":
+        return b'{"favorited":true}'
+    return _current(result).body
+
+
+@_call
+async def batch(cmds: Commands, session: Session, ops: list[dict[str, Any]]) -> Reply:
+    """Apply ``ops`` atomically to the active playlist (see ``apply_batch``); one result per op."""
+    try:
+        results = await run_locked(session, lambda: session.active().apply_batch(ops), offload=len(ops) > BATCH_INLINE)
+    except BatchError as exc:
+        raise CommandError(422, {"index": exc.index, "error": str(exc)})
+    changed = _changed(session)
+    for op, result in zip(ops, results):
+        if op["op"] in ("add", "next", "previous") and result is not None:
+            cmds.resolver.fill_soon(result, changed)
+    return Reply(b'{"results":[' + b",".join([_batch_result(op["op"], op, r) for op, r in zip(ops, results)]) + b"]}")
+
+
+@_call
+async def remove_song(cmds: Commands, session: Session, song_id: int) -> Reply:
+    if not await run_locked(session, lambda: session.active().remove_song(song_id)):
+        raise CommandError(404, "Song not found")
+    return _json({"removed": True})
+
+
+async def _undo_step(session: Session, step: Callable[[Playlist], bool], nothing: str) -> Reply:
+    def run():
+        pl = session.active()
+        return step(pl), pl.undo_depth()
+
+    # a step is O(songs it changes), which is a whole import for an undone bulk add
+    done, (undo, redo) = await run_locked(session, run, offload=True)
+    if not done:
+        raise CommandError(409, nothing)
+    return _json({"undo": undo, "redo": redo})
+
+
+@_call
+async def undo(cmds: Commands, session: Session) -> Reply:
+    return await _undo_step(session, lambda pl: pl.undo(), "Nothing to undo")
+
+
+@_call
+async def redo(cmds: Commands, session: Session) -> Reply:
+    return await _undo_step(session, lambda pl: pl.redo(), "Nothing to redo")
+
+
+async def _move(cmds: Commands, session: Session, step: Callable[[Playlist], Any]) -> Reply:
+    s = await run_locked(session, lambda: step(session.active()))
+    if s:
+        cmds.resolver.fill_soon(s, _changed(session))
+    return _current(s)
+
+
+@_call
+async def play(cmds: Commands, session: Session) -> Reply:
+    return await _move(cmds, session, lambda pl: pl.play())
+
+
+@_call
+async def next_song(cmds: Commands, session: Session) -> Reply:
+    return await _move(cmds, session, lambda pl: pl.next())
+
+
+@_call
+async def previous_song(cmds: Commands, session: Session) -> Reply:
+    return await _move(cmds, session, lambda pl: pl.previous())
+
+
+@_call
+async def duration(cmds: Commands, session: Session) -> Reply:
+    # the first timeline query builds the duration index, so like search this leaves the loop
+    return _json(await run_locked(session, lambda: session.active().progress(), offload=True))
+
+
+@_call
+async def song_at(cmds: Commands, session: Session, position: int) -> Reply:
+    hit = await run_locked(session, lambda: session.active().song_at(position), offload=True)
+    if hit is None:
+        raise CommandError(404, "No song at that position")
+    song, start = hit
+    return Reply(b'{"position":%d,"start_sec":%d,"song":' % (position, start) + song.to_json() + b"}")
+
+
+@_call
+async def seek(cmds: Commands, session: Session, offset_sec: int) -> Reply:
+    hit = await run_locked(session, lambda: session.active().seek(offset_sec), offload=True)
+    if hit is None:
+        raise CommandError(404, "Offset is past the end of the playlist")
+    song, into = hit
+    cmds.resolver.fill_soon(song, _changed(session))
+    return Reply(b'{"song":' + song.to_json() + b',"offset_sec":%d}' % into)
+
+
+@_call
+async def enqueue(cmds: Commands, session: Session, song_id: int, lane: str) -> Reply:
+    entry = await run_locked(session, lambda: session.active().enqueue_next(song_id, lane))
+    if entry is None:
+        raise CommandError(404, "Song not found to enqueue")
+    return _json({"enqueued": True, "entry": entry, "lane": lane})
+
+
+@_call
+async def queue(cmds: Commands, session: Session, limit: Optional[int], cursor: Optional[int], if_none_match: Optional[str] = None) -> Reply:
+    unchanged = await _unchanged(session, ("queue",), if_none_match)
+    if unchanged is not None:
+        return unchanged
+    if limit is None and cursor is None:
+        return await _snapshot_json(session, lambda pl: pl.up_next.entries(), ("queue",), _queue_json)
+    return await _paged(session, _queue_entries_page, cursor, limit or 100, ("queue",), _queue_json)
+
+
+@_call
+async def unqueue(cmds: Commands, session: Session, entry_id: int) -> Reply:
+    if not await run_locked(session, lambda: session.active().unqueue(entry_id)):
+        raise CommandError(404, "Queue entry not found")
+    return _json({"removed": True})
+
+
+@_call
+async def move_queued(cmds: Commands, session: Session, entry_id: int, index: int) -> Reply:
+    lane = await run_locked(session, lambda: session.active().move_queued(entry_id, index))
+    if lane is None:
+        raise CommandError(404, "Queue entry not found")
+    return _json({"entry": entry_id, "lane": lane})
+
+
+@_call
+async def history(cmds: Commands, session: Session, limit: Optional[int], cursor: Optional[int], if_none_match: Optional[str] = None) -> Reply:
+    unchanged = await _unchanged(session, ("history",), if_none_match)
+    if unchanged is not None:
+        return unchanged
+    if limit is None and cursor is None:
+        return await _snapshot_json(session, _EXPORTS["history"], ("history",))
+    return await _paged(session, _history_page, cursor, limit or 100, ("history",))
+
+
+@_call
+async def set_impl(cmds: Commands, session: Session, impl: str) -> Reply:
+    await run_locked(session, lambda: session.set_impl(impl))
+    return _json({"impl": impl})
+
+
+@_call
+async def shuffle(cmds: Commands, session: Session) -> Reply:
+    return _json({"shuffle": await run_locked(session, lambda: session.active().shuffle)})
+
+
+@_call
+async def set_shuffle(cmds: Commands, session: Session, on: bool, seed: Optional[int]) -> Reply:
+    def toggle():
+        pl = session.active()
+        pl.set_shuffle(on, seed)
+        return pl.shuffle
+
+    return _json({"shuffle": await run_locked(session, toggle)})
+
+
+@_call
+async def radio(cmds: Commands, session: Session) -> Reply:
+    return _json({"radio": await run_locked(session, lambda: session.active().radio)})
+
+
+@_call
+async def set_radio(cmds: Commands, session: Session, on: bool, seed: Optional[int]) -> Reply:
+    def toggle():
+        pl = session.active()
+        pl.set_radio(on, seed)
+        return pl.radio
+
+    # turning it on learns from up to Radio.WARM_START history entries
+    return _json({"radio": await run_locked(session, toggle, offload=on)})
+
+
+def _seeded(added) -> Reply:
+    return Reply(b'{"seeded":%d,"songs":' % len(added) + _songs_json(added) + b"}")
+
+
+@_call
+async def seed(cmds: Commands, session: Session) -> Reply:
+    samples = [
+        ("Blinding Lights", "The Weeknd", 200),
+        ("Shape of You", "Ed Sheeran", 233),
+        ("Levitating", "Dua Lipa", 203),
+        ("Someone Like You", "Adele", 285),
+    ]
+    previews = await cmds.resolver.resolve_many([(t, a) for t, a, _ in samples])
+    return _seeded(
+        await run_locked(
+            session,
+            lambda: [session.active().add_song(t, a, d, preview or _demo_url_for(t)) for (t, a, d), preview in zip(samples, previews)],
+        )
+    )
+
+
+@_call
+async def seed_fast(cmds: Commands, session: Session) -> Reply:
+    # Use titles that match the demo audio so names and sound align
+    return _seeded(await run_locked(session, lambda: [session.active().add_song(t, a, d, _demo_url_for(t)) for t, a, d in _DEMO_SAMPLES]))
+
+
+@_call
+async def me(cmds: Commands, session: Session) -> Reply:
+    return _json({"user": session.user})
+
+
+@_call
+async def login(cmds: Commands, session: Session, user: Optional[str]) -> Reply:
+    await run_locked(session, lambda: session.login(user))
+    return _json({"user": user, "session": session.token})
+
+
+@_call
+async def logout(cmds: Commands, session: Session) -> Reply:
+    await run_locked(session, session.logout)
+    return _json({"ok": True})
+
+
+@_call
+async def favorites(cmds: Commands, session: Session, limit: Optional[int], cursor: Optional[int], if_none_match: Optional[str] = None) -> Reply:
+    unchanged = await _unchanged(session, ("favorites",), if_none_match)
+    if unchanged is not None:
+        return unchanged
+    if limit is None and cursor is None:
+        return await _snapshot_json(session, lambda pl: list(pl.favorites), ("favorites",))
+    return await _paged(session, _favorites_page, cursor, limit or 100, ("favorites",))
+
+
+@_call
+async def add_favorite(cmds: Commands, session: Session, song_id: int) -> Reply:
+    if not await run_locked(session, lambda: session.active().add_favorite(song_id)):
+        raise CommandError(404, "Song not found")
+    return _json({"favorited": True})
+
+
+@_call
+async def remove_favorite(cmds: Commands, session: Session, song_id: int) -> Reply:
+    await run_locked(session, lambda: session.active().remove_favorite(song_id))
+    return _json({"favorited": False})
+
+
+def _smart_json(name: str, view) -> bytes:
+    current = view.play()
+    head = json.dumps({"name": name, "rule": view.rule.to_json(), "songs": len(view)}, separators=(",", ":")).encode()
+    return head[:-1] + b',"current":' + (current.to_json() if current else b"null") + b"}"
+
+
+async def _smart(session: Session, name: str, fn: Callable[[Playlist], Any], offload: bool = False) -> Any:
+    """``fn(playlist)`` under the lock; 404 unless the active playlist has a smart playlist ``name``."""
+
+    def run():
+        pl = session.active()
+        return (True, fn(pl)) if name in pl.smart else (False, None)
+
+    found, result = await run_locked(session, run, offload=offload)
+    if not found:
+        raise CommandError(404, "Smart playlist not found")
+    return result
+
+
+@_call
+async def smart_lists(cmds: Commands, session: Session) -> Reply:
+    return Reply(await run_locked(session, lambda: b"[" + b",".join([_smart_json(n, v) for n, v in session.active().smart.items()]) + b"]"))
+
+
+@_call
+async def set_smart(cmds: Commands, session: Session, name: str, rule: dict[str, Any]) -> Reply:
+    try:
+        parsed = Rule.from_json(rule)
+        # filters the whole library once, so it leaves the loop
+        return Reply(await run_locked(session, lambda: _smart_json(name, session.active().set_smart(name, parsed)), offload=True))
+    except ValueError as exc:
+        raise CommandError(422, str(exc))
+
+
+@_call
+async def drop_smart(cmds: Commands, session: Session, name: str) -> Reply:
+    if not await run_locked(session, lambda: session.active().drop_smart(name)):
+        raise CommandError(404, "Smart playlist not found")
+    return _json({"removed": True})
+
+
+@_call
+async def smart_songs(cmds: Commands, session: Session, name: str, limit: Optional[int], cursor: Optional[int]) -> Reply:
+    # a frozen version of the view, read after the lock is released
+    songs = await _smart(session, name, lambda pl: pl.smart[name].snapshot())
+    if limit is None and cursor is None:
+        return Reply(await run_in_threadpool(_songs_json, songs))
+    limit = limit or 100
+    page = songs.after(cursor, limit + 1)
+    return Reply(_songs_json(page[:limit]), page[limit - 1].id if len(page) > limit else None)
+
+
+async def _smart_move(cmds: Commands, session: Session, name: str, step: Callable[[Playlist], Any]) -> Reply:
+    s = await _smart(session, name, step)
+    if s:
+        cmds.resolver.fill_soon(s, _changed(session))
+    return _current(s)
+
+
+@_call
+async def smart_play(cmds: Commands, session: Session, name: str) -> Reply:
+    return await _smart_move(cmds, session, name, lambda pl: pl.smart[name].play())
+
+
+@_call
+async def smart_next(cmds: Commands, session: Session, name: str) -> Reply:
+    return await _smart_move(cmds, session, name, lambda pl: pl.smart_next(name))
+
+
+@_call
+async def smart_previous(cmds: Commands, session: Session, name: str) -> Reply:
+    return await _smart_move(cmds, session, name, lambda pl: pl.smart_previous(name))
+
+
+@_call
+async def smart_enqueue(cmds: Commands, session: Session, name: str, song_id: int, lane: str) -> Reply:
+    entry = await _smart(session, name, lambda pl: pl.smart_enqueue(name, song_id, lane))
+    if entry is None:
+        raise CommandError(404, "Song is not in the smart playlist")
+    return _json({"enqueued": True, "entry": entry, "lane": lane})
+
+
+# --- streams ---
+
+
+@_stream
+async def export(cmds: Commands, session: Session, what: str, format: str) -> AsyncIterator[bytes]:
+    header = transfer.export_header(format)
+    if header:
+        yield header.encode()
+    # one snapshot up front, then pages encoded with the lock released
+    items = iter(await _snapshot(session, _EXPORTS[what], offload=what != "songs"))
+    while True:
+        page = await run_in_threadpool(lambda: list(islice(items, STREAM_PAGE)))
+        if not page:
+            break
+        chunk = await run_in_threadpool(transfer.export_rows, format, page)
+        if chunk:
+            yield chunk.encode()
+
+
+@_stream
+async def watch(cmds: Commands, session: Session) -> AsyncIterator[bytes]:
+    async for frame in events.stream(session):
+        yield frame
@@ -0,0 +1,134 @@
+from __future__ import annotations
+import asyncio
+from typing import Any, AsyncIterator, Optional
+
+from .sessions import Session, run_locked
+
+KEEPALIVE_SEC = 15.0
+MAX_PENDING = 1000
+
+_RESET = b'{"type":"reset"}'
+# never sent: ends the stream, so the client reconnects to the session as reloaded
+_EVICTED = b'{"type":"evicted"}'
+
+
+def _songs(songs: Any) -> bytes:
+    return b"[" + b",".join([s.to_json() for s in songs]) + b"]"
+
+
+def _cursor(session: Session, impl: str, data: dict[str, Any]) -> bytes:
+    pl = session.playlist(impl)
+    current = pl.play()
+    moved = data.get("history", 0)
+    pushed = pl.history.peek() if moved > 0 else None
+    return b"".join(
+        [
+            b'{"type":"cursor","song":',
+            current.to_json() if current else b"null",
+            b',"queue_pop":%d,"history_push":' % data.get("dequeued", 0),
+            pushed.to_json() if pushed else b"null",
+            b',"history_pop":%d}' % max(-moved, 0),
+        ]
+    )
+
+
+def delta(session: Session, impl: Optional[str], op: str, data: dict[str, Any]) -> list[bytes]:
+    """Translate one session event into JSON deltas for the web UI.
+
+    Runs inside the mutation (under ``session.lock``) so it sees the state
+    right after the change; every delta is O(1) apart from bulk adds.
+    """
+    if impl is None:
+        if op in ("impl", "logout", "drop", "evict"):
+            return [_RESET]
+        return []
+    if impl != session.impl:
+        return []
+    if op == "add":
+        return [b'{"type":"added","songs":[' + data["song"].to_json() + b"]}"]
+    if op == "add_bulk":
+        return [b'{"type":"added","songs":' + _songs(data["songs"]) + b"}"]
+    if op == "enqueue":
+        return [_enqueued(session, impl, data)]
+    if op == "unqueue":
+        return [b'{"type":"unqueued","entry":%d}' % data["entry"]]
+    if op == "requeue":
+        return [b'{"type":"moved","entry":%d,"index":%d}' % (data["entry"], data["index"])]
+    if op == "remove":
+        return [b'{"type":"removed","id":%d}' % data["id"], _cursor(session, impl, data)]
+    if op == "restore":
+        # an undo putting a song back; the cursor moves only if the playlist was empty
+        return [b'{"type":"restored","song":' + data["song"].to_json() + b"}", _cursor(session, impl, data)]
+    if op in ("next", "previous", "jump"):
+        return [_cursor(session, impl, data)]
+    if op == "fav_add":
+        song = session.playlist(impl).get_song(data["id"])
+        return [b'{"type":"favorite","id":%d,"on":true,"song":' % data["id"] + (song.to_json() if song else b"null") + b"}"]
+    if op == "fav_remove":
+        return [b'{"type":"favorite","id":%d,"on":false}' % data["id"]]
+    if op == "shuffle":
+        return [b'{"type":"shuffle","on":%s}' % (b"true" if data["on"] else b"false")]
+    if op == "radio":
+        return [b'{"type":"radio","on":%s}' % (b"true" if data["on"] else b"false")]
+    return []
+
+
+def _enqueued(session: Session, impl: str, data: dict[str, Any]) -> bytes:
+    queue = session.playlist(impl).up_next
+    song = queue.get(data["entry"])
+    # "next" entries go in front of the first "end" entry; "end" entries go last
+    before = queue.first_in("end") if data["lane"] == "next" else None
+    return b"".join(
+        [
+            b'{"type":"enqueued","id":%d,"entry":%d,"lane":"%s","before":' % (data["id"], data["entry"], data["lane"].encode()),
+            b"%d" % before if before is not None else b"null",
+            b',"song":',
+            song.to_json() if song is not None else b"null",
+            b"}",
+        ]
+    )
+
+
+async def stream(session: Session) -> AsyncIterator[bytes]:
+    """Server-Sent Events for ``session`` until the client goes away."""
+    loop = asyncio.get_running_loop()
+    pending: asyncio.Queue[bytes] = asyncio.Queue()
+    overflowed = False
+
+    def push(frames: list[bytes]) -> None:
+        nonlocal overflowed
+        if overflowed:
+            return
+        if pending.qsize() + len(frames) > MAX_PENDING:
+            # slow client: drop the backlog and tell it to re-fetch
+            overflowed = True
+            while not pending.empty():
+                pending.get_nowait()
+            pending.put_nowait(_RESET)
+            return
+        for frame in frames:
+            pending.put_nowait(frame)
+
+    def on_event(s: Session, impl: Optional[str], op: str, data: dict[str, Any]) -> None:
+        frames = delta(s, impl, op, data)
+        if frames:
+            loop.call_soon_threadsafe(push, frames)
+        if impl is None and op == "evict":
+            loop.call_soon_threadsafe(pending.put_nowait, _EVICTED)
+
+    await run_locked(session, lambda: session.subscribe(on_event))
+    try:
+        yield b"retry: 2000\n\n"
+        while True:
+            try:
+                frame = await asyncio.wait_for(pending.get(), KEEPALIVE_SEC)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            if frame is _EVICTED:
+                return
+            if frame is _RESET:
+                overflowed = False
+            yield b"data: " + frame + b"\n\n"
+    finally:
+        await run_locked(session, lambda: session.unsubscribe(on_event))
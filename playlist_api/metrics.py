@@ -0,0 +1,278 @@
+"""Prometheus-style metrics in the text exposition format.
+
+Counters and histograms are recorded as things happen; gauges come from
+collectors that read the current state when ``/metrics`` is scraped, so
+nothing is kept up to date on the hot path. A family is only written
+once it has samples, which lets the web workers and a shared state
+server each report their own families side by side.
+
+``PLAYLIST_METRICS=0`` turns off the HTTP middleware and ``/metrics``;
+``PLAYLIST_METRICS_TIMING=1`` also times every playlist operation, by
+wrapping the playlist methods, so the classes are left untouched (and
+cost nothing extra) unless it is set.
+"""
+from __future__ import annotations
+import functools
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Any, Callable, Iterable
+
+ENABLED = os.environ.get("PLAYLIST_METRICS", "1") != "0"
+TIMING = ENABLED and os.environ.get("PLAYLIST_METRICS_TIMING", "0") == "1"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# request latency, 0.5ms .. 10s
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# in-memory playlist operations, 1us .. 1s
+OP_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 1e-3, 1e-2, 0.1, 1.0)
+
+# (labels, value) pairs for one gauge family
+Samples = Iterable[tuple[tuple[str, ...], float]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _header(name: str, kind: str, help: str) -> list[str]:
+    return [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class _HistogramChild:
+    __slots__ = ("_bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: tuple[float, ...]) -> None:
+        self._bounds = bounds
+        # one count per bucket plus +Inf, not cumulative until rendered
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect_left(self._bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+
+class _Family(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...]) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self._children: dict[tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _new(self) -> Any:
+        """A fresh child for one set of label values."""
+
+    def labels(self, *values: str) -> Any:
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new())
+        return child
+
+    @abstractmethod
+    def render(self) -> list[str]:
+        """The family's lines in the text format, header included; none without samples."""
+
+
+class Counter(_Family):
+    kind = "counter"
+
+    def _new(self) -> _CounterChild:
+        return _CounterChild()
+
+    def render(self) -> list[str]:
+        lines = _header(self.name, self.kind, self.help)
+        for values, child in sorted(self._children.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, values)} {_number(child.value)}")
+        return lines
+
+
+class Histogram(_Family):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...], buckets: tuple[float, ...]) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+
+    def _new(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def render(self) -> list[str]:
+        lines = _header(self.name, self.kind, self.help)
+        for values, child in sorted(self._children.items()):
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            running = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                running += count
+                le = 'le="%s"' % _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, values, le)} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, values)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, values)} {running}")
+        return lines
+
+
+class Registry:
+    """Metric families plus gauge collectors, rendered together by ``render()``."""
+
+    def __init__(self) -> None:
+        self._families: dict[str, _Family] = {}
+        self._collectors: dict[str, Callable[[], Iterable[tuple[str, str, tuple[str, ...], Samples]]]] = {}
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self._add(Counter(name, help, labels))  # type: ignore[return-value]
+
+    def histogram(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))  # type: ignore[return-value]
+
+    def _add(self, family: _Family) -> _Family:
+        return self._families.setdefault(family.name, family)
+
+    def collector(self, key: str, fn: Callable[[], Iterable[tuple[str, str, tuple[str, ...], Samples]]]) -> None:
+        """Call ``fn()`` on every scrape for ``(name, help, label names, samples)`` gauges.
+
+        Registering again under the same ``key`` replaces the earlier collector.
+        """
+        self._collectors[key] = fn
+
+    def render(self) -> bytes:
+        lines: list[str] = []
+        for family in self._families.values():
+            if family._children:
+                lines.extend(family.render())
+        for fn in list(self._collectors.values()):
+            for name, help, label_names, samples in fn():
+                lines.extend(_header(name, "gauge", help))
+                lines.extend(f"{name}{_labels(label_names, values)} {_number(value)}" for values, value in samples)
+        return ("\n".join(lines) + "\n").encode() if lines else b""
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter("playlist_http_requests_total", "HTTP requests by route and status code.", ("method", "route", "status"))
+HTTP_LATENCY = REGISTRY.histogram(
+    "playlist_http_request_duration_seconds",
+    "Time from receiving a request to sending the last of its response; event streams are left out.",
+    ("method", "route"),
+)
+PREVIEW_LOOKUPS = REGISTRY.counter(
+    "playlist_preview_lookups_total",
+    "Preview URL lookups: hit and negative_hit from the cache, shared with a lookup in flight, or fetched (found, not_found, timeout, error).",
+    ("result",),
+)
+PLAYLIST_OPS = REGISTRY.histogram(
+    "playlist_op_duration_seconds",
+    "Time spent in playlist operations (PLAYLIST_METRICS_TIMING=1).",
+    ("impl", "op"),
+    OP_BUCKETS,
+)
+
+
+class HTTPMetricsMiddleware:
+    """Counts requests and times them, labelled by route template rather than raw path.
+
+    Event streams (``text/event-stream``) are counted but not timed: they
+    stay open as long as the client listens, which says nothing about
+    how fast requests are served.
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        streaming = False
+
+        async def send_status(message: Any) -> None:
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                streaming = any(k == b"content-type" and v.startswith(b"text/event-stream") for k, v in message.get("headers", ()))
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            elapsed = time.perf_counter() - t0
+            # routing fills in scope["route"]; anything unrouted (static files, 404s) shares one label
+            route = getattr(scope.get("route"), "path", None) or "other"
+            if not streaming:
+                HTTP_LATENCY.labels(scope["method"], route).observe(elapsed)
+            HTTP_REQUESTS.labels(scope["method"], route, str(status)).inc()
+
+
+def time_methods(cls: type, impl: str, names: Iterable[str]) -> None:
+    """Replace ``cls``'s methods ``names`` with wrappers recording into ``PLAYLIST_OPS``.
+
+    Only the outermost timed call on a thread is recorded, so an operation
+    made of others (``apply_batch`` adding songs, ``undo`` removing them)
+    counts once, under its own name.
+    """
+    for name in names:
+        fn = getattr(cls, name, None)
+        if fn is None or getattr(fn, "__wrapped__", None) is not None:
+            continue
+        setattr(cls, name, _timed(fn, PLAYLIST_OPS.labels(impl, name)))
+
+
+# set while a timed playlist operation runs on this thread
+_timing = threading.local()
+
+
+def _timed(fn: Callable[..., Any], child: _HistogramChild) -> Callable[..., Any]:
+    clock = time.perf_counter
+    timing = _timing
+
+    @functools.wraps(fn)
+    def timed(*args: Any, **kwargs: Any) -> Any:
+        if getattr(timing, "active", False):
+            return fn(*args, **kwargs)
+        timing.active = True
+        t0 = clock()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            child.observe(clock() - t0)
+            timing.active = False
+
+    return timed
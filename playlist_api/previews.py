@@ -0,0 +1,190 @@
+from __future__ import annotations
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+import httpx
+
+from playlist_app.models import Song
+
+from .metrics import PREVIEW_LOOKUPS
+
+ITUNES_SEARCH_URL = "https://itunes.apple.com/search"
+
+_MISS = object()
+# a lookup that timed out or failed: not cached, so the next one asks again
+_FAILED = object()
+
+
+def _normalize(title: str, artist: str) -> tuple[str, str]:
+    return (" ".join((title or "").split()).casefold(), " ".join((artist or "").split()).casefold())
+
+
+class PreviewCache:
+    """LRU cache with per-entry expiry. ``None`` results are cached too, with their own TTL."""
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        ttl: float = 24 * 3600,
+        negative_ttl: float = 600,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._data: OrderedDict[Hashable, tuple[float, Optional[str]]] = OrderedDict()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._clock = clock
+
+    def get(self, key: Hashable) -> object:
+        entry = self._data.get(key)
+        if entry is None:
+            return _MISS
+        expires, value = entry
+        if expires <= self._clock():
+            del self._data[key]
+            return _MISS
+        self._data.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Optional[str]) -> None:
+        ttl = self.ttl if value else self.negative_ttl
+        self._data[key] = (self._clock() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def _count_hit(value: object) -> None:
+    if value is not _MISS:
+        PREVIEW_LOOKUPS.labels("hit" if value else "negative_hit").inc()
+
+
+class PreviewResolver:
+    """Looks up iTunes preview URLs without blocking request handlers.
+
+    Lookups share one pooled ``httpx.AsyncClient``; results (including
+    tracks the search does not have) are cached, failed lookups are not.
+    Concurrent lookups for the same track share one request, which runs as
+    a task of its own, so a caller giving up does not cancel it for the rest.
+    """
+
+    def __init__(
+        self,
+        search_url: str = ITUNES_SEARCH_URL,
+        timeout: float = 3.0,
+        max_connections: int = 20,
+        cache: Optional[PreviewCache] = None,
+        fallback: Callable[[str], Optional[str]] = lambda title: None,
+    ) -> None:
+        self.search_url = search_url
+        self.fallback = fallback
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.cache = cache or PreviewCache()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._inflight: dict[Hashable, asyncio.Task[Optional[str]]] = {}
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            limits = httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+            self._client = httpx.AsyncClient(timeout=self.timeout, limits=limits)
+        return self._client
+
+    async def _fetch(self, title: str, artist: str) -> object:
+        """The preview URL, None if the search has no such track, or ``_FAILED``."""
+        params = {"term": f"{title} {artist}", "entity": "song", "limit": 1}
+        try:
+            resp = await self._get_client().get(self.search_url, params=params)
+            resp.raise_for_status()
+            results = resp.json().get("results") or []
+        except httpx.TimeoutException:
+            PREVIEW_LOOKUPS.labels("timeout").inc()
+            return _FAILED
+        except (httpx.HTTPError, ValueError):
+            PREVIEW_LOOKUPS.labels("error").inc()
+            return _FAILED
+        url = results[0].get("previewUrl") if results else None
+        PREVIEW_LOOKUPS.labels("found" if url else "not_found").inc()
+        return url
+
+    def cached(self, title: str, artist: str) -> object:
+        hit = self.cache.get(_normalize(title, artist))
+        _count_hit(hit)
+        return hit
+
+    async def resolve(self, title: str, artist: str) -> Optional[str]:
+        key = _normalize(title, artist)
+        hit = self.cache.get(key)
+        _count_hit(hit)
+        if hit is not _MISS:
+            return hit  # type: ignore[return-value]
+        task = self._inflight.get(key)
+        if task is not None:
+            PREVIEW_LOOKUPS.labels("shared").inc()
+        else:
+            task = self._inflight[key] = asyncio.get_running_loop().create_task(self._lookup(key, title, artist))
+        return await asyncio.shield(task)
+
+    async def _lookup(self, key: Hashable, title: str, artist: str) -> Optional[str]:
+        try:
+            url = await self._fetch(title, artist)
+        finally:
+            del self._inflight[key]
+        if url is _FAILED:
+            return None
+        self.cache.put(key, url)  # type: ignore[arg-type]
+        return url  # type: ignore[return-value]
+
+    async def resolve_many(self, pairs: list[tuple[str, str]], concurrency: int = 8) -> list[Optional[str]]:
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one(title: str, artist: str) -> Optional[str]:
+            async with sem:
+                return await self.resolve(title, artist)
+
+        return await asyncio.gather(*(one(t, a) for t, a in pairs))
+
+    async def fill(self, song: Song, changed: Optional[Callable[[], None]] = None) -> None:
+        if song.audio_url:
+            return
+        preview = await self.resolve(song.title, song.artist)
+        if not song.audio_url:
+            song.audio_url = preview or self.fallback(song.title)
+            if changed is not None:
+                changed()
+
+    def fill_soon(self, song: Song, changed: Optional[Callable[[], None]] = None) -> None:
+        """Set ``song.audio_url`` now on a cache hit, otherwise in a background task.
+
+        ``changed()`` is called once the URL is set, so listings holding the song can be revalidated.
+        """
+        if song.audio_url:
+            return
+        hit = self.cached(song.title, song.artist)
+        if hit is not _MISS:
+            song.audio_url = hit or self.fallback(song.title)  # type: ignore[assignment]
+            if changed is not None:
+                changed()
+            return
+        task = asyncio.get_running_loop().create_task(self.fill(song, changed))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def drain(self) -> None:
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def aclose(self) -> None:
+        pending = [*self._tasks, *self._inflight.values()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -1,33 +1,19 @@
 from __future__ import annotations
-
-# Demo MP3 fallback URLs (royalty-free for testing)
-DEMO_URLS: dict[str, str] = {
-    # Popular song names mapped to demo audio (compat)
-    "Blinding Lights": "https://www.soundhelix.com/examples/mp3/SoundHelix-Song-1.mp3",
-    "Shape of You": "https://www.soundhelix.com/examples/mp3/SoundHelix-Song-2.mp3",
-    "Levitating": "https://www.soundhelix.com/examples/mp3/SoundHelix-Song-3.mp3",
-    "Someone Like You": "https://www.soundhelix.com/examples/mp3/SoundHelix-Song-4.mp3",
-    # SoundHelix exact titles for better UX alignment
-    "SoundHelix Song 1": "https://www.soundhelix.com/examples/mp3/SoundHelix-Song-1.mp3",
-    "SoundHelix Song 2": "https://www.soundhelix.com/examples/mp3/SoundHelix-Song-2.mp3",
-    "SoundHelix Song 3": "https://www.soundhelix.com/examples/mp3/SoundHelix-Song-3.mp3",
-    "SoundHelix Song 4": "https://www.soundhelix.com/examples/mp3/SoundHelix-Song-4.mp3",
-}
-
-def _demo_url_for(title: str) -> str | None:
-    key = (title or "").strip()
-    return DEMO_URLS.get(key)
 from typing import Literal
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse, Response
+from fastapi.responses import JSONResponse, RedirectResponse, Response, StreamingResponse
 from pathlib import Path
-from urllib import parse, request
-import json
+from starlette.concurrency import run_in_threadpool
+import codecs
+import os
 
-from playlist_app.playlist import CircularPlaylist, ListPlaylist
+from .backends import LocalBackend, RemoteBackend
+from .commands import STREAM_PAGE, CommandError, Commands, Reply, make_resolver, make_sessions, open_store
+from .store import PlaylistStore
+from . import metrics, transfer
 
 
 class SongIn(BaseModel):
@@ -39,16 +25,60 @@ class SongIn(BaseModel):
 
 class EnqueueIn(BaseModel):
     song_id: int
+    lane: Literal["next", "end"] = "end"
+
+
+class MoveIn(BaseModel):
+    index: int = Field(ge=0)
+
+
+class SeekIn(BaseModel):
+    offset_sec: int = Field(ge=0)
 
 
 class ImplIn(BaseModel):
     impl: Literal["circular", "list"]
 
 
+class ShuffleIn(BaseModel):
+    on: bool
+    seed: int | None = None
+
+
+class RadioIn(BaseModel):
+    on: bool
+    seed: int | None = None
+
+
 class LoginIn(BaseModel):
     username: str
 
 
+class BatchOp(BaseModel):
+    op: Literal["add", "remove", "enqueue", "next", "previous", "favorite"]
+    # add
+    title: str | None = None
+    artist: str | None = None
+    duration_sec: int | None = None
+    audio_url: str | None = None
+    # remove, enqueue and favorite: a song id, or the index of an earlier add in the batch
+    song_id: int | None = None
+    ref: int | None = Field(None, ge=0)
+    lane: Literal["next", "end"] = "end"
+
+
+class BatchIn(BaseModel):
+    ops: list[BatchOp] = Field(min_length=1, max_length=STREAM_PAGE)
+
+
+class SmartIn(BaseModel):
+    # every condition given must match; artist whole and title_contains as a substring, ignoring case
+    artist: str | None = Field(None, max_length=200)
+    title_contains: str | None = Field(None, max_length=200)
+    min_sec: int | None = Field(None, ge=0)
+    max_sec: int | None = Field(None, ge=0)
+
+
 app = FastAPI(title="Circular Music Playlist API")
 app.add_middleware(
     CORSMiddleware,
@@ -65,229 +95,443 @@ if web_dir.exists():
 
 # Redirect root to /web/ for convenience
 @app.get("/")
-def root():
+async def root():
     return RedirectResponse(url="/web/", status_code=307)
 
 # Avoid 404 noise for favicon
 @app.get("/favicon.ico")
-def favicon():
+async def favicon():
     return Response(status_code=204)
 
 
-# simple in-memory state
-_state = {
-    "impl": "circular",
-    "circular": CircularPlaylist(),
-    "list": ListPlaylist(),
-    "user": None,  # simple in-memory username
-    "favorites": set(),  # song id set
-}
+# one Session per listener, identified by cookie or X-Session-Token header
+SESSION_COOKIE = "playlist_session"
+sessions = make_sessions()
+# with PLAYLIST_STATE_SOCKET set, sessions live in a state server shared by every worker
+# (python -m playlist_api.backends); otherwise in this process
+_STATE_SOCKET = os.environ.get("PLAYLIST_STATE_SOCKET")
+backend = RemoteBackend(_STATE_SOCKET) if _STATE_SOCKET else LocalBackend(Commands(sessions, make_resolver()))
+
+
+# opt-in persistence: journal every session mutation under PLAYLIST_DATA_DIR
+store: PlaylistStore | None = None
+
+
+@app.on_event("startup")
+def _open_store():
+    global store
+    if _STATE_SOCKET is None:
+        store = open_store(sessions)
 
 
-def _active():
-    return _state[_state["impl"]]
+@app.on_event("shutdown")
+def _close_store():
+    if store is not None:
+        store.close()
+
+
+def _token(request: Request) -> str | None:
+    return request.headers.get("x-session-token") or request.cookies.get(SESSION_COOKIE)
+
+
+def _created(request: Request, token: str | None) -> None:
+    if token:
+        # picked up by _SessionCookieMiddleware, so it also reaches raw and streaming responses
+        request.scope["playlist.new_session"] = token
+
+
+async def _call(request: Request, name: str, *args) -> Reply:
+    """Run a session command for the caller (see ``commands``)."""
+    try:
+        token, reply = await backend.call(_token(request), name, *args)
+    except CommandError as exc:
+        _created(request, exc.token)
+        raise
+    _created(request, token)
+    return reply
+
+
+async def _stream(request: Request, name: str, *args):
+    try:
+        token, chunks = await backend.stream(_token(request), name, *args)
+    except CommandError as exc:
+        _created(request, exc.token)
+        raise
+    _created(request, token)
+    return chunks
+
+
+class _SessionCookieMiddleware:
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start":
+                token = scope.get("playlist.new_session")
+                if token:
+                    cookie = f"{SESSION_COOKIE}={token}; HttpOnly; Path=/; SameSite=lax"
+                    message.setdefault("headers", []).append((b"set-cookie", cookie.encode("latin-1")))
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
+
+
+app.add_middleware(_SessionCookieMiddleware)
+if metrics.ENABLED:
+    app.add_middleware(metrics.HTTPMetricsMiddleware)
+
+
+@app.exception_handler(CommandError)
+async def _command_error(request: Request, exc: CommandError):
+    return JSONResponse({"detail": exc.detail}, status_code=exc.status)
 
 
 @app.get("/health")
-def health():
+async def health():
     return {"status": "ok"}
 
 
-def fetch_itunes_preview(title: str, artist: str) -> str | None:
-    try:
-        term = f"{title} {artist}"
-        qs = parse.urlencode({"term": term, "entity": "song", "limit": 1})
-        url = f"https://itunes.apple.com/search?{qs}"
-        with request.urlopen(url, timeout=3) as resp:
-            data = json.loads(resp.read().decode("utf-8", errors="ignore"))
-        results = data.get("results") or []
-        if results:
-            return results[0].get("previewUrl")
-    except Exception:
-        pass
-    return None
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text format: this process's metrics, then the state server's when it has one."""
+    if not metrics.ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    # the session gauges walk every session, so render off the loop
+    body = await run_in_threadpool(metrics.REGISTRY.render)
+    return Response(body + await backend.metrics(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.on_event("shutdown")
+async def _close_backend():
+    await backend.aclose()
+
+
+class RawJSONResponse(Response):
+    """Response whose body is already-encoded JSON bytes."""
+
+    media_type = "application/json"
+
+
+def _respond(reply: Reply, status_code: int = 200) -> Response:
+    # sets X-Next-Cursor when more pages remain, and ETag on listings
+    headers = {}
+    if reply.cursor is not None:
+        headers["X-Next-Cursor"] = str(reply.cursor)
+    if reply.etag is not None:
+        headers["ETag"] = reply.etag
+        # caches keep the listing but revalidate it, which costs a 304 while nothing changed
+        headers["Cache-Control"] = "no-cache"
+    if reply.status == 304:
+        return Response(status_code=304, headers=headers)
+    return RawJSONResponse(reply.body, status_code=status_code, headers=headers or None)
+
+
+def _if_none_match(request: Request) -> str | None:
+    return request.headers.get("if-none-match")
+
+
+async def _export(request: Request, what: str, format: str = "ndjson", headers=None) -> StreamingResponse:
+    return StreamingResponse(await _stream(request, "export", what, format), media_type=transfer.MEDIA_TYPES[format], headers=headers)
+
+
+PageLimit = Query(None, ge=1, le=STREAM_PAGE)
 
 
 @app.get("/songs")
-def list_songs():
-    songs = _active().list_songs()
-    return [
-        {"id": s.id, "title": s.title, "artist": s.artist, "duration_sec": s.duration_sec, "audio_url": s.audio_url}
-        for s in songs
-    ]
+async def list_songs(
+    request: Request,
+    limit: int | None = PageLimit,
+    cursor: int | None = Query(None, description="id of the last song on the previous page"),
+    window: int | None = Query(None, ge=0, le=500, description="songs either side of the current one"),
+    format: Literal["json", "ndjson"] = "json",
+):
+    if format == "ndjson":
+        return await _export(request, "songs")
+    return _respond(await _call(request, "songs", limit, cursor, window, _if_none_match(request)))
+
+
+@app.get("/search")
+async def search_songs(
+    request: Request,
+    q: str = Query(..., max_length=200, description="words to match in titles and artists; the last may be partial"),
+    limit: int = Query(20, ge=1, le=200),
+):
+    """Songs matching every word of ``q``, best matches first."""
+    return _respond(await _call(request, "search", q, limit))
+
+
+@app.get("/events")
+async def event_stream(request: Request):
+    """Server-Sent Events with incremental changes to the caller's session."""
+    return StreamingResponse(
+        await _stream(request, "watch"),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.post("/songs", status_code=201)
-def add_song(song: SongIn):
-    audio_url = song.audio_url
-    if not audio_url:
-        audio_url = fetch_itunes_preview(song.title, song.artist) or _demo_url_for(song.title)
-    s = _active().add_song(song.title, song.artist, song.duration_sec or 0, audio_url)
-    return {"id": s.id, "title": s.title, "artist": s.artist, "duration_sec": s.duration_sec, "audio_url": s.audio_url}
+async def add_song(song: SongIn, request: Request):
+    return _respond(await _call(request, "add_song", song.title, song.artist, song.duration_sec or 0, song.audio_url or None), status_code=201)
+
+
+IMPORT_BATCH = 5000
+
+
+@app.post("/songs/import", status_code=201)
+async def import_songs(request: Request, format: Literal["ndjson", "csv", "m3u"] | None = None):
+    """Stream-parse an NDJSON/CSV/M3U body and add its songs in batches (no preview lookups)."""
+    parser = transfer.make_parser(format or transfer.format_for(request.headers.get("content-type")))
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    imported = 0
+
+    async def add(rows):
+        nonlocal imported
+        await _call(request, "add_songs", rows)
+        imported += len(rows)
+
+    try:
+        batch = []
+        async for chunk in request.stream():
+            batch.extend(parser.feed(decoder.decode(chunk)))
+            if len(batch) >= IMPORT_BATCH:
+                await add(batch)
+                batch = []
+        batch.extend(parser.close(decoder.decode(b"", final=True)))
+        if batch:
+            await add(batch)
+    except transfer.ParseError as exc:
+        # earlier batches stay imported; report how far we got
+        raise HTTPException(status_code=422, detail={"error": str(exc), "imported": imported})
+    return {"imported": imported}
+
+
+@app.get("/songs/export")
+async def export_songs(request: Request, format: Literal["ndjson", "csv", "m3u"] = "ndjson"):
+    ext = "jsonl" if format == "ndjson" else format
+    return await _export(request, "songs", format, headers={"Content-Disposition": f'attachment; filename="playlist.{ext}"'})
 
 
 @app.delete("/songs/{song_id}")
-def delete_song(song_id: int):
-    ok = _active().remove_song(song_id)
-    if not ok:
-        raise HTTPException(status_code=404, detail="Song not found")
-    return {"removed": True}
+async def delete_song(song_id: int, request: Request):
+    return _respond(await _call(request, "remove_song", song_id))
+
+
+@app.post("/undo")
+async def undo(request: Request):
+    """Undo the last library change (adds, removes, imports, batches); 409 if there is none."""
+    return _respond(await _call(request, "undo"))
+
+
+@app.post("/redo")
+async def redo(request: Request):
+    return _respond(await _call(request, "redo"))
 
 
 @app.get("/play")
-def play():
-    s = _active().play()
-    if not s:
-        return {"song": None}
-    if s and not s.audio_url:
-        preview = fetch_itunes_preview(s.title, s.artist)
-        s.audio_url = preview or _demo_url_for(s.title)
-    return {"song": {"id": s.id, "title": s.title, "artist": s.artist, "duration_sec": s.duration_sec, "audio_url": s.audio_url}}
+async def play(request: Request):
+    return _respond(await _call(request, "play"))
+
+
+@app.get("/duration")
+async def get_duration(request: Request):
+    """Total length plus the current song's position and the seconds before it, for progress bars."""
+    return _respond(await _call(request, "duration"))
+
+
+@app.get("/songs/at/{position}")
+async def song_at(position: int, request: Request):
+    return _respond(await _call(request, "song_at", position))
+
+
+@app.post("/seek")
+async def seek(in_data: SeekIn, request: Request):
+    """Make the song playing ``offset_sec`` into the playlist current."""
+    return _respond(await _call(request, "seek", in_data.offset_sec))
 
 
 @app.post("/next")
-def next_song():
-    s = _active().next()
-    if s and not s.audio_url:
-        preview = fetch_itunes_preview(s.title, s.artist)
-        s.audio_url = preview or _demo_url_for(s.title)
-    return {"song": (None if not s else {"id": s.id, "title": s.title, "artist": s.artist, "duration_sec": s.duration_sec, "audio_url": s.audio_url})}
+async def next_song(request: Request):
+    return _respond(await _call(request, "next_song"))
 
 
 @app.post("/previous")
-def previous_song():
-    s = _active().previous()
-    if s and not s.audio_url:
-        preview = fetch_itunes_preview(s.title, s.artist)
-        s.audio_url = preview or _demo_url_for(s.title)
-    return {"song": (None if not s else {"id": s.id, "title": s.title, "artist": s.artist, "duration_sec": s.duration_sec, "audio_url": s.audio_url})}
+async def previous_song(request: Request):
+    return _respond(await _call(request, "previous_song"))
 
 
 @app.post("/enqueue")
-def enqueue(in_data: EnqueueIn):
-    ok = _active().enqueue_next(in_data.song_id)
-    if not ok:
-        raise HTTPException(status_code=404, detail="Song not found to enqueue")
-    return {"enqueued": True}
+async def enqueue(in_data: EnqueueIn, request: Request):
+    return _respond(await _call(request, "enqueue", in_data.song_id, in_data.lane))
+
+
+@app.post("/batch")
+async def run_batch(body: BatchIn, request: Request):
+    """Apply several ops to the active playlist in one step: all of them, or none if any would fail (422)."""
+    return _respond(await _call(request, "batch", [op.model_dump(exclude_none=True) for op in body.ops]))
 
 
 @app.get("/queue")
-def get_queue():
-    q = list(_active().up_next)
-    return [
-        {"id": s.id, "title": s.title, "artist": s.artist, "duration_sec": s.duration_sec, "audio_url": s.audio_url}
-        for s in q
-    ]
+async def get_queue(
+    request: Request,
+    limit: int | None = PageLimit,
+    cursor: int | None = Query(None, ge=0, description="offset from the front of the queue"),
+    format: Literal["json", "ndjson"] = "json",
+):
+    if format == "ndjson":
+        return await _export(request, "queue")
+    return _respond(await _call(request, "queue", limit, cursor, _if_none_match(request)))
+
+
+@app.post("/queue", status_code=201)
+async def add_to_queue(in_data: EnqueueIn, request: Request):
+    """Queue a song; ``lane`` "next" plays before everything queued with "end"."""
+    return _respond(await _call(request, "enqueue", in_data.song_id, in_data.lane), status_code=201)
+
+
+@app.delete("/queue/{entry_id}")
+async def remove_from_queue(entry_id: int, request: Request):
+    return _respond(await _call(request, "unqueue", entry_id))
+
+
+@app.post("/queue/{entry_id}/move")
+async def move_in_queue(entry_id: int, body: MoveIn, request: Request):
+    return _respond(await _call(request, "move_queued", entry_id, body.index))
 
 
 @app.get("/history")
-def get_history():
-    h = list(_active().history)
-    return [
-        {"id": s.id, "title": s.title, "artist": s.artist, "duration_sec": s.duration_sec, "audio_url": s.audio_url}
-        for s in h
-    ]
+async def get_history(
+    request: Request,
+    limit: int | None = PageLimit,
+    cursor: int | None = Query(None, ge=0, description="offset from the most recent entry"),
+    format: Literal["json", "ndjson"] = "json",
+):
+    if format == "ndjson":
+        return await _export(request, "history")
+    return _respond(await _call(request, "history", limit, cursor, _if_none_match(request)))
 
 
 @app.post("/impl")
-def switch_impl(body: ImplIn):
-    _state["impl"] = body.impl
-    return {"impl": _state["impl"]}
+async def switch_impl(body: ImplIn, request: Request):
+    return _respond(await _call(request, "set_impl", body.impl))
+
+
+@app.get("/shuffle")
+async def get_shuffle(request: Request):
+    return _respond(await _call(request, "shuffle"))
+
+
+@app.post("/shuffle")
+async def set_shuffle(body: ShuffleIn, request: Request):
+    return _respond(await _call(request, "set_shuffle", body.on, body.seed))
+
+
+@app.get("/radio")
+async def get_radio(request: Request):
+    return _respond(await _call(request, "radio"))
+
+
+@app.post("/radio")
+async def set_radio(body: RadioIn, request: Request):
+    """Radio mode: with nothing queued, next plays a song that has followed the current one before."""
+    return _respond(await _call(request, "set_radio", body.on, body.seed))
 
 
 @app.post("/seed")
-def seed():
-    samples = [
-        ("Blinding Lights", "The Weeknd", 200),
-        ("Shape of You", "Ed Sheeran", 233),
-        ("Levitating", "Dua Lipa", 203),
-        ("Someone Like You", "Adele", 285),
-    ]
-    added = []
-    for t, a, d in samples:
-        preview = fetch_itunes_preview(t, a) or _demo_url_for(t)
-        s = _active().add_song(t, a, d, preview)
-        added.append({"id": s.id, "title": s.title, "artist": s.artist, "duration_sec": s.duration_sec, "audio_url": s.audio_url})
-    return {"seeded": len(added), "songs": added}
+async def seed(request: Request):
+    return _respond(await _call(request, "seed"))
 
 
 @app.post("/seed_fast")
-def seed_fast():
-    # Use titles that match the demo audio so names and sound align
-    samples = [
-        ("SoundHelix Song 1", "SoundHelix", 200),
-        ("SoundHelix Song 2", "SoundHelix", 233),
-        ("SoundHelix Song 3", "SoundHelix", 203),
-        ("SoundHelix Song 4", "SoundHelix", 285),
-    ]
-    added = []
-    for t, a, d in samples:
-        s = _active().add_song(t, a, d, _demo_url_for(t))
-        added.append({"id": s.id, "title": s.title, "artist": s.artist, "duration_sec": s.duration_sec, "audio_url": s.audio_url})
-    return {"seeded": len(added), "songs": added}
-
-
-# Auto-seed on startup quickly (no preview lookups)
-@app.on_event("startup")
-def _auto_seed_on_startup():
-    try:
-        if not _active().list_songs():
-            for t, a, d in [
-                ("SoundHelix Song 1", "SoundHelix", 200),
-                ("SoundHelix Song 2", "SoundHelix", 233),
-                ("SoundHelix Song 3", "SoundHelix", 203),
-                ("SoundHelix Song 4", "SoundHelix", 285),
-            ]:
-                _active().add_song(t, a, d, _demo_url_for(t))
-    except Exception:
-        pass
+async def seed_fast(request: Request):
+    return _respond(await _call(request, "seed_fast"))
 
 
 # --- Simple auth and favorites ---
 @app.get("/me")
-def me():
-    return {"user": _state["user"]}
+async def me(request: Request):
+    return _respond(await _call(request, "me"))
 
 
 @app.post("/login")
-def login(body: LoginIn):
-    _state["user"] = body.username.strip() or None
-    return {"user": _state["user"]}
+async def login(body: LoginIn, request: Request):
+    return _respond(await _call(request, "login", body.username.strip() or None))
 
 
 @app.post("/logout")
-def logout():
-    _state["user"] = None
-    _state["favorites"] = set()
-    return {"ok": True}
+async def logout(request: Request):
+    return _respond(await _call(request, "logout"))
 
 
 @app.get("/favorites")
-def get_favorites():
-    ids = list(_state["favorites"]) if _state["favorites"] else []
-    all_songs = {s.id: s for s in _active().list_songs()}
-    out = []
-    for sid in ids:
-        s = all_songs.get(sid)
-        if s:
-            out.append({"id": s.id, "title": s.title, "artist": s.artist, "duration_sec": s.duration_sec, "audio_url": s.audio_url})
-    return out
+async def get_favorites(
+    request: Request,
+    limit: int | None = PageLimit,
+    cursor: int | None = Query(None, ge=0, description="cursor from the previous page"),
+):
+    return _respond(await _call(request, "favorites", limit, cursor, _if_none_match(request)))
 
 
 @app.post("/favorites")
-def add_favorite(in_data: EnqueueIn):
+async def add_favorite(in_data: EnqueueIn, request: Request):
     # reuse EnqueueIn for song_id
-    # validate song exists
-    songs = _active().list_songs()
-    if not any(s.id == in_data.song_id for s in songs):
-        raise HTTPException(status_code=404, detail="Song not found")
-    _state["favorites"].add(in_data.song_id)
-    return {"favorited": True}
+    return _respond(await _call(request, "add_favorite", in_data.song_id))
 
 
 @app.delete("/favorites/{song_id}")
-def remove_favorite(song_id: int):
-    _state["favorites"].discard(song_id)
-    return {"favorited": False}
+async def remove_favorite(song_id: int, request: Request):
+    return _respond(await _call(request, "remove_favorite", song_id))
+
+
+# --- Smart playlists ---
+@app.get("/smart")
+async def list_smart(request: Request):
+    return _respond(await _call(request, "smart_lists"))
+
+
+@app.put("/smart/{name}")
+async def set_smart(name: str, body: SmartIn, request: Request):
+    """Create or redefine a smart playlist: the active playlist's songs matching the rule, kept up to date."""
+    return _respond(await _call(request, "set_smart", name, body.model_dump(exclude_none=True)))
+
+
+@app.delete("/smart/{name}")
+async def drop_smart(name: str, request: Request):
+    return _respond(await _call(request, "drop_smart", name))
+
+
+@app.get("/smart/{name}/songs")
+async def smart_songs(
+    name: str,
+    request: Request,
+    limit: int | None = PageLimit,
+    cursor: int | None = Query(None, description="id of the last song on the previous page"),
+):
+    return _respond(await _call(request, "smart_songs", name, limit, cursor))
+
+
+@app.get("/smart/{name}/play")
+async def smart_play(name: str, request: Request):
+    return _respond(await _call(request, "smart_play", name))
+
+
+@app.post("/smart/{name}/next")
+async def smart_next(name: str, request: Request):
+    return _respond(await _call(request, "smart_next", name))
+
+
+@app.post("/smart/{name}/previous")
+async def smart_previous(name: str, request: Request):
+    return _respond(await _call(request, "smart_previous", name))
+
+
+@app.post("/smart/{name}/queue", status_code=201)
+async def smart_enqueue(name: str, in_data: EnqueueIn, request: Request):
+    return _respond(await _call(request, "smart_enqueue", name, in_data.song_id, in_data.lane), status_code=201)
 
 # To run: uvicorn playlist_api.server:app --reload
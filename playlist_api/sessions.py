@@ -0,0 +1,279 @@
+from __future__ import annotations
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional, TypeVar, Union
+
+from starlette.concurrency import run_in_threadpool
+
+from playlist_app.playlist import CircularPlaylist, ListPlaylist
+
+Playlist = Union[CircularPlaylist, ListPlaylist]
+
+_FACTORIES: dict[str, type[Playlist]] = {
+    "circular": CircularPlaylist,
+    "list": ListPlaylist,
+}
+
+# listener(session, impl, op, data): impl is None for session-level events
+SessionListener = Callable[["Session", Optional[str], str, dict[str, Any]], None]
+
+T = TypeVar("T")
+
+
+class Session:
+    """One listener's state. Playlists are only built when first used."""
+
+    def __init__(
+        self,
+        token: str,
+        seed: Optional[Callable[[Playlist], None]] = None,
+        listener: Optional[SessionListener] = None,
+        options: Optional[dict[str, Any]] = None,
+    ) -> None:
+        self.token = token
+        self.impl = "circular"
+        self.user: Optional[str] = None
+        # guards everything above plus the playlists; never held across an await
+        self.lock = threading.RLock()
+        self.last_seen = time.monotonic()
+        self._playlists: dict[str, Playlist] = {}
+        self._seed = seed
+        self._listener = listener
+        # keyword arguments for new playlists (history_cap, spill_dir)
+        self._options = options or {}
+        self._subscribers: list[SessionListener] = []
+        self._forwarding = False
+
+    def subscribe(self, fn: SessionListener) -> None:
+        """Also call ``fn`` for every event; it runs under ``lock`` in the mutating thread."""
+        self._subscribers.append(fn)
+        self._forward_playlists()
+
+    def unsubscribe(self, fn: SessionListener) -> None:
+        self._subscribers.remove(fn)
+
+    def _emit(self, impl: Optional[str], op: str, data: dict[str, Any]) -> None:
+        if self._listener is not None:
+            self._listener(self, impl, op, data)
+        for fn in self._subscribers:
+            fn(self, impl, op, data)
+
+    def _forward_playlists(self) -> None:
+        # playlists only build event payloads once someone is listening
+        if self._forwarding:
+            return
+        self._forwarding = True
+        for impl, pl in self._playlists.items():
+            self._forward(impl, pl)
+
+    def _forward(self, impl: str, pl: Playlist) -> None:
+        pl.subscribe(lambda op, data: self._emit(impl, op, data))
+
+    def _attach(self, impl: str, pl: Playlist) -> None:
+        self._playlists[impl] = pl
+        if self._listener is not None:
+            self._forwarding = True
+        if self._forwarding:
+            self._forward(impl, pl)
+
+    def playlist(self, impl: str, seeded: bool = True) -> Playlist:
+        pl = self._playlists.get(impl)
+        if pl is None:
+            pl = _FACTORIES[impl](**self._options)
+            self._emit(impl, "create", {})
+            self._attach(impl, pl)
+            if seeded and self._seed is not None:
+                self._seed(pl)
+        return pl
+
+    def active(self) -> Playlist:
+        return self.playlist(self.impl)
+
+    def loaded(self) -> list[tuple[str, Playlist]]:
+        """The playlists built so far, by implementation name."""
+        return list(self._playlists.items())
+
+    def set_impl(self, impl: str) -> None:
+        self.impl = impl
+        self._emit(None, "impl", {"impl": impl})
+
+    def login(self, user: Optional[str]) -> None:
+        self.user = user
+        self._emit(None, "login", {"user": user})
+
+    def logout(self) -> None:
+        # favorites belong to the user, so they go too
+        self.user = None
+        for pl in self._playlists.values():
+            pl.clear_favorites()
+        self._emit(None, "logout", {})
+
+    def dump_state(self) -> dict[str, Any]:
+        return {
+            "impl": self.impl,
+            "user": self.user,
+            "playlists": {impl: pl.dump_state() for impl, pl in self._playlists.items()},
+        }
+
+    @classmethod
+    def load_state(
+        cls,
+        token: str,
+        state: dict[str, Any],
+        seed: Optional[Callable[[Playlist], None]] = None,
+        listener: Optional[SessionListener] = None,
+        options: Optional[dict[str, Any]] = None,
+    ) -> "Session":
+        session = cls(token, seed, listener, options)
+        session.impl = state["impl"]
+        session.user = state["user"]
+        for impl, pl_state in state["playlists"].items():
+            session._attach(impl, _FACTORIES[impl].load_state(pl_state, **session._options))
+        # older snapshots kept favorites on the session; they move to the active playlist
+        pl = session._playlists.get(session.impl)
+        for song_id in state.get("favorites", ()):
+            if pl is not None:
+                pl.add_favorite(song_id)
+        return session
+
+
+def _call_locked(session: Session, fn: Callable[[], T]) -> T:
+    with session.lock:
+        return fn()
+
+
+async def run_locked(session: Session, fn: Callable[[], T], offload: bool = False) -> T:
+    """Run ``fn()`` under ``session.lock`` without ever blocking the event loop on it.
+
+    Request handlers run on the loop one at a time, so every mutation of a
+    session is serialized and the lock is normally free: short critical
+    sections then run in place. When another thread holds it (a store
+    snapshot, an offloaded listing) or ``offload`` asks for it because
+    ``fn`` is O(n), ``fn`` waits for the lock in the threadpool and the loop
+    keeps serving.
+    """
+    if not offload and session.lock.acquire(blocking=False):
+        try:
+            return fn()
+        finally:
+            session.lock.release()
+    return await run_in_threadpool(_call_locked, session, fn)
+
+
+class SessionManager:
+    """LRU of live sessions keyed by token.
+
+    ``max_sessions`` caps memory: the least recently used session is evicted
+    when a new one would exceed it. Sessions idle for ``idle_ttl`` seconds are
+    evicted as they reach the cold end of the LRU. Eviction only unloads a
+    session (it emits ``evict``, which a store keeps on disk); ``get`` asks
+    ``loader`` for tokens it does not hold, so an evicted session comes back
+    on its next request. Only ``drop`` deletes one. The manager lock only
+    covers the index; per-session work happens under ``Session.lock``.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 10_000,
+        idle_ttl: Optional[float] = 3600.0,
+        seed: Optional[Callable[[Playlist], None]] = None,
+        clock: Callable[[], float] = time.monotonic,
+        listener: Optional[SessionListener] = None,
+        playlist_options: Optional[dict[str, Any]] = None,
+        loader: Optional[Callable[[str], Optional[Session]]] = None,
+    ) -> None:
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.seed = seed
+        self.listener = listener
+        # loader(token) rebuilds an evicted session, or returns None
+        self.loader = loader
+        self.playlist_options = playlist_options or {}
+        self._clock = clock
+        self._sessions: OrderedDict[str, Session] = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, token: Optional[str]) -> Optional[Session]:
+        if not token:
+            return None
+        now = self._clock()
+        with self._lock:
+            session = self._sessions.get(token)
+            if session is not None:
+                # an idle session is only unloaded when nothing could load it back
+                if self.loader is None and self.idle_ttl is not None and now - session.last_seen > self.idle_ttl:
+                    del self._sessions[token]
+                    self._evicted(session)
+                    return None
+                session.last_seen = now
+                self._sessions.move_to_end(token)
+                return session
+        if self.loader is None:
+            return None
+        # reading an evicted session back happens outside the index lock
+        session = self.loader(token)
+        if session is None:
+            return None
+        with self._lock:
+            live = self._sessions.get(token)
+            if live is not None:
+                # another request loaded it first
+                live.last_seen = now
+                self._sessions.move_to_end(token)
+                return live
+        return self.put(session)
+
+    def get_or_create(self, token: Optional[str]) -> tuple[Session, bool]:
+        session = self.get(token)
+        if session is not None:
+            return session, False
+        return self.put(Session(secrets.token_urlsafe(18), self.seed, self.listener, self.playlist_options)), True
+
+    def put(self, session: Session) -> Session:
+        session.last_seen = self._clock()
+        with self._lock:
+            self._sessions[session.token] = session
+            self._sessions.move_to_end(session.token)
+            self._evict(session.last_seen)
+        return session
+
+    def drop(self, token: str) -> bool:
+        """Delete a session for good, loading it first if it was evicted."""
+        if self.get(token) is None:
+            return False
+        with self._lock:
+            session = self._sessions.pop(token, None)
+        if session is None:
+            return False
+        session._emit(None, "drop", {})
+        return True
+
+    def snapshot(self) -> list[Session]:
+        with self._lock:
+            return list(self._sessions.values())
+
+    def trim(self) -> None:
+        """Evict down to ``max_sessions`` and ``idle_ttl`` now, e.g. after they were raised for a bulk load."""
+        with self._lock:
+            self._evict(self._clock())
+
+    def _evicted(self, session: Session) -> None:
+        self.evictions += 1
+        session._emit(None, "evict", {})
+
+    def _evict(self, now: float) -> None:
+        while len(self._sessions) > self.max_sessions:
+            self._evicted(self._sessions.popitem(last=False)[1])
+        if self.idle_ttl is None:
+            return
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_seen <= self.idle_ttl:
+                break
+            self._evicted(self._sessions.popitem(last=False)[1])
@@ -0,0 +1,445 @@
+from __future__ import annotations
+import json
+import os
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from playlist_app.smart import Rule
+
+from .sessions import Session, SessionManager
+
+SNAPSHOT_NAME = "snapshot.jsonl"
+# one file per evicted session, named after its token
+PARKED_DIR = "parked"
+_TOKEN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+def _segment_name(n: int) -> str:
+    return f"wal-{n:08d}.log"
+
+
+def _row(song: Any) -> list[Any]:
+    return [song.id, song.title, song.artist, song.duration_sec, song.audio_url]
+
+
+def _fsync_dir(path: Path) -> None:
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class PlaylistStore:
+    """Append-only journal of session mutations plus periodic snapshots.
+
+    Every event a ``Session`` emits becomes one JSON line in the current log
+    segment, tagged with a global sequence number (``n``). A flusher thread
+    writes and fsyncs whatever has accumulated every ``commit_interval``
+    seconds (group commit), so a crash loses at most that window.
+
+    After ``compact_every`` records the store rotates to a new segment,
+    snapshots every live session (each under its own lock, remembering the
+    sequence number it was taken at) and deletes the older segments.
+    Startup loads the snapshot and replays the log tail on top of it.
+
+    A session the manager evicts is written to its own file under
+    ``parked/`` in the background, with the sequence number it covers, and
+    read back the next time its token is asked for. Until it is written,
+    compaction snapshots it with the live ones. Only an explicit drop
+    deletes it.
+    """
+
+    def __init__(self, directory: str | os.PathLike[str], commit_interval: float = 0.005, compact_every: int = 100_000) -> None:
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.commit_interval = commit_interval
+        self.compact_every = compact_every
+        self._manager: Optional[SessionManager] = None
+        self._lock = threading.Lock()
+        self._flushed = threading.Condition(self._lock)
+        self._io_lock = threading.Lock()
+        self._buffer: list[str] = []
+        self._lsn = 0
+        self._durable_lsn = 0
+        self._since_snapshot = 0
+        self._segment = 0
+        self._fh: Any = None
+        self._replaying = False
+        self._closing = False
+        self._flusher: Optional[threading.Thread] = None
+        self._compactor: Optional[threading.Thread] = None
+        self._parked = self.dir / PARKED_DIR
+        self._parked.mkdir(exist_ok=True)
+        # evicted sessions not written to parked/ yet
+        self._parking: dict[str, Session] = {}
+        self._parker: Optional[threading.Thread] = None
+        # serializes writing and deleting parked files
+        self._park_lock = threading.Lock()
+        # while opening: the sequence number each loaded session's state covers
+        self._base: dict[str, int] = {}
+
+    # --- startup ---
+
+    def open(self, manager: SessionManager) -> dict[str, float]:
+        """Rebuild ``manager``'s sessions from disk and start journaling to it."""
+        t0 = time.perf_counter()
+        self._manager = manager
+        manager.listener = self.record
+        manager.loader = self._unpark
+        # nothing is evicted mid-replay, so a parked state always covers everything replayed for it
+        max_sessions, idle_ttl = manager.max_sessions, manager.idle_ttl
+        manager.max_sessions, manager.idle_ttl = sys.maxsize, None
+        self._replaying = True
+        try:
+            first_segment = self._load_snapshot(manager)
+            replayed = 0
+            segments = sorted(self._segments())
+            for n in segments:
+                if n >= first_segment:
+                    replayed += self._replay_segment(self.dir / _segment_name(n), manager)
+            # replayed changes left undo steps of their own (an undo replays as a remove or
+            # restore); like a snapshot load, a reopened playlist starts with nothing to undo
+            for session in manager.snapshot():
+                for _, pl in session.loaded():
+                    pl.forget_undo()
+        finally:
+            self._replaying = False
+            self._base = {}
+            manager.max_sessions, manager.idle_ttl = max_sessions, idle_ttl
+        self._segment = (segments[-1] + 1) if segments else max(first_segment, 1)
+        self._fh = open(self.dir / _segment_name(self._segment), "a", encoding="utf-8")
+        self._durable_lsn = self._lsn
+        self._since_snapshot = replayed
+        self._flusher = threading.Thread(target=self._flush_loop, name="playlist-store-flush", daemon=True)
+        self._flusher.start()
+        manager.trim()
+        return {"sessions": len(manager), "replayed": replayed, "seconds": time.perf_counter() - t0}
+
+    def _segments(self) -> list[int]:
+        out = []
+        for p in self.dir.glob("wal-*.log"):
+            try:
+                out.append(int(p.stem[4:]))
+            except ValueError:
+                continue
+        return out
+
+    def _load_snapshot(self, manager: SessionManager) -> int:
+        path = self.dir / SNAPSHOT_NAME
+        if not path.exists():
+            return 0
+        parked = {p.stem for p in self._parked.glob("*.json")}
+        with open(path, encoding="utf-8") as fh:
+            header = json.loads(fh.readline())
+            self._lsn = header["lsn"]
+            for line in fh:
+                entry = json.loads(line)
+                token = entry["token"]
+                if token in parked:
+                    if self._parked_lsn(token) >= entry["lsn"]:
+                        # evicted since this snapshot: read back from parked/ when asked for
+                        continue
+                    # parked before, then loaded again and snapshotted since
+                    self._parked_path(token).unlink(missing_ok=True)
+                manager.put(Session.load_state(token, entry["state"], manager.seed, manager.listener, manager.playlist_options))
+                self._base[token] = entry["lsn"]
+        return header["segment"]
+
+    def _replay_segment(self, path: Path, manager: SessionManager) -> int:
+        count = 0
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    # torn write at the tail of a crashed segment
+                    break
+                self._lsn = max(self._lsn, rec["n"])
+                # loads a parked session first, which sets the sequence number it covers
+                session = manager.get(rec["s"])
+                if rec["n"] <= self._base.get(rec["s"], 0):
+                    continue
+                self._apply(manager, session, rec)
+                count += 1
+        return count
+
+    def _apply(self, manager: SessionManager, session: Optional[Session], rec: dict[str, Any]) -> None:
+        token, impl, op = rec["s"], rec["p"], rec["op"]
+        if session is None:
+            if op == "drop":
+                return
+            session = manager.put(Session(token, manager.seed, manager.listener, manager.playlist_options))
+        if impl is None:
+            if op == "impl":
+                session.set_impl(rec["impl"])
+            elif op == "login":
+                session.login(rec["user"])
+            elif op == "logout":
+                session.logout()
+            elif op == "fav_add":
+                # journals from before favorites moved onto playlists
+                session.playlist(session.impl, seeded=False).add_favorite(rec["id"])
+            elif op == "fav_remove":
+                session.playlist(session.impl, seeded=False).remove_favorite(rec["id"])
+            elif op == "drop":
+                manager.drop(token)
+            return
+        pl = session.playlist(impl, seeded=False)
+        if op == "add":
+            _, title, artist, duration_sec, audio_url = rec["song"]
+            pl.add_song(title, artist, duration_sec, audio_url)
+        elif op == "add_bulk":
+            pl.add_songs_bulk((title, artist, duration_sec, audio_url) for _, title, artist, duration_sec, audio_url in rec["songs"])
+        elif op == "remove":
+            pl.remove_song(rec["id"])
+        elif op == "restore":
+            pl.restore_song(*rec["song"])
+        elif op == "enqueue":
+            pl.enqueue_next(rec["id"], rec.get("lane", "end"))
+        elif op == "unqueue":
+            pl.unqueue(rec["entry"])
+        elif op == "requeue":
+            pl.move_queued(rec["entry"], rec["index"])
+        elif op == "next":
+            pl.next()
+        elif op == "previous":
+            pl.previous()
+        elif op == "jump":
+            pl.jump_to(rec["id"])
+        elif op == "fav_add":
+            pl.add_favorite(rec["id"])
+        elif op == "fav_remove":
+            pl.remove_favorite(rec["id"])
+        elif op == "shuffle":
+            pl.set_shuffle(rec["on"], rec["seed"])
+        elif op == "radio":
+            pl.set_radio(rec["on"], rec["seed"])
+        elif op == "smart_set":
+            pl.set_smart(rec["name"], Rule.from_json(rec["rule"]))
+        elif op == "smart_drop":
+            pl.drop_smart(rec["name"])
+        elif op == "smart_next":
+            pl.smart_next(rec["name"])
+        elif op == "smart_previous":
+            pl.smart_previous(rec["name"])
+        elif op == "smart_enqueue":
+            pl.smart_enqueue(rec["name"], rec["id"], rec["lane"])
+
+    # --- journaling ---
+
+    def record(self, session: Session, impl: Optional[str], op: str, data: dict[str, Any]) -> None:
+        if impl is None and op == "evict":
+            self._park_later(session)
+            return
+        if impl is None and op == "drop":
+            self._forget(session.token)
+        if self._replaying:
+            return
+        if "song" in data:
+            data = {**data, "song": _row(data["song"])}
+        elif "songs" in data:
+            data = {**data, "songs": [_row(s) for s in data["songs"]]}
+        with self._lock:
+            self._lsn += 1
+            self._buffer.append(json.dumps({"n": self._lsn, "s": session.token, "p": impl, "op": op, **data}, separators=(",", ":")))
+            if len(self._buffer) == 1:
+                self._flushed.notify_all()
+            self._since_snapshot += 1
+            compactor = None
+            if self._since_snapshot >= self.compact_every and self._compactor is None:
+                compactor = self._compactor = threading.Thread(
+                    target=self._compact_in_background, name="playlist-store-compact", daemon=True
+                )
+        if compactor is not None:
+            compactor.start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            with self._lock:
+                while not self._buffer and not self._closing:
+                    self._flushed.wait()
+                closing = self._closing
+            if not closing:
+                # let concurrent writers join this batch before paying for the fsync
+                time.sleep(self.commit_interval)
+            self._flush()
+            if closing:
+                return
+
+    def _flush(self) -> None:
+        with self._io_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+                lsn = self._lsn
+            if batch:
+                self._fh.write("\n".join(batch) + "\n")
+                self._fh.flush()
+                os.fsync(self._fh.fileno())
+            with self._lock:
+                self._durable_lsn = max(self._durable_lsn, lsn)
+                self._flushed.notify_all()
+
+    def sync(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything recorded so far is on disk."""
+        with self._lock:
+            target = self._lsn
+            return self._flushed.wait_for(lambda: self._durable_lsn >= target, timeout)
+
+    # --- evicted sessions ---
+
+    def _parked_path(self, token: str) -> Path:
+        return self._parked / f"{token}.json"
+
+    def _parked_lsn(self, token: str) -> int:
+        with open(self._parked_path(token), encoding="utf-8") as fh:
+            return json.loads(fh.readline())["lsn"]
+
+    def _park_later(self, session: Session) -> None:
+        with self._lock:
+            self._parking[session.token] = session
+            parker = None
+            if self._parker is None:
+                parker = self._parker = threading.Thread(target=self._park_loop, name="playlist-store-park", daemon=True)
+        if parker is not None:
+            parker.start()
+
+    def _park_loop(self) -> None:
+        while True:
+            with self._lock:
+                if not self._parking:
+                    self._parker = None
+                    return
+                token, session = next(iter(self._parking.items()))
+            with self._park_lock:
+                with self._lock:
+                    # dropped in the meantime
+                    current = self._parking.get(token) is session
+                if current:
+                    self._park(session)
+            with self._lock:
+                if self._parking.get(token) is session:
+                    del self._parking[token]
+
+    def _park(self, session: Session) -> None:
+        with session.lock:
+            with self._lock:
+                lsn = self._lsn
+            state = session.dump_state()
+        # the journal must reach lsn first, or a restart could hand out sequence numbers this file already covers
+        with self._lock:
+            self._flushed.wait_for(lambda: self._durable_lsn >= lsn)
+        path = self._parked_path(session.token)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(json.dumps({"lsn": lsn}) + "\n")
+            fh.write(json.dumps(state, separators=(",", ":")) + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, path)
+        _fsync_dir(self._parked)
+
+    def _unpark(self, token: str) -> Optional[Session]:
+        """``manager.loader``: an evicted session, from memory if it is not written out yet."""
+        with self._lock:
+            # left in place until written, so compaction never misses it
+            session = self._parking.get(token)
+        if session is not None:
+            return session
+        if not _TOKEN.fullmatch(token):
+            return None
+        try:
+            fh = open(self._parked_path(token), encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        with fh:
+            lsn = json.loads(fh.readline())["lsn"]
+            state = json.loads(fh.readline())
+        if self._replaying:
+            self._base[token] = lsn
+        manager = self._manager
+        assert manager is not None
+        return Session.load_state(token, state, manager.seed, manager.listener, manager.playlist_options)
+
+    def _forget(self, token: str) -> None:
+        with self._lock:
+            self._parking.pop(token, None)
+        if _TOKEN.fullmatch(token):
+            with self._park_lock:
+                self._parked_path(token).unlink(missing_ok=True)
+
+    # --- compaction ---
+
+    def _compact_in_background(self) -> None:
+        try:
+            self.compact()
+        finally:
+            with self._lock:
+                self._compactor = None
+
+    def compact(self) -> None:
+        assert self._manager is not None
+        # rotate first: everything in older segments is covered by the snapshot below
+        with self._io_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+                self._since_snapshot = 0
+                self._segment += 1
+                segment = self._segment
+            if batch:
+                self._fh.write("\n".join(batch) + "\n")
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+            self._fh.close()
+            self._fh = open(self.dir / _segment_name(segment), "a", encoding="utf-8")
+
+        # live ones first: a session evicted after that is still parking below, or parked already
+        live = self._manager.snapshot()
+        with self._lock:
+            # sessions still parking would lose their journal with the old segments
+            sessions = dict(self._parking)
+        sessions.update((session.token, session) for session in live)
+        tmp = self.dir / (SNAPSHOT_NAME + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as fh:
+            with self._lock:
+                header_lsn = self._lsn
+            fh.write(json.dumps({"version": 1, "segment": segment, "lsn": header_lsn}) + "\n")
+            for session in sessions.values():
+                with session.lock:
+                    with self._lock:
+                        lsn = self._lsn
+                    state = session.dump_state()
+                fh.write(json.dumps({"token": session.token, "lsn": lsn, "state": state}, separators=(",", ":")) + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self.dir / SNAPSHOT_NAME)
+        _fsync_dir(self.dir)
+        for n in self._segments():
+            if n < segment:
+                (self.dir / _segment_name(n)).unlink(missing_ok=True)
+
+    def close(self) -> None:
+        # parking waits on the flusher, so it finishes first
+        parker = self._parker
+        if parker is not None:
+            parker.join()
+        with self._lock:
+            self._closing = True
+            self._flushed.notify_all()
+        if self._flusher is not None:
+            self._flusher.join()
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        if self._manager is not None and self._manager.listener == self.record:
+            self._manager.listener = None
+            self._manager.loader = None
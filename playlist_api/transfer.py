@@ -0,0 +1,209 @@
+from __future__ import annotations
+import csv
+import io
+import json
+from abc import ABC, abstractmethod
+from typing import Any, Iterable, Optional
+
+from playlist_app.playlist import SongFields
+
+FORMATS = ("ndjson", "csv", "m3u")
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "m3u": "audio/x-mpegurl",
+}
+CSV_COLUMNS = ["title", "artist", "duration_sec", "audio_url"]
+
+
+class ParseError(ValueError):
+    def __init__(self, line: int, message: str) -> None:
+        super().__init__(f"line {line}: {message}")
+        self.line = line
+
+
+def format_for(content_type: Optional[str]) -> str:
+    ct = (content_type or "").split(";")[0].strip().lower()
+    for fmt, media in MEDIA_TYPES.items():
+        if ct == media:
+            return fmt
+    if ct in ("application/json", "application/jsonl", "application/json-lines"):
+        return "ndjson"
+    if ct in ("application/vnd.apple.mpegurl", "application/x-mpegurl"):
+        return "m3u"
+    return "ndjson"
+
+
+def _duration(value: Any, line: int) -> int:
+    if value in (None, ""):
+        return 0
+    try:
+        return max(int(float(value)), 0)
+    except (TypeError, ValueError):
+        raise ParseError(line, f"bad duration {value!r}") from None
+
+
+def _audio_url(value: Any, line: int) -> Optional[str]:
+    if value is not None and not isinstance(value, str):
+        raise ParseError(line, f"bad audio_url {value!r}")
+    return value or None
+
+
+class _LineParser(ABC):
+    """Incremental parser: feed decoded text chunks, get back complete rows."""
+
+    def __init__(self) -> None:
+        self._pending = ""
+        self.line = 0
+
+    def feed(self, text: str) -> list[SongFields]:
+        data = self._pending + text
+        lines = data.split("\n")
+        self._pending = lines.pop()
+        return self._parse_lines(lines)
+
+    def close(self, text: str = "") -> list[SongFields]:
+        data = self._pending + text
+        self._pending = ""
+        rows = self._parse_lines(data.split("\n")) if data else []
+        return rows + self._finish()
+
+    def _parse_lines(self, lines: list[str]) -> list[SongFields]:
+        out: list[SongFields] = []
+        for raw in lines:
+            self.line += 1
+            row = self._parse_line(raw.rstrip("\r"))
+            if row is not None:
+                out.append(row)
+        return out
+
+    @abstractmethod
+    def _parse_line(self, line: str) -> Optional[SongFields]:
+        """The row on ``line``, or None for a line that holds none (blank, a header, a comment)."""
+
+    def _finish(self) -> list[SongFields]:
+        return []
+
+
+class NdjsonParser(_LineParser):
+    def _parse_lines(self, lines: list[str]) -> list[SongFields]:
+        # fast path: decode the whole batch as one JSON array, fall back per line for errors
+        body = [ln for ln in lines if ln.strip()]
+        try:
+            objs = json.loads("[" + ",".join(body) + "]")
+        except ValueError:
+            return super()._parse_lines(lines)
+        out: list[SongFields] = []
+        try:
+            for obj in objs:
+                out.append((str(obj["title"]), str(obj["artist"]), int(obj.get("duration_sec") or 0), _audio_url(obj.get("audio_url"), self.line)))
+        except (TypeError, KeyError, ValueError, AttributeError):
+            # ParseError is a ValueError: the per-line pass reports it with the right line number
+            return super()._parse_lines(lines)
+        if any(not t or not a or d < 0 for t, a, d, _ in out):
+            return super()._parse_lines(lines)
+        self.line += len(lines)
+        return out
+
+    def _parse_line(self, line: str) -> Optional[SongFields]:
+        if not line.strip():
+            return None
+        try:
+            obj = json.loads(line)
+        except ValueError as exc:
+            raise ParseError(self.line, f"invalid JSON ({exc.msg})") from None
+        if not isinstance(obj, dict) or not obj.get("title") or not obj.get("artist"):
+            raise ParseError(self.line, "expected an object with title and artist")
+        return (str(obj["title"]), str(obj["artist"]), _duration(obj.get("duration_sec"), self.line), _audio_url(obj.get("audio_url"), self.line))
+
+
+class CsvParser(_LineParser):
+    """CSV with a header row naming (a subset of) title, artist, duration_sec, audio_url."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._columns: Optional[list[str]] = None
+        self._record: list[str] = []
+
+    def _parse_line(self, line: str) -> Optional[SongFields]:
+        # a quoted field may span lines: hold them until the quotes balance
+        self._record.append(line)
+        text = "\n".join(self._record)
+        if text.count('"') % 2:
+            return None
+        self._record = []
+        if not text.strip():
+            return None
+        fields = next(csv.reader([text]))
+        if self._columns is None:
+            self._columns = [f.strip().lower() for f in fields]
+            if "title" not in self._columns or "artist" not in self._columns:
+                raise ParseError(self.line, "header must name title and artist columns")
+            return None
+        rec = dict(zip(self._columns, fields))
+        if not rec.get("title") or not rec.get("artist"):
+            raise ParseError(self.line, "missing title or artist")
+        return (rec["title"], rec["artist"], _duration(rec.get("duration_sec"), self.line), _audio_url(rec.get("audio_url"), self.line))
+
+    def _finish(self) -> list[SongFields]:
+        if self._record and "".join(self._record).strip():
+            raise ParseError(self.line, "unterminated quoted field")
+        return []
+
+
+class M3uParser(_LineParser):
+    """Extended M3U: ``#EXTINF:<seconds>,<artist> - <title>`` followed by the URL."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._info: Optional[tuple[int, str, str]] = None
+
+    def _parse_line(self, line: str) -> Optional[SongFields]:
+        line = line.strip()
+        if not line:
+            return None
+        if line.startswith("#EXTINF:"):
+            dur, _, label = line[len("#EXTINF:"):].partition(",")
+            artist, sep, title = label.partition(" - ")
+            if not sep:
+                artist, title = "", label
+            self._info = (_duration(dur.split()[0] if dur.split() else "", self.line), artist.strip(), title.strip())
+            return None
+        if line.startswith("#"):
+            return None
+        info, self._info = self._info, None
+        if info is None:
+            name = line.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+            info = (0, "", name)
+        dur, artist, title = info
+        return (title or line, artist or "Unknown", max(dur, 0), line)
+
+
+_PARSERS = {"ndjson": NdjsonParser, "csv": CsvParser, "m3u": M3uParser}
+
+
+def make_parser(fmt: str) -> _LineParser:
+    return _PARSERS[fmt]()
+
+
+def export_header(fmt: str) -> str:
+    if fmt == "csv":
+        return ",".join(CSV_COLUMNS) + "\r\n"
+    if fmt == "m3u":
+        return "#EXTM3U\n"
+    return ""
+
+
+def export_rows(fmt: str, songs: Iterable[Any]) -> str:
+    if fmt == "ndjson":
+        return "".join(
+            json.dumps({"id": s.id, "title": s.title, "artist": s.artist, "duration_sec": s.duration_sec, "audio_url": s.audio_url}) + "\n"
+            for s in songs
+        )
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerows([s.title, s.artist, s.duration_sec, s.audio_url or ""] for s in songs)
+        return buf.getvalue()
+    # M3U entries need a location, so songs without audio are left out
+    return "".join(f"#EXTINF:{s.duration_sec or -1},{s.artist} - {s.title}\n{s.audio_url}\n" for s in songs if s.audio_url)
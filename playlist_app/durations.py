@@ -0,0 +1,163 @@
+from __future__ import annotations
+from array import array
+from itertools import accumulate
+from operator import add
+from typing import Iterable, Optional
+
+from .models import Song
+from .structures import _expect
+
+
+class _Fenwick:
+    """Fenwick (binary indexed) tree over positions 1..n: point add, prefix sum and descent in O(log n)."""
+
+    def __init__(self) -> None:
+        # tree[i] sums the values in (i - lowbit(i), i]; tree[0] is unused
+        self.tree = array("q", [0])
+
+    def __len__(self) -> int:
+        return len(self.tree) - 1
+
+    def add(self, i: int, delta: int) -> None:
+        tree, n = self.tree, len(self.tree)
+        while i < n:
+            tree[i] += delta
+            i += i & -i
+
+    def prefix(self, i: int) -> int:
+        """Sum of positions 1..i."""
+        tree, total = self.tree, 0
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def extend(self, values: list[int]) -> None:
+        """Append positions n+1..n+len(values) in O(len(values) + log² n)."""
+        m, k = len(self), len(values)
+        if k <= 16:
+            # a few songs: each new node is a range sum of two prefixes
+            tree = self.tree
+            for v in values:
+                j = len(tree)
+                tree.append(0)
+                tree[j] = v + self.prefix(j - 1) - self.prefix(j & (j - 1))
+            return
+        # built level by level with slices: node j adds its child j - step for step = 1, 2, 4, ...
+        new = list(values)
+        step = 1
+        while step < m + k:
+            first = (m + step) // (2 * step) * (2 * step) + 2 * step  # first multiple of 2*step past m + step
+            if first <= m + k:
+                new[first - m - 1 :: 2 * step] = map(add, new[first - m - 1 :: 2 * step], new[first - step - m - 1 :: 2 * step])
+            step *= 2
+        # nodes whose range reaches back past m: the smallest multiple of each power of two above m
+        if m:
+            run = list(accumulate(values, initial=self.prefix(m)))
+            for b in range((m + k).bit_length()):
+                j = ((m >> b) + 1) << b
+                lo = j & (j - 1)
+                if j <= m + k and lo < m:
+                    new[j - m - 1] = run[j - m] - self.prefix(lo)
+        self.tree.extend(array("q", new))
+
+    def search(self, target: int) -> int:
+        """Smallest position whose prefix sum exceeds ``target`` (n + 1 if none); values must be >= 0."""
+        tree, n = self.tree, len(self)
+        pos = 0
+        step = 1 << n.bit_length() if n else 0
+        while step:
+            nxt = pos + step
+            if nxt <= n and tree[nxt] <= target:
+                pos = nxt
+                target -= tree[nxt]
+            step >>= 1
+        return pos + 1
+
+
+class DurationIndex:
+    """Running totals of song durations in playlist order.
+
+    Playlist order is song id order in both implementations, so two Fenwick
+    trees indexed by song id (durations, and 1 per live song) answer the
+    total length, the time before any song, which song plays at offset T
+    and which song sits at position k, each in O(log n). New ids are
+    always larger than the ones seen so far, so adding a song appends to
+    the trees; a removed song leaves zeros at its id, which ``restore``
+    fills back in.
+    """
+
+    def __init__(self) -> None:
+        self._seconds = _Fenwick()
+        self._count = _Fenwick()
+        # duration by song id (-1 for ids not in the playlist), for removals
+        self._durations = array("q", [-1])
+
+    def __len__(self) -> int:
+        return self._count.prefix(len(self._count))
+
+    def add(self, song: Song) -> None:
+        self.add_many((song,))
+
+    def add_many(self, songs: Iterable[Song]) -> None:
+        durations: list[int] = []
+        top = len(self._durations) - 1
+        for song in songs:
+            if song.id != top + 1:
+                if song.id <= top:
+                    raise ValueError(f"song {song.id} added out of order")
+                # ids that never reached this playlist (or were removed before a reload)
+                durations.extend([-1] * (song.id - top - 1))
+            d = song.duration_sec
+            durations.append(d if d and d > 0 else 0)
+            top = song.id
+        self._durations.extend(array("q", durations))
+        self._seconds.extend([d if d > 0 else 0 for d in durations])
+        self._count.extend([1 if d >= 0 else 0 for d in durations])
+
+    def discard(self, song_id: int) -> None:
+        if 0 < song_id < len(self._durations) and self._durations[song_id] >= 0:
+            self._seconds.add(song_id, -self._durations[song_id])
+            self._durations[song_id] = -1
+            self._count.add(song_id, -1)
+
+    def restore(self, song: Song) -> None:
+        """Time a song again after it was removed (undo), at its old id."""
+        if song.id >= len(self._durations):
+            self.add(song)
+        elif self._durations[song.id] < 0:
+            d = song.duration_sec if song.duration_sec and song.duration_sec > 0 else 0
+            self._durations[song.id] = d
+            self._seconds.add(song.id, d)
+            self._count.add(song.id, 1)
+
+    def total(self) -> int:
+        return self._seconds.prefix(len(self._seconds))
+
+    def before(self, song_id: int) -> tuple[int, int]:
+        """(seconds, songs) ahead of ``song_id`` in playlist order."""
+        last = min(song_id - 1, len(self._seconds))
+        return self._seconds.prefix(last), self._count.prefix(last)
+
+    def at_offset(self, seconds: int) -> Optional[tuple[int, int]]:
+        """(song id, seconds into it) of the song playing ``seconds`` from the start, None past the end."""
+        if seconds < 0:
+            return None
+        song_id = self._seconds.search(seconds)
+        if song_id > len(self._seconds):
+            return None
+        return song_id, seconds - self._seconds.prefix(song_id - 1)
+
+    def at_position(self, k: int) -> Optional[int]:
+        """Id of the song at 0-based position ``k`` in playlist order."""
+        if k < 0:
+            return None
+        song_id = self._count.search(k)
+        return song_id if song_id <= len(self._count) else None
+
+    def check(self, songs: list[Song]) -> None:
+        """Raise AssertionError unless the trees match ``songs`` (the live library, in order). O(n)."""
+        _expect(len(self) == len(songs), "duration index count is off")
+        _expect(self.total() == sum(max(s.duration_sec or 0, 0) for s in songs), "duration index total is off")
+        live = {s.id for s in songs}
+        _expect(all((self._durations[i] >= 0) == (i in live) for i in range(1, len(self._durations))), "removed song still timed")
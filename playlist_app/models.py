@@ -1,7 +1,52 @@
+import json
 from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Iterable
 
+# encoded songs kept across all playlists, about 300 bytes each (~19 MB when full)
+SONG_JSON_CACHE = 65_536
 
-@dataclass
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+def _song_dict(song: Any) -> dict[str, Any]:
+    return {"id": song.id, "title": song.title, "artist": song.artist, "duration_sec": song.duration_sec, "audio_url": song.audio_url}
+
+
+@lru_cache(maxsize=SONG_JSON_CACHE)
+def _encode(song_id: int, title: str, artist: str, duration_sec: int, audio_url: str | None) -> bytes:
+    return _encoder.encode(
+        {"id": song_id, "title": title, "artist": artist, "duration_sec": duration_sec, "audio_url": audio_url}
+    ).encode("utf-8")
+
+
+def _song_json(song: Any) -> bytes:
+    """JSON for ``song``.
+
+    Recently encoded songs come from an LRU keyed by every field value, so
+    a changed field (say a filled-in ``audio_url``) is simply a miss. The
+    cache is bounded and shared instead of kept on each song, which would
+    add about 260 bytes to every song in every library.
+    """
+    return _encode(song.id, song.title, song.artist, song.duration_sec, song.audio_url)
+
+
+def songs_json(songs: Iterable[Any]) -> bytes:
+    """A JSON array of ``songs``.
+
+    Up to ``SONG_JSON_CACHE`` songs are spliced from the cache; a longer
+    listing (a whole large library) is encoded in one pass instead, so it
+    neither thrashes the cache nor pushes out the songs that pages, the
+    queue and the player keep asking for.
+    """
+    if not isinstance(songs, list):
+        songs = list(songs)
+    if len(songs) > SONG_JSON_CACHE:
+        return _encoder.encode([_song_dict(s) for s in songs]).encode("utf-8")
+    return b"[" + b",".join([_song_json(s) for s in songs]) + b"]"
+
+
+@dataclass(slots=True)
 class Song:
     id: int
     title: str
@@ -14,3 +59,5 @@ class Song:
         ss = self.duration_sec % 60
         dur = f" {mm:02d}:{ss:02d}" if self.duration_sec else ""
         return f"{self.title} - {self.artist}{dur}"
+
+    to_json = _song_json
@@ -0,0 +1,234 @@
+from __future__ import annotations
+from typing import Iterable, Iterator, Optional
+
+from .models import Song
+
+_BITS = 5
+_WIDTH = 1 << _BITS
+_MASK = _WIDTH - 1
+
+# a trie node: a list of _WIDTH children (songs in leaves), never changed once shared
+Node = list
+
+
+class SongVector:
+    """An immutable library: songs by id, in id order (which is playlist order).
+
+    A 32-way trie over song ids, so every version is a root pointer and
+    changing k songs copies only the O(k log32 n) nodes on their paths;
+    everything else is shared with the version it came from. Taking a
+    version is O(1), and a version can be read from any thread while the
+    playlist goes on changing. Subtrees with no songs are dropped, which
+    keeps walks and ``after`` fast over long runs of removed ids, and
+    ``diff`` only descends where two versions stopped sharing nodes.
+    """
+
+    __slots__ = ("_root", "_height", "_count")
+
+    def __init__(self, root: Optional[Node] = None, height: int = 0, count: int = 0) -> None:
+        self._root = root
+        # the root's distance from the leaves
+        self._height = height
+        self._count = count
+
+    @classmethod
+    def build(cls, songs: Iterable[Song]) -> "SongVector":
+        """A version holding ``songs`` (distinct ids), built bottom up in O(n + largest id)."""
+        songs = list(songs)
+        if not songs:
+            return cls()
+        flat: list[Optional[Song]] = [None] * (max(song.id for song in songs) + 1)
+        for song in songs:
+            flat[song.id] = song
+        nodes: list = flat
+        height = -1
+        while height < 0 or len(nodes) > 1:
+            nodes.extend([None] * (-len(nodes) % _WIDTH))
+            nodes = [chunk if any(chunk) else None for chunk in (nodes[i : i + _WIDTH] for i in range(0, len(nodes), _WIDTH))]
+            height += 1
+        return cls(nodes[0], height, len(songs))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[Song]:
+        for _, leaf in self._leaves(0):
+            for song in leaf:
+                if song is not None:
+                    yield song
+
+    def _node(self, height: int, key: int) -> Optional[Node]:
+        """The node ``height`` levels above the leaves covering ``key << (5 * (height + 1))``, if any."""
+        node, h = self._root, self._height
+        while node is not None and h > height:
+            node = node[(key >> (_BITS * (h - height - 1))) & _MASK]
+            h -= 1
+        return node
+
+    def get(self, song_id: int) -> Optional[Song]:
+        leaf = self._node(0, song_id >> _BITS) if 0 <= song_id < _WIDTH << (_BITS * self._height) else None
+        return leaf[song_id & _MASK] if leaf is not None else None
+
+    def add_many(self, songs: Iterable[Song]) -> "SongVector":
+        """A new version with ``songs`` put at their ids; this one is unchanged."""
+        pending: dict[int, Node] = {}
+        count = self._count
+        top = -1
+        capacity = _WIDTH << (_BITS * self._height)
+        for song in songs:
+            song_id = song.id
+            key = song_id >> _BITS
+            leaf = pending.get(key)
+            if leaf is None:
+                old = self._node(0, key) if song_id < capacity else None
+                leaf = pending[key] = list(old) if old is not None else [None] * _WIDTH
+            if leaf[song_id & _MASK] is None:
+                count += 1
+            leaf[song_id & _MASK] = song
+            if song_id > top:
+                top = song_id
+        if not pending:
+            return self
+        height = self._height
+        while top >= _WIDTH << (_BITS * height):
+            height += 1
+        grown = SongVector(self._root, self._height, count)
+        while grown._height < height:
+            # the old root becomes the first child of a taller one
+            grown._root = [grown._root] + [None] * (_WIDTH - 1) if grown._root is not None else None
+            grown._height += 1
+        for level in range(height):
+            parents: dict[int, Node] = {}
+            for key, node in pending.items():
+                parent = parents.get(key >> _BITS)
+                if parent is None:
+                    old = grown._node(level + 1, key >> _BITS)
+                    parent = parents[key >> _BITS] = list(old) if old is not None else [None] * _WIDTH
+                parent[key & _MASK] = node
+            pending = parents
+        grown._root = pending[0]
+        return grown
+
+    def set(self, song_id: int, song: Optional[Song]) -> "SongVector":
+        """A new version with ``song`` (None to remove) at ``song_id``; copies just the nodes on its path."""
+        if not 0 <= song_id < _WIDTH << (_BITS * self._height):
+            return self.add_many((song,)) if song is not None else self
+        path: list[Optional[Node]] = []
+        node = self._root
+        for h in range(self._height, 0, -1):
+            path.append(node)
+            node = node[(song_id >> (_BITS * h)) & _MASK] if node is not None else None
+        old = node[song_id & _MASK] if node is not None else None
+        if old is song:
+            return self
+        child: Optional[Node] = list(node) if node is not None else [None] * _WIDTH
+        child[song_id & _MASK] = song
+        for h, parent in enumerate(reversed(path), 1):
+            # songs and nodes are truthy, so any() finds a non-empty node without calling Song.__eq__
+            if not any(child):
+                child = None
+            copy = list(parent) if parent is not None else [None] * _WIDTH
+            copy[(song_id >> (_BITS * h)) & _MASK] = child
+            child = copy
+        if not any(child):
+            child = None
+        return SongVector(child, self._height, self._count + (song is not None) - (old is not None))
+
+    def _leaves(self, start: int) -> Iterator[tuple[int, Node]]:
+        """(key, leaf) for every non-empty leaf whose key is at least ``start``, in order."""
+        if self._root is None or start >> (_BITS * self._height):
+            return
+        stack = [(self._root, self._height, 0)]
+        while stack:
+            node, h, key = stack.pop()
+            if h == 0:
+                yield key, node
+                continue
+            span = _BITS * (h - 1)
+            for i in range(_MASK, -1, -1):
+                child = node[i]
+                if child is not None and ((key << _BITS | i) + 1) << span > start:
+                    stack.append((child, h - 1, key << _BITS | i))
+
+    def after(self, song_id: Optional[int], limit: int = 1) -> list[Song]:
+        """Up to ``limit`` songs with ids above ``song_id`` (from the start if None), in order."""
+        first = 0 if song_id is None else song_id + 1
+        out: list[Song] = []
+        for key, leaf in self._leaves(first >> _BITS):
+            lo = first - (key << _BITS) if key == first >> _BITS else 0
+            for song in leaf[lo:]:
+                if song is not None:
+                    out.append(song)
+                    if len(out) >= limit:
+                        return out
+        return out
+
+    def _leaves_down(self, end: int) -> Iterator[tuple[int, Node]]:
+        """(key, leaf) for every non-empty leaf whose key is at most ``end``, last first."""
+        if self._root is None or end < 0:
+            return
+        stack = [(self._root, self._height, 0)]
+        while stack:
+            node, h, key = stack.pop()
+            if h == 0:
+                yield key, node
+                continue
+            span = _BITS * (h - 1)
+            for i in range(_WIDTH):
+                child = node[i]
+                if child is not None and (key << _BITS | i) << span <= end:
+                    stack.append((child, h - 1, key << _BITS | i))
+
+    def before(self, song_id: Optional[int], limit: int = 1) -> list[Song]:
+        """Up to ``limit`` songs with ids below ``song_id`` (from the end if None), nearest first."""
+        last = (_WIDTH << (_BITS * self._height)) - 1 if song_id is None else song_id - 1
+        out: list[Song] = []
+        for key, leaf in self._leaves_down(last >> _BITS):
+            hi = last - (key << _BITS) if key == last >> _BITS else _MASK
+            for song in reversed(leaf[: hi + 1]):
+                if song is not None:
+                    out.append(song)
+                    if len(out) >= limit:
+                        return out
+        return out
+
+    def diff(self, other: "SongVector") -> Iterator[tuple[int, Optional[Song], Optional[Song]]]:
+        """``(song id, song here, song in other)`` for every id the two versions disagree on, in id order."""
+        height = max(self._height, other._height)
+        a = self._padded(height)
+        b = other._padded(height)
+        stack = [(a, b, height, 0)]
+        while stack:
+            x, y, h, key = stack.pop()
+            if x is y:
+                continue
+            if h == 0:
+                for i in range(_WIDTH):
+                    s = x[i] if x is not None else None
+                    t = y[i] if y is not None else None
+                    if s is not t:
+                        yield key << _BITS | i, s, t
+                continue
+            for i in range(_MASK, -1, -1):
+                cx = x[i] if x is not None else None
+                cy = y[i] if y is not None else None
+                if cx is not cy:
+                    stack.append((cx, cy, h - 1, key << _BITS | i))
+
+    def _padded(self, height: int) -> Optional[Node]:
+        root = self._root
+        for _ in range(height - self._height):
+            root = [root] + [None] * (_WIDTH - 1) if root is not None else None
+        return root
+
+    def nodes(self) -> int:
+        """Trie nodes reachable from this version (for memory accounting). O(n)."""
+        if self._root is None:
+            return 0
+        total, stack = 0, [(self._root, self._height)]
+        while stack:
+            node, h = stack.pop()
+            total += 1
+            if h:
+                stack.extend((child, h - 1) for child in node if child is not None)
+        return total
@@ -1,185 +1,1241 @@
 from __future__ import annotations
-from typing import Optional
+import random
+import secrets
+from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right
+from itertools import islice
+from operator import attrgetter
+from typing import Any, Callable, Iterable, Optional, Self, Union
+from .durations import DurationIndex
 from .models import Song
-from .structures import Stack, Queue, CircularDoublyLinkedList, _Node
+from .persistent import SongVector
+from .radio import Radio
+from .search import SearchIndex
+from .shuffle import ShuffleOrder
+from .smart import Rule, SmartPlaylist
+from .songtable import SongTable
+from .structures import BoundedStack, Stack, Queue, CircularDoublyLinkedList, _Node, _expect
 
+# listener(op, data) is called after every mutation; see _Observable._emit
+Listener = Callable[[str, dict[str, Any]], None]
+SongRow = list[Any]
+# (title, artist, duration_sec, audio_url) as accepted by add_songs_bulk
+SongFields = tuple[str, str, int, Optional[str]]
 
-class CircularPlaylist:
+
+_song_id: Callable[[Song], int] = attrgetter("id")
+
+# what apply_batch accepts; every op but add, next and previous names a song
+BATCH_OPS = ("add", "remove", "enqueue", "next", "previous", "favorite")
+
+
+class BatchError(ValueError):
+    """A batch op that cannot apply; ``index`` is its position in the batch."""
+
+    def __init__(self, index: int, message: str) -> None:
+        super().__init__(message)
+        self.index = index
+
+
+def _song_row(song: Song) -> SongRow:
+    return [song.id, song.title, song.artist, song.duration_sec, song.audio_url]
+
+
+def _song_from_row(row: SongRow) -> Song:
+    return Song(*row)
+
+
+def _dump_songs(songs: list[Song], lookup: Callable[[int], Optional[Song]]) -> list[Union[int, SongRow]]:
+    # library songs are stored by id; songs removed from the library keep a full row. A song an
+    # undo put back is the same object live but an equal copy after a journal replay, so compare rows
+    out: list[Union[int, SongRow]] = []
+    for s in songs:
+        held = lookup(s.id)
+        out.append(s.id if held is s or (held is not None and _song_row(held) == _song_row(s)) else _song_row(s))
+    return out
+
+
+def _load_songs(items: list[Union[int, SongRow]], lookup: Callable[[int], Optional[Song]]) -> list[Song]:
+    out = []
+    for x in items:
+        song = lookup(x) if isinstance(x, int) else _song_from_row(x)
+        if song is not None:
+            out.append(song)
+    return out
+
+
+def _make_history(cap: Optional[int], spill_dir: Optional[str], resolve: Callable[[int], Optional[Song]]) -> Any:
+    # unbounded by default; with a cap older entries are dropped or spilled to disk as ids
+    if cap is None:
+        return Stack()
+    return BoundedStack(cap, _song_id, resolve, spill_dir)
+
+
+def _history_mark(history: Any) -> int:
+    # bounded histories shed entries on their own; count those as still there
+    return len(history) + getattr(history, "dropped", 0)
+
+
+def _marks(pl: Any) -> tuple[int, int]:
+    return len(pl.up_next), _history_mark(pl.history)
+
+
+def _moved(pl: Any, marks: tuple[int, int]) -> dict[str, int]:
+    # how a cursor move changed the queue and history, so listeners can apply deltas
+    return {"dequeued": marks[0] - len(pl.up_next), "history": _history_mark(pl.history) - marks[1]}
+
+
+class _Observable:
     def __init__(self) -> None:
-        self._list: CircularDoublyLinkedList[Song] = CircularDoublyLinkedList()
-        self._current: Optional[_Node[Song]] = None
-        self.history: Stack[Song] = Stack()
+        self._listeners: list[Listener] = []
+
+    def subscribe(self, listener: Listener) -> None:
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Listener) -> None:
+        self._listeners.remove(listener)
+
+    def _emit(self, op: str, **data: Any) -> None:
+        for listener in self._listeners:
+            listener(op, data)
+
+
+class Favorites:
+    """Favorited songs in the order they were favorited.
+
+    Songs sit in a list with a sequence number each plus an id -> slot map,
+    so add, remove and membership are O(1) and a page starting after a
+    sequence number is a bisect away. Removal leaves a hole that is
+    squeezed out once holes outnumber songs.
+    """
+
+    def __init__(self) -> None:
+        self._songs: list[Optional[Song]] = []
+        self._seqs: list[int] = []
+        self._slot: dict[int, int] = {}
+        self._next_seq = 1
+        self._holes = 0
+
+    def __len__(self) -> int:
+        return len(self._slot)
+
+    def __contains__(self, song_id: object) -> bool:
+        return song_id in self._slot
+
+    def __iter__(self):
+        return (s for s in self._songs if s is not None)
+
+    def add(self, song: Song) -> bool:
+        if song.id in self._slot:
+            return False
+        self._slot[song.id] = len(self._songs)
+        self._songs.append(song)
+        self._seqs.append(self._next_seq)
+        self._next_seq += 1
+        return True
+
+    def discard(self, song_id: int) -> bool:
+        i = self._slot.pop(song_id, None)
+        if i is None:
+            return False
+        self._songs[i] = None
+        self._holes += 1
+        if self._holes > 32 and self._holes * 2 > len(self._songs):
+            self._compact()
+        return True
+
+    def clear(self) -> None:
+        self._songs, self._seqs, self._slot = [], [], {}
+        self._holes = 0
+
+    def _compact(self) -> None:
+        keep = [i for i, s in enumerate(self._songs) if s is not None]
+        self._songs = [self._songs[i] for i in keep]
+        self._seqs = [self._seqs[i] for i in keep]
+        self._slot = {s.id: i for i, s in enumerate(self._songs)}  # type: ignore[union-attr]
+        self._holes = 0
+
+    def page(self, after: Optional[int], limit: int) -> tuple[list[Song], Optional[int]]:
+        """Up to ``limit`` songs favorited after sequence number ``after``, plus the cursor for the rest."""
+        i = 0 if after is None else bisect_right(self._seqs, after)
+        out: list[Song] = []
+        seqs: list[int] = []
+        while i < len(self._songs) and len(out) <= limit:
+            song = self._songs[i]
+            if song is not None:
+                out.append(song)
+                seqs.append(self._seqs[i])
+            i += 1
+        if len(out) > limit:
+            return out[:limit], seqs[limit - 1]
+        return out, None
+
+
+class Versions:
+    """Change counters for each facet a client can list.
+
+    Every mutation bumps the facets it changed (``library``: the songs,
+    ``cursor``: the current song, then ``queue``, ``history`` and
+    ``favorites``); ``songs`` counts changes to the fields of songs already
+    listed, such as a preview URL filled in later, which can show up in any
+    facet. Equal readings mean equal listings, so a listing can be cached
+    against them. ``epoch`` is random per playlist, so readings from a
+    rebuilt playlist (another process, a reload) never match older ones.
+    """
+
+    __slots__ = ("epoch", "library", "cursor", "queue", "history", "favorites", "songs")
+
+    def __init__(self) -> None:
+        self.epoch = secrets.randbits(48)
+        self.library = self.cursor = self.queue = self.history = self.favorites = self.songs = 0
+
+    def tag(self, *facets: str) -> str:
+        """A strong validator for a listing built from ``facets``, e.g. ``"5f3a...-0-l12c40"``."""
+        return "%x-%d-" % (self.epoch, self.songs) + "".join("%s%d" % (f[0], getattr(self, f)) for f in facets)
+
+
+class _SongFactory:
+    def __init__(self, table: Optional[SongTable] = None) -> None:
+        # optional columnar backing; songs are then TableSong handles
+        self._table = table
+
+    def _make_song(self, song_id: int, title: str, artist: str, duration_sec: int = 0, audio_url: str | None = None) -> Song:
+        if self._table is not None:
+            return self._table.add(song_id, title, artist, duration_sec, audio_url)  # type: ignore[return-value]
+        return Song(song_id, title, artist, duration_sec, audio_url)
+
+
+class _PlaylistExtras(_Observable, ABC):
+    """Queue lanes, shuffle, radio, favorites, undo and smart playlists over a library kept by a subclass (its abstract methods)."""
+
+    # library changes that can be undone
+    UNDO_DEPTH = 100
+    # smart playlists per playlist; each one costs a rule check on every add and remove
+    SMART_LIMIT = 32
+
+    def __init__(self, history_cap: Optional[int] = None, spill_dir: Optional[str] = None) -> None:
+        super().__init__()
+        self._history_cap = history_cap
+        self._spill_dir = spill_dir
+        self.history: Stack[Song] = _make_history(history_cap, spill_dir, self.get_song)
         self.up_next: Queue[Song] = Queue()
+        self.favorites = Favorites()
         self._next_song_id = 1
+        self._shuffle: Optional[ShuffleOrder] = None
+        # built on the first search
+        self._index: Optional[SearchIndex] = None
+        # built on the first duration or seek query
+        self._timeline: Optional[DurationIndex] = None
+        self.versions = Versions()
+        # the library as a persistent trie: each change makes a new version sharing the rest
+        self._order = SongVector()
+        # (library version, favorites the change away from it dropped), newest last
+        self._undo: list[tuple[SongVector, tuple[int, ...]]] = []
+        self._redo: list[tuple[SongVector, tuple[int, ...]]] = []
+        self._undoing = False
+        # undo entries from here on belong to the running batch
+        self._batch_mark: Optional[int] = None
+        # name -> rule-based view of the library, updated on every add and remove
+        self.smart: dict[str, SmartPlaylist] = {}
+        # picks the next song when the queue is empty, if on
+        self._radio: Optional[Radio] = None
+
+    def enqueue_next(self, song_id: int, lane: str = "end") -> Optional[int]:
+        """Queue a song in ``lane`` ("next" plays before "end"); returns the queue entry id."""
+        song = self.get_song(song_id)
+        if song is None:
+            return None
+        entry = self.up_next.enqueue(song, lane)
+        self.versions.queue += 1
+        if self._listeners:
+            self._emit("enqueue", id=song_id, lane=lane, entry=entry)
+        return entry
+
+    def unqueue(self, entry_id: int) -> bool:
+        removed = self.up_next.remove(entry_id)
+        if removed:
+            self.versions.queue += 1
+            if self._listeners:
+                self._emit("unqueue", entry=entry_id)
+        return removed
+
+    def move_queued(self, entry_id: int, index: int) -> Optional[str]:
+        """Move a queue entry to ``index`` in play order; returns its new lane."""
+        lane = self.up_next.move(entry_id, index)
+        if lane is not None:
+            self.versions.queue += 1
+            if self._listeners:
+                self._emit("requeue", entry=entry_id, index=index)
+        return lane
+
+    def _dump_queue(self) -> dict[str, Any]:
+        entries = self.up_next.entries()
+        return {
+            "queue": _dump_songs([song for _, _, song in entries], self.get_song),
+            "queue_entries": [entry_id for entry_id, _, _ in entries],
+            "queue_next": self.up_next.lane_size("next"),
+            "queue_seq": self.up_next.next_entry_id,
+        }
+
+    def _load_queue(self, state: dict[str, Any]) -> None:
+        entry_ids = state.get("queue_entries")
+        in_next = state.get("queue_next", 0)
+        for i, item in enumerate(state["queue"]):
+            for song in _load_songs([item], self.get_song):
+                self.up_next.enqueue(song, "next" if i < in_next else "end", entry_ids[i] if entry_ids else None)
+        self.up_next.next_entry_id = max(self.up_next.next_entry_id, state.get("queue_seq", 1))
+
+    @property
+    def shuffle(self) -> bool:
+        return self._shuffle is not None
+
+    def set_shuffle(self, on: bool, seed: Optional[int] = None) -> None:
+        """Turn shuffle on or off; ``seed`` fixes the order (journal replay passes it back)."""
+        if on:
+            if seed is None:
+                seed = random.getrandbits(63)
+            self._shuffle = ShuffleOrder(self._next_song_id - 1, self._has, seed)
+            current = self.play()
+            self._shuffle.start(current.id if current else None)
+        else:
+            self._shuffle = None
+        if self._listeners:
+            self._emit("shuffle", on=on, seed=seed)
+
+    @property
+    def radio(self) -> bool:
+        return self._radio is not None
+
+    def set_radio(self, on: bool, seed: Optional[int] = None) -> None:
+        """Turn radio on or off; ``seed`` fixes its picks (journal replay passes it back).
+
+        With radio on, ``next`` with nothing queued plays a song that has
+        followed the current one before (see ``Radio``), and steps as usual
+        when there is none. It starts from what history already holds and
+        learns from every move forward after that but its own picks, so it
+        does not just reinforce itself.
+        """
+        if on:
+            if seed is None:
+                seed = random.getrandbits(63)
+            self._radio = Radio(seed, self._has, self.favorites.__contains__)
+            self._radio.learn_all(song.id for song in reversed(self.history.items(0, Radio.WARM_START)))
+        else:
+            self._radio = None
+        if self._listeners:
+            self._emit("radio", on=on, seed=seed)
+
+    def _radio_pick(self, current: Song) -> Optional[int]:
+        # the current song was just pushed, so it heads the recent ones
+        assert self._radio is not None
+        return self._radio.pick(current.id, [song.id for song in self.history.items(0, Radio.RECENT)])
+
+    def add_favorite(self, song_id: int) -> bool:
+        """Favorite a song in this playlist; False if there is no such song."""
+        song = self.get_song(song_id)
+        if song is None:
+            return False
+        if self.favorites.add(song):
+            self.versions.favorites += 1
+            if self._listeners:
+                self._emit("fav_add", id=song_id)
+        return True
+
+    def remove_favorite(self, song_id: int) -> bool:
+        removed = self.favorites.discard(song_id)
+        if removed:
+            self.versions.favorites += 1
+            if self._listeners:
+                self._emit("fav_remove", id=song_id)
+        return removed
+
+    def clear_favorites(self) -> None:
+        if len(self.favorites):
+            self.favorites.clear()
+            self.versions.favorites += 1
+
+    def snapshot(self) -> SongVector:
+        """The library as of now, in playlist order, in O(1).
+
+        The version never changes, so it can be read after the caller lets
+        go of the playlist (and its lock) while changes carry on.
+        """
+        return self._order
 
     def add_song(self, title: str, artist: str, duration_sec: int = 0, audio_url: str | None = None) -> Song:
-        song = Song(self._next_song_id, title, artist, duration_sec, audio_url)
+        song = self._make_song(self._next_song_id, title, artist, duration_sec, audio_url)  # type: ignore[attr-defined]
         self._next_song_id += 1
-        self._list.append(song)
-        if self._current is None:
-            # Set current to head when the first song is added
-            head_value = self._list.head()
-            if head_value is not None:
-                self._current = self._list.find_node(head_value)
+        self._link([song])
+        if self.play() is None:
+            # Set current to the first song added
+            self._move_cursor(song.id)
+            self.versions.cursor += 1
+        self._on_added([song], bulk=False)
         return song
 
+    def add_songs_bulk(self, rows: Iterable[SongFields]) -> list[Song]:
+        songs = []
+        for title, artist, duration_sec, audio_url in rows:
+            songs.append(self._make_song(self._next_song_id, title, artist, duration_sec, audio_url))  # type: ignore[attr-defined]
+            self._next_song_id += 1
+        if not songs:
+            return songs
+        self._link(songs)
+        if self.play() is None:
+            self._move_cursor(songs[0].id)
+            self.versions.cursor += 1
+        self._on_added(songs, bulk=True)
+        return songs
+
     def remove_song(self, song_id: int) -> bool:
-        if self._list.is_empty():
+        if not self._has(song_id):
             return False
-        # if removing current, advance first
-        if self._current and self._current.value.id == song_id:
-            self.next()
-        # find by id
-        node = self._current
-        if not node:
+        marks = _marks(self)
+        current = self.play()
+        if current is not None and current.id == song_id:
+            # if removing current, advance first
+            self._play_next()
+        self._unlink(song_id)
+        self._on_removed(song_id, marks)
+        return True
+
+    def _on_added(self, songs: list[Song], bulk: bool) -> None:
+        """Bring everything kept beside the library up to date with ``songs``, just appended to it.
+
+        Shuffle, the indexes, smart playlists, the persistent library and
+        its undo trail, then listeners: one ``add_bulk`` event if ``bulk``,
+        else one ``add``.
+        """
+        self.versions.library += 1
+        if self._shuffle is not None:
+            for song in songs:
+                self._shuffle.add(song.id)
+        if self._index is not None:
+            self._index.add_many(songs)
+        if self._timeline is not None:
+            self._timeline.add_many(songs)
+        for view in self.smart.values():
+            view.add_many(songs)
+        before = self._order
+        self._order = before.add_many(songs)
+        self._record(before)
+        if self._listeners:
+            if bulk:
+                self._emit("add_bulk", songs=songs)
+            else:
+                self._emit("add", song=songs[0])
+
+    def _on_removed(self, song_id: int, marks: tuple[int, ...]) -> None:
+        """The same after ``song_id`` left the library; ``marks`` are ``_marks`` from before the cursor moved off it."""
+        self.versions.library += 1
+        dropped = (song_id,) if self.favorites.discard(song_id) else ()
+        if dropped:
+            self.versions.favorites += 1
+        if self._shuffle is not None:
+            self._shuffle.discard(song_id)
+        if self._index is not None:
+            self._index.discard(song_id)
+        if self._timeline is not None:
+            self._timeline.discard(song_id)
+        for view in self.smart.values():
+            view.discard(song_id)
+        self._touch_history()
+        before = self._order
+        self._order = before.set(song_id, None)
+        self._record(before, dropped)
+        if self._listeners:
+            self._emit("remove", id=song_id, **_moved(self, marks))
+
+    def _record(self, before: SongVector, dropped: tuple[int, ...] = ()) -> None:
+        """Note a library change for undo: ``before`` is the version it replaced, ``dropped`` the favorites it cost."""
+        if self._undoing:
+            return
+        self._undo.append((before, dropped))
+        self._redo.clear()
+        if self._batch_mark is None and len(self._undo) > self.UNDO_DEPTH:
+            del self._undo[0]
+
+    def forget_undo(self) -> None:
+        """Drop every undo and redo step, as a playlist rebuilt by ``load_state`` starts without them."""
+        self._undo.clear()
+        self._redo.clear()
+
+    def undo_depth(self) -> tuple[int, int]:
+        """How many library changes can be undone and redone."""
+        return len(self._undo), len(self._redo)
+
+    def undo(self) -> bool:
+        """Put the library back as it was before the last change, favorites it dropped included.
+
+        Only songs come back, not the cursor, queue or history; False if there is nothing to undo.
+        """
+        return self._step(self._undo, self._redo)
+
+    def redo(self) -> bool:
+        """Make the last undone change again; False if there is nothing to redo."""
+        return self._step(self._redo, self._undo)
+
+    def _step(self, source: list[tuple[SongVector, tuple[int, ...]]], dest: list[tuple[SongVector, tuple[int, ...]]]) -> bool:
+        if not source:
             return False
-        for _ in range(len(self._list)):
-            if node.value.id == song_id:
-                removed = self._list.remove(node.value)
-                return removed
-            node = self._list.node_after(node)
-        return False
+        target, dropped = source.pop()
+        here = self._order
+        dest.append((here, self._move_to(target)))
+        for song_id in dropped:
+            self.add_favorite(song_id)
+        return True
 
-    def play(self) -> Optional[Song]:
-        if self._current:
-            return self._current.value
-        return None
+    def _move_to(self, target: SongVector) -> tuple[int, ...]:
+        """Make the library ``target``; returns the favorites that cost."""
+        # only the subtrees the two versions do not share are compared, so this is O(change)
+        changes = list(self._order.diff(target))
+        dropped = tuple(song_id for song_id, _, song in changes if song is None and song_id in self.favorites)
+        self._undoing = True
+        try:
+            for song_id, _, song in changes:
+                if song is None:
+                    self.remove_song(song_id)
+            for _, here, song in changes:
+                if here is None and song is not None:
+                    self._restore(song)
+        finally:
+            self._undoing = False
+        # same songs; keep the target's nodes so later diffs against it stay short
+        self._order = target
+        return dropped
+
+    def restore_song(self, song_id: int, title: str, artist: str, duration_sec: int = 0, audio_url: str | None = None) -> bool:
+        """Put a removed song back under its old id, in its place (journal replay of an undo).
+
+        False if the id is in the library or was never handed out.
+        """
+        if self._has(song_id) or not 0 < song_id < self._next_song_id:
+            return False
+        self._restore(self._make_song(song_id, title, artist, duration_sec, audio_url))  # type: ignore[attr-defined]
+        return True
+
+    def _restore(self, song: Song) -> None:
+        self._relink(song)
+        if self.play() is None:
+            self._move_cursor(song.id)
+            self.versions.cursor += 1
+        self._order = self._order.set(song.id, song)
+        self.versions.library += 1
+        if self._shuffle is not None:
+            self._shuffle.restore(song.id)
+        # removed ids linger in the postings and are only counted as dead; rebuild on the next search
+        self._index = None
+        if self._timeline is not None:
+            self._timeline.restore(song)
+        for view in self.smart.values():
+            view.add(song)
+        self._touch_history()
+        if self._listeners:
+            self._emit("restore", song=song)
 
     def next(self) -> Optional[Song]:
-        # priority to up_next queue
-        queued = self.up_next.dequeue()
-        if queued:
-            if self._current:
-                self.history.push(self._current.value)
-            # move current to a node with this song if exists; otherwise append
-            node = self._list.find_node(queued)
-            if node is None:
-                self._list.append(queued)
-                head_val = self._list.head()
-                node = self._list.find_node(head_val)  # fallback to some node
-            self._current = node
+        if not self._listeners:
+            return self._play_next()
+        marks = _marks(self)
+        song = self._play_next()
+        self._emit("next", id=song.id if song else None, **_moved(self, marks))
+        return song
+
+    def _play_next(self) -> Optional[Song]:
+        versions = self.versions
+        # priority to up_next queue; skip entries removed since they were queued
+        while True:
+            queued = self.up_next.dequeue()
+            if queued is None:
+                break
+            versions.queue += 1
+            current = self.play()
+            if not self._move_cursor(queued.id):
+                continue
+            if current is not None:
+                self.history.push(current)
+                versions.history += 1
+                if self._radio is not None:
+                    self._radio.learn(current.id, queued.id)
+            versions.cursor += 1
             return queued
 
-        if self._current is None:
-            head_val = self._list.head()
-            if head_val is None:
-                return None
-            self._current = self._list.find_node(head_val)
-            return self._current.value if self._current else None
-
-        self.history.push(self._current.value)
-        self._current = self._list.node_after(self._current)
-        return self._current.value
+        current = self.play()
+        if current is None:
+            song = self._to_first()
+            if song is not None:
+                versions.cursor += 1
+            return song
+
+        self.history.push(current)
+        versions.history += 1
+        versions.cursor += 1
+        if self._radio is not None:
+            song_id = self._radio_pick(current)
+            if song_id is not None:
+                self._move_cursor(song_id)
+                return self.play()
+        if self._shuffle is not None:
+            song_id = self._shuffle.after(current.id)
+            if song_id is not None:
+                self._move_cursor(song_id)
+            song = self.play()
+        else:
+            song = self._advance()
+        if self._radio is not None:
+            self._radio.learn(current.id, song.id)  # type: ignore[union-attr]
+        return song
 
     def previous(self) -> Optional[Song]:
+        if not self._listeners:
+            return self._play_previous()
+        marks = _marks(self)
+        song = self._play_previous()
+        self._emit("previous", id=song.id if song else None, **_moved(self, marks))
+        return song
+
+    def _play_previous(self) -> Optional[Song]:
+        versions = self.versions
         # Prefer history if available
         prev = self.history.pop()
         if prev:
-            node = self._list.find_node(prev)
-            if node:
-                self._current = node
+            versions.history += 1
+            if self._move_cursor(prev.id):
+                versions.cursor += 1
                 return prev
 
-        if self._current is None:
-            head_val = self._list.head()
-            if head_val is None:
-                return None
-            self._current = self._list.find_node(head_val)
-            return self._current.value if self._current else None
+        current = self.play()
+        if current is None:
+            song = self._to_first()
+            if song is not None:
+                versions.cursor += 1
+            return song
+
+        versions.cursor += 1
+
+        if self._shuffle is not None:
+            # nothing earlier in this pass: stay on the current song
+            song_id = self._shuffle.before(current.id)
+            if song_id is not None:
+                self._move_cursor(song_id)
+            return self.play()
+        return self._step_back()
+
+    def _touch_history(self) -> None:
+        # a bounded history leaves out removed songs, so removing or restoring one can change its listing
+        if isinstance(self.history, BoundedStack) and not self.history.is_empty():
+            self.versions.history += 1
+
+
+    def set_smart(self, name: str, rule: Rule) -> SmartPlaylist:
+        """Create (or redefine) the smart playlist ``name``: the songs matching ``rule``, kept up to date.
 
-        self._current = self._list.node_before(self._current)
+        Filters the library once, O(n); after that every add and remove
+        updates it in O(log n). Raises ValueError past ``SMART_LIMIT``.
+        """
+        if name not in self.smart and len(self.smart) >= self.SMART_LIMIT:
+            raise ValueError(f"at most {self.SMART_LIMIT} smart playlists")
+        view = self.smart[name] = SmartPlaylist(rule, self._order, self._smart_history)
+        if self._listeners:
+            self._emit("smart_set", name=name, rule=rule.to_json())
+        return view
+
+    def drop_smart(self, name: str) -> bool:
+        if self.smart.pop(name, None) is None:
+            return False
+        if self._listeners:
+            self._emit("smart_drop", name=name)
+        return True
+
+    def smart_next(self, name: str) -> Optional[Song]:
+        """Step the smart playlist ``name`` (which must exist) on: its queue first, then the next member, wrapping."""
+        song = self.smart[name].next()
+        if self._listeners:
+            self._emit("smart_next", name=name, id=song.id if song else None)
+        return song
+
+    def smart_previous(self, name: str) -> Optional[Song]:
+        song = self.smart[name].previous()
+        if self._listeners:
+            self._emit("smart_previous", name=name, id=song.id if song else None)
+        return song
+
+    def smart_enqueue(self, name: str, song_id: int, lane: str = "end") -> Optional[int]:
+        """Queue a song in the smart playlist ``name``; None unless the song is one of its members."""
+        entry = self.smart[name].enqueue(song_id, lane)
+        if entry is not None and self._listeners:
+            self._emit("smart_enqueue", name=name, id=song_id, lane=lane)
+        return entry
+
+    def _dump_smart(self) -> dict[str, Any]:
+        return {name: view.dump_state() for name, view in self.smart.items()}
+
+    def _load_smart(self, state: dict[str, Any]) -> None:
+        for name, view in state.get("smart", {}).items():
+            self.smart[name] = SmartPlaylist.load_state(view, self._order, self._smart_history)
+
+    def _smart_history(self, resolve: Callable[[int], Optional[Song]]) -> Any:
+        # smart playlists keep their history under the same cap (and spill dir) as the playlist's own
+        return _make_history(self._history_cap, self._spill_dir, resolve)
+
+    def search(self, query: str, limit: int = 20) -> list[Song]:
+        """Songs matching every word of ``query`` (the last may be partial), best first.
+
+        The index is built on the first search and kept up to date after that.
+        """
+        if self._index is None:
+            self._index = SearchIndex(self._has)
+            self._index.add_many(self.list_songs())
+        return [song for song in map(self.get_song, self._index.search(query, limit)) if song is not None]
+
+    def _durations(self) -> DurationIndex:
+        if self._timeline is None:
+            self._timeline = DurationIndex()
+            self._timeline.add_many(self.list_songs())
+        return self._timeline
+
+    def total_duration(self) -> int:
+        """Length of the whole playlist in seconds. The index behind this and the
+        other timeline queries is built on first use and kept up to date after that."""
+        return self._durations().total()
+
+    def progress(self) -> dict[str, Any]:
+        """Where the current song sits: its position, the seconds before it and the seconds from its start to the end."""
+        timeline = self._durations()
+        total = timeline.total()
+        current = self.play()
+        if current is None:
+            return {"songs": len(timeline), "total_sec": total, "position": None, "elapsed_sec": 0, "remaining_sec": total}
+        elapsed, position = timeline.before(current.id)
+        return {"songs": len(timeline), "total_sec": total, "position": position, "elapsed_sec": elapsed, "remaining_sec": total - elapsed}
+
+    def song_at(self, position: int) -> Optional[tuple[Song, int]]:
+        """The song at 0-based ``position`` in playlist order and the second it starts at."""
+        timeline = self._durations()
+        song_id = timeline.at_position(position)
+        if song_id is None:
+            return None
+        return self.get_song(song_id), timeline.before(song_id)[0]  # type: ignore[return-value]
+
+    def song_at_offset(self, seconds: int) -> Optional[tuple[Song, int]]:
+        """The song playing ``seconds`` into the playlist and how far into it that is."""
+        hit = self._durations().at_offset(seconds)
+        if hit is None:
+            return None
+        return self.get_song(hit[0]), hit[1]  # type: ignore[return-value]
+
+    def seek(self, seconds: int) -> Optional[tuple[Song, int]]:
+        """Make the song playing ``seconds`` into the playlist current; None past the end."""
+        hit = self.song_at_offset(seconds)
+        if hit is not None:
+            self.jump_to(hit[0].id)
+        return hit
+
+    def jump_to(self, song_id: int) -> Optional[Song]:
+        """Make ``song_id`` current, pushing the old current song onto history."""
+        song = self.get_song(song_id)
+        if song is None:
+            return None
+        marks = _marks(self)
+        current = self.play()
+        if current is not song:
+            if current is not None:
+                self.history.push(current)
+                self.versions.history += 1
+                if self._radio is not None:
+                    self._radio.learn(current.id, song_id)
+            self._move_cursor(song_id)
+            self.versions.cursor += 1
+        if self._listeners:
+            self._emit("jump", id=song_id, **_moved(self, marks))
+        return song
+
+    def apply_batch(self, ops: Iterable[dict[str, Any]]) -> list[Any]:
+        """Apply ``ops`` in order, all of them or none.
+
+        Each op is a dict whose "op" is one of ``BATCH_OPS``: add takes
+        "title", "artist" and optionally "duration_sec" and "audio_url";
+        remove, enqueue (with an optional "lane") and favorite take a
+        "song_id", or a "ref" to the index of an earlier add in the batch.
+        The whole batch is checked against the playlist before anything
+        changes, so an op that would fail raises ``BatchError`` with the
+        playlist untouched. Returns a result per op: the added song, True
+        for remove and favorite, the queue entry id, or the new current
+        song for next and previous. Runs of adds go in as one bulk add.
+        """
+        ops = list(ops)
+        targets = self._plan_batch(ops)
+        results: list[Any] = []
+        added: dict[int, Song] = {}
+        self._batch_mark = mark = len(self._undo)
+        try:
+            self._apply_planned(ops, targets, results, added)
+        finally:
+            self._batch_mark = None
+            # the batch undoes as one step
+            entries = self._undo[mark:]
+            if len(entries) > 1:
+                self._undo[mark:] = [(entries[0][0], tuple(song_id for _, dropped in entries for song_id in dropped))]
+            del self._undo[: max(len(self._undo) - self.UNDO_DEPTH, 0)]
+        return results
+
+    def _apply_planned(self, ops: list[dict[str, Any]], targets: list[Optional[int]], results: list[Any], added: dict[int, Song]) -> None:
+        i = 0
+        while i < len(ops):
+            kind = ops[i]["op"]
+            if kind == "add":
+                j = i
+                while j < len(ops) and ops[j]["op"] == "add":
+                    j += 1
+                rows = [(op["title"], op["artist"], op.get("duration_sec") or 0, op.get("audio_url")) for op in ops[i:j]]
+                songs = [self.add_song(*rows[0])] if len(rows) == 1 else self.add_songs_bulk(rows)
+                added.update(zip(range(i, j), songs))
+                results.extend(songs)
+                i = j
+                continue
+            song_id = targets[i]
+            if kind == "remove":
+                results.append(self.remove_song(song_id))
+            elif kind == "enqueue":
+                results.append(self.enqueue_next(song_id, ops[i].get("lane", "end")))
+            elif kind == "favorite":
+                results.append(self.add_favorite(song_id))
+            elif kind == "next":
+                results.append(self.next())
+            else:
+                results.append(self.previous())
+            i += 1
+
+    def _plan_batch(self, ops: list[dict[str, Any]]) -> list[Optional[int]]:
+        """The song id each op acts on, after checking that every op will apply in turn."""
+        next_id = self._next_song_id
+        added: dict[int, int] = {}
+        # songs the batch adds, and songs it removes from the playlist as it is now
+        new: set[int] = set()
+        gone: set[int] = set()
+        targets: list[Optional[int]] = []
+        for i, op in enumerate(ops):
+            kind = op.get("op")
+            if kind not in BATCH_OPS:
+                raise BatchError(i, f"unknown op {kind!r}")
+            if kind == "add":
+                if not isinstance(op.get("title"), str) or not isinstance(op.get("artist"), str):
+                    raise BatchError(i, "add needs a title and an artist")
+                added[i] = next_id
+                new.add(next_id)
+                next_id += 1
+                targets.append(None)
+                continue
+            if kind in ("next", "previous"):
+                targets.append(None)
+                continue
+            if op.get("ref") is not None:
+                song_id = added.get(op["ref"])
+                if song_id is None:
+                    raise BatchError(i, "ref must be the index of an earlier add")
+            else:
+                song_id = op.get("song_id")
+            if not (song_id in new or (isinstance(song_id, int) and song_id not in gone and self._has(song_id))):
+                raise BatchError(i, "Song not found")
+            if kind == "enqueue" and op.get("lane", "end") not in ("next", "end"):
+                raise BatchError(i, "lane must be next or end")
+            if kind == "remove":
+                new.discard(song_id)
+                gone.add(song_id)
+            targets.append(song_id)
+        return targets
+
+    def _check_extras(self) -> None:
+        self.up_next.check()
+        _expect(len(self._order) == len(self) and all(a is b for a, b in zip(self._order, self.list_songs())), "library version out of step")  # type: ignore[arg-type]
+        if self._timeline is not None:
+            self._timeline.check(self.list_songs())
+        for view in self.smart.values():
+            view.check(self.list_songs())
+        _expect(all(self._has(song.id) for song in self.favorites), "favorite missing from the library")
+        _expect(self._next_song_id > max((s.id for s in self.favorites), default=0), "song id ahead of _next_song_id")
+
+    def dump_state(self) -> dict[str, Any]:
+        current = self.play()
+        return {
+            "songs": [_song_row(s) for s in self.list_songs()],
+            "current": current.id if current else None,
+            "history": _dump_songs(self.history.dump(), self.get_song),
+            **self._dump_queue(),
+            "favorites": [s.id for s in self.favorites],
+            "next_id": self._next_song_id,
+            "shuffle": self._shuffle.dump_state() if self._shuffle is not None else None,
+            "smart": self._dump_smart(),
+            "radio": self._radio.dump_state() if self._radio is not None else None,
+        }
+
+    @classmethod
+    def load_state(
+        cls, state: dict[str, Any], table: Optional[SongTable] = None, history_cap: Optional[int] = None, spill_dir: Optional[str] = None
+    ) -> Self:
+        pl = cls(table, history_cap, spill_dir)  # type: ignore[call-arg]
+        rows = state["songs"]
+        songs: list[Song] = []
+        seen: set[int] = set()
+        for row in rows:
+            # older snapshots could hold repeats of queued songs
+            if row[0] not in seen:
+                seen.add(row[0])
+                songs.append(pl._make_song(*row))  # type: ignore[attr-defined]
+        pl._link(songs)
+        pl._next_song_id = state["next_id"]
+        if "current" in state:
+            current = state["current"]
+        else:
+            # older list snapshots kept the cursor as a slot
+            pos = state["pos"]
+            current = rows[pos][0] if 0 <= pos < len(rows) else None
+        if current is not None and pl._has(current):
+            pl._move_cursor(current)
+        for song in _load_songs(state["history"], pl.get_song):
+            pl.history.push(song)
+        pl._load_queue(state)
+        for song in _load_songs(state.get("favorites", []), pl.get_song):
+            pl.favorites.add(song)
+        if state.get("shuffle"):
+            pl._shuffle = ShuffleOrder.load_state(state["shuffle"], pl._has)
+        pl._order = SongVector.build(pl.list_songs())
+        pl._load_smart(state)
+        if state.get("radio"):
+            pl._radio = Radio.load_state(state["radio"], pl._has, pl.favorites.__contains__)
+        return pl
+
+    # --- what a subclass keeps the library in ---
+
+    @abstractmethod
+    def get_song(self, song_id: int) -> Optional[Song]:
+        """The library song with ``song_id``, None if there is none."""
+
+    @abstractmethod
+    def list_songs(self) -> list[Song]:
+        """Every library song, in playlist order."""
+
+    @abstractmethod
+    def play(self) -> Optional[Song]:
+        """The current song."""
+
+    @abstractmethod
+    def _has(self, song_id: int) -> bool:
+        """Whether ``song_id`` is in the library."""
+
+    @abstractmethod
+    def _link(self, songs: list[Song]) -> None:
+        """Append ``songs`` (new, ids above every other) at the end; the cursor is left alone."""
+
+    @abstractmethod
+    def _unlink(self, song_id: int) -> None:
+        """Take ``song_id`` (in the library) out; a cursor still on it moves to the next song, or to none if it was the last."""
+
+    @abstractmethod
+    def _relink(self, song: Song) -> None:
+        """Link ``song`` back in at its place in id order; the cursor is left alone."""
+
+    @abstractmethod
+    def _move_cursor(self, song_id: int) -> bool:
+        """Make ``song_id`` current; False (and the cursor left alone) if it is not in the library."""
+
+    @abstractmethod
+    def _to_first(self) -> Optional[Song]:
+        """Put the cursor on the first song; returns it, None if the library is empty."""
+
+    @abstractmethod
+    def _advance(self) -> Song:
+        """Move the cursor (on a song) to the next song in playlist order, wrapping; returns it."""
+
+    @abstractmethod
+    def _step_back(self) -> Song:
+        """The same, backwards."""
+
+
+class CircularPlaylist(_PlaylistExtras, _SongFactory):
+    def __init__(self, table: Optional[SongTable] = None, history_cap: Optional[int] = None, spill_dir: Optional[str] = None) -> None:
+        _PlaylistExtras.__init__(self, history_cap, spill_dir)
+        _SongFactory.__init__(self, table)
+        self._list: CircularDoublyLinkedList[Song] = CircularDoublyLinkedList(key=_song_id)
+        self._current: Optional[_Node[Song]] = None
+
+    def __len__(self) -> int:
+        return len(self._list)
+
+    def _has(self, song_id: int) -> bool:
+        return self._list.find_by_key(song_id) is not None
+
+    def get_song(self, song_id: int) -> Optional[Song]:
+        node = self._list.find_by_key(song_id)
+        return node.value if node else None
+
+    def play(self) -> Optional[Song]:
+        if self._current:
+            return self._current.value
+        return None
+
+    def _link(self, songs: list[Song]) -> None:
+        self._list.extend(songs)
+
+    def _unlink(self, song_id: int) -> None:
+        node = self._list.find_by_key(song_id)
+        assert node is not None
+        if node is self._current:
+            # still on it (queued copy or single song); step off the ring
+            self._current = self._list.node_after(node) if len(self._list) > 1 else None
+        self._list.remove_node(node)
+
+    def _relink(self, song: Song) -> None:
+        following = self._order.after(song.id)
+        if following:
+            self._list.insert_before(self._list.find_by_key(following[0].id), song)  # type: ignore[arg-type]
+        else:
+            self._list.append(song)
+
+    def _move_cursor(self, song_id: int) -> bool:
+        node = self._list.find_by_key(song_id)
+        if node is None:
+            return False
+        self._current = node
+        return True
+
+    def _to_first(self) -> Optional[Song]:
+        self._current = self._list.head_node()
+        return self._current.value if self._current else None
+
+    def _advance(self) -> Song:
+        self._current = self._list.node_after(self._current)  # type: ignore[arg-type]
         return self._current.value
 
-    def enqueue_next(self, song_id: int) -> bool:
-        node = self._current
-        if not node:
-            # start from head if current is not set yet
-            head_val = self._list.head()
-            node = self._list.find_node(head_val) if head_val is not None else None
-            if not node:
-                return False
-        for _ in range(len(self._list)):
-            if node.value.id == song_id:
-                self.up_next.enqueue(node.value)
-                return True
-            node = self._list.node_after(node)
-        return False
+    def _step_back(self) -> Song:
+        self._current = self._list.node_before(self._current)  # type: ignore[arg-type]
+        return self._current.value
 
     def list_songs(self) -> list[Song]:
-        if self._list.is_empty():
-            return []
-        head_val = self._list.head()
-        node = self._list.find_node(head_val) if head_val else None
+        node = self._list.head_node()
         if not node:
             return []
         return list(self._list.iter_forward(start=node))
 
+    def check(self) -> None:
+        """Raise AssertionError if the ring, cursor, queue or favorites are inconsistent. O(n)."""
+        self._list.check()
+        if self._current is None:
+            _expect(not len(self._list), "no current song in a non-empty playlist")
+        else:
+            _expect(self._list.find_by_key(self._current.value.id) is self._current, "current node is not in the ring")
+        self._check_extras()
 
-class ListPlaylist:
-    def __init__(self) -> None:
-        self._songs: list[Song] = []
+    def songs_after(self, song_id: Optional[int], limit: int) -> list[Song]:
+        """Up to ``limit`` songs following ``song_id`` in playlist order (from the start if None)."""
+        head = self._list.head_node()
+        if head is None:
+            return []
+        if song_id is None:
+            node: Optional[_Node[Song]] = head
+        else:
+            after = self._list.find_by_key(song_id)
+            if after is not None:
+                node = after.next if after.next is not head else None
+            else:
+                # removed meanwhile; ids increase along the ring, so resume at the first larger one
+                node = next((n for n in self._iter_nodes(head) if n.value.id > song_id), None)
+        out: list[Song] = []
+        while node is not None and len(out) < limit:
+            out.append(node.value)
+            node = node.next if node.next is not head else None
+        return out
+
+    def window(self, before: int, after: int) -> list[Song]:
+        """The current song with up to ``before``/``after`` neighbours, in playing order."""
+        node = self._current
+        if node is None:
+            return []
+        size = len(self._list)
+        before = min(before, size - 1)
+        after = min(after, size - 1 - before)
+        for _ in range(before):
+            node = self._list.node_before(node)
+        return list(islice(self._list.iter_forward(start=node), before + 1 + after))
+
+    def _iter_nodes(self, start: _Node[Song]) -> Iterable[_Node[Song]]:
+        node = start
+        while True:
+            yield node
+            node = self._list.node_after(node)
+            if node is start:
+                return
+
+
+class ListPlaylist(_PlaylistExtras, _SongFactory):
+    """Array-backed playlist with the same behaviour as ``CircularPlaylist``.
+
+    Songs live in a list in the order they were added, with an id -> slot
+    map. Removing a song leaves a hole (``None``) so other slots stay put;
+    holes are squeezed out once they outnumber songs. Playing a queued song
+    just moves the cursor to its slot.
+    """
+
+    def __init__(self, table: Optional[SongTable] = None, history_cap: Optional[int] = None, spill_dir: Optional[str] = None) -> None:
+        _PlaylistExtras.__init__(self, history_cap, spill_dir)
+        _SongFactory.__init__(self, table)
+        self._songs: list[Optional[Song]] = []
+        # ids by slot, kept for holes too so songs_after can bisect
+        self._ids: list[int] = []
+        self._slot: dict[int, int] = {}
+        self._holes = 0
         self._pos = -1
-        self.history: Stack[Song] = Stack()
-        self.up_next: Queue[Song] = Queue()
-        self._next_song_id = 1
 
-    def add_song(self, title: str, artist: str, duration_sec: int = 0, audio_url: str | None = None) -> Song:
-        song = Song(self._next_song_id, title, artist, duration_sec, audio_url)
-        self._next_song_id += 1
-        self._songs.append(song)
-        if self._pos == -1:
-            self._pos = 0
-        return song
+    def __len__(self) -> int:
+        return len(self._slot)
 
-    def remove_song(self, song_id: int) -> bool:
-        for i, s in enumerate(self._songs):
-            if s.id == song_id:
-                del self._songs[i]
-                if self._pos >= len(self._songs):
-                    self._pos = len(self._songs) - 1
-                return True
-        return False
+    def _has(self, song_id: int) -> bool:
+        return song_id in self._slot
+
+    def get_song(self, song_id: int) -> Optional[Song]:
+        slot = self._slot.get(song_id)
+        return self._songs[slot] if slot is not None else None
 
     def play(self) -> Optional[Song]:
-        if 0 <= self._pos < len(self._songs):
+        if self._pos >= 0:
             return self._songs[self._pos]
         return None
 
-    def next(self) -> Optional[Song]:
-        queued = self.up_next.dequeue()
-        if queued:
-            if 0 <= self._pos < len(self._songs):
-                self.history.push(self._songs[self._pos])
-            self._songs.append(queued)
-            self._pos = len(self._songs) - 1
-            return queued
-        if not self._songs:
-            return None
-        if 0 <= self._pos < len(self._songs):
-            self.history.push(self._songs[self._pos])
-        self._pos = (self._pos + 1) % len(self._songs)
-        return self._songs[self._pos]
+    def _append(self, song: Song) -> int:
+        slot = len(self._songs)
+        self._songs.append(song)
+        self._ids.append(song.id)
+        self._slot[song.id] = slot
+        return slot
 
-    def previous(self) -> Optional[Song]:
-        prev = self.history.pop()
-        if prev:
-            try:
-                idx = next(i for i, s in enumerate(self._songs) if s.id == prev.id)
-                self._pos = idx
-                return prev
-            except StopIteration:
-                pass
-        if not self._songs:
-            return None
-        self._pos = (self._pos - 1) % len(self._songs)
-        return self._songs[self._pos]
+    def _link(self, songs: list[Song]) -> None:
+        if len(songs) == 1:
+            self._append(songs[0])
+            return
+        start = len(self._songs)
+        self._songs.extend(songs)
+        self._ids.extend(map(_song_id, songs))
+        self._slot.update(zip(self._ids[start:], range(start, len(self._songs))))
+
+    def _after(self, slot: int) -> int:
+        # next live slot, wrapping around; the list must not be empty
+        n = len(self._songs)
+        slot = (slot + 1) % n
+        while self._songs[slot] is None:
+            slot = (slot + 1) % n
+        return slot
 
-    def enqueue_next(self, song_id: int) -> bool:
-        for s in self._songs:
-            if s.id == song_id:
-                self.up_next.enqueue(s)
-                return True
-        return False
+    def _before(self, slot: int) -> int:
+        n = len(self._songs)
+        slot = (slot - 1) % n
+        while self._songs[slot] is None:
+            slot = (slot - 1) % n
+        return slot
+
+    def _first(self) -> int:
+        return self._after(-1) if self._slot else -1
+
+    def _unlink(self, song_id: int) -> None:
+        slot = self._slot.pop(song_id)
+        if slot == self._pos:
+            # still on it (queued copy or single song); step off
+            self._pos = self._after(slot) if self._slot else -1
+        self._songs[slot] = None
+        self._holes += 1
+        if self._holes > 32 and self._holes * 2 > len(self._songs):
+            self._compact()
+
+    def _compact(self) -> None:
+        current = self.play()
+        songs = [s for s in self._songs if s is not None]
+        self._songs = []
+        self._ids = []
+        self._slot = {}
+        self._holes = 0
+        for song in songs:
+            self._append(song)
+        self._pos = self._slot[current.id] if current is not None else -1
+
+    def _relink(self, song: Song) -> None:
+        slot = bisect_left(self._ids, song.id)
+        if slot < len(self._ids) and self._ids[slot] == song.id:
+            # its hole is still there
+            self._songs[slot] = song
+            self._holes -= 1
+        else:
+            # squeezed out since: shift the later slots up (O(n), undo only)
+            self._songs.insert(slot, song)
+            self._ids.insert(slot, song.id)
+            for later in range(slot + 1, len(self._songs)):
+                moved = self._songs[later]
+                if moved is not None:
+                    self._slot[moved.id] = later
+            if self._pos >= slot:
+                self._pos += 1
+        self._slot[song.id] = slot
+
+    def _move_cursor(self, song_id: int) -> bool:
+        slot = self._slot.get(song_id)
+        if slot is None:
+            return False
+        self._pos = slot
+        return True
+
+    def _to_first(self) -> Optional[Song]:
+        self._pos = self._first()
+        return self.play()
+
+    def _advance(self) -> Song:
+        self._pos = self._after(self._pos)
+        return self._songs[self._pos]  # type: ignore[return-value]
+
+    def _step_back(self) -> Song:
+        self._pos = self._before(self._pos)
+        return self._songs[self._pos]  # type: ignore[return-value]
 
     def list_songs(self) -> list[Song]:
-        return list(self._songs)
+        if not self._holes:
+            return list(self._songs)  # type: ignore[arg-type]
+        return [s for s in self._songs if s is not None]
+
+    def check(self) -> None:
+        """Raise AssertionError if slots, ids, the cursor, queue or favorites are inconsistent. O(n)."""
+        _expect(len(self._ids) == len(self._songs), "ids and songs differ in length")
+        _expect(all(a < b for a, b in zip(self._ids, self._ids[1:])), "slot ids out of order")
+        for song_id, slot in self._slot.items():
+            song = self._songs[slot]
+            _expect(song is not None and song.id == song_id == self._ids[slot], f"song {song_id} not at its slot")
+        _expect(self._holes == len(self._songs) - len(self._slot), "hole count is off")
+        if self._pos == -1:
+            _expect(not self._slot, "no current song in a non-empty playlist")
+        else:
+            _expect(0 <= self._pos < len(self._songs) and self._songs[self._pos] is not None, "cursor on a hole")
+        self._check_extras()
+
+    def songs_after(self, song_id: Optional[int], limit: int) -> list[Song]:
+        """Up to ``limit`` songs following ``song_id`` in playlist order (from the start if None)."""
+        # slots are in id order, so a cursor that was removed meanwhile still bisects
+        i = 0 if song_id is None else bisect_right(self._ids, song_id)
+        out: list[Song] = []
+        while i < len(self._songs) and len(out) < limit:
+            song = self._songs[i]
+            if song is not None:
+                out.append(song)
+            i += 1
+        return out
+
+    def window(self, before: int, after: int) -> list[Song]:
+        """The current song with up to ``before``/``after`` neighbours, in playing order."""
+        if self._pos < 0:
+            return []
+        size = len(self._slot)
+        before = min(before, size - 1)
+        after = min(after, size - 1 - before)
+        slot = self._pos
+        for _ in range(before):
+            slot = self._before(slot)
+        out = [self._songs[slot]]
+        for _ in range(before + after):
+            slot = self._after(slot)
+            out.append(self._songs[slot])
+        return out  # type: ignore[return-value]
@@ -0,0 +1,100 @@
+from __future__ import annotations
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Any, Callable, Iterable, Optional
+
+from .shuffle import _mix
+
+
+class Radio:
+    """Picks the song to play next from what has followed what before.
+
+    A sparse transition matrix kept as one dict per song that has been
+    played: ``rows[a][b]`` grows by 2 each time ``b`` came right after
+    ``a`` and by 1 each time ``a`` came right after ``b``, so songs that
+    play together attract each other, and the order they were played in
+    counts most. A pick reads the current song's row, leaves out songs that
+    were removed or played recently, counts favorites double and draws one
+    in proportion to its weight. A row that outgrows ``ROW_CAP`` keeps only
+    its strongest half, so a pick costs O(ROW_CAP) however large the
+    library is. Draws come from ``seed`` and a counter, like
+    ``ShuffleOrder``, so the same seed and the same plays pick the same
+    songs (and journal replay matches).
+    """
+
+    ROW_CAP = 256
+    # songs this many history entries back are not picked again
+    RECENT = 20
+    # history entries learned from when radio is turned on
+    WARM_START = 1_000
+
+    def __init__(self, seed: int, alive: Callable[[int], bool], favorite: Callable[[int], bool]) -> None:
+        self.seed = seed
+        self._alive = alive
+        self._favorite = favorite
+        self._draws = 0
+        self._rows: dict[int, dict[int, int]] = {}
+
+    def __len__(self) -> int:
+        """Songs with a row."""
+        return len(self._rows)
+
+    def entries(self) -> int:
+        return sum(map(len, self._rows.values()))
+
+    def learn(self, before: int, after: int) -> None:
+        """``after`` was played right after ``before``."""
+        if before != after:
+            self._bump(before, after, 2)
+            self._bump(after, before, 1)
+
+    def learn_all(self, song_ids: Iterable[int]) -> None:
+        """Learn every consecutive pair of ``song_ids``, oldest first."""
+        prev: Optional[int] = None
+        for song_id in song_ids:
+            if prev is not None:
+                self.learn(prev, song_id)
+            prev = song_id
+
+    def _bump(self, a: int, b: int, weight: int) -> None:
+        row = self._rows.get(a)
+        if row is None:
+            row = self._rows[a] = {}
+        row[b] = row.get(b, 0) + weight
+        if len(row) > self.ROW_CAP:
+            # ties go to the lower id, so a replay prunes the same way
+            strongest = sorted(row.items(), key=lambda item: (-item[1], item[0]))[: self.ROW_CAP // 2]
+            self._rows[a] = dict(strongest)
+
+    def pick(self, song_id: int, recent: Iterable[int]) -> Optional[int]:
+        """The song to follow ``song_id``; None if nothing it has been played with is left to pick."""
+        row = self._rows.get(song_id)
+        if not row:
+            return None
+        skip = set(recent)
+        skip.add(song_id)
+        alive = self._alive
+        candidates = [b for b in row if b not in skip and alive(b)]
+        if not candidates:
+            return None
+        favorite = self._favorite
+        bounds = list(accumulate(row[b] * 2 if favorite(b) else row[b] for b in candidates))
+        target = _mix(self.seed, self._draws) % bounds[-1]
+        self._draws += 1
+        return candidates[bisect_right(bounds, target)]
+
+    def dump_state(self) -> dict[str, Any]:
+        return {
+            "seed": self.seed,
+            "draws": self._draws,
+            # [song, successor, weight, successor, weight, ...] per row, in row order
+            "rows": [[a, *(x for item in row.items() for x in item)] for a, row in self._rows.items()],
+        }
+
+    @classmethod
+    def load_state(cls, state: dict[str, Any], alive: Callable[[int], bool], favorite: Callable[[int], bool]) -> "Radio":
+        radio = cls(state["seed"], alive, favorite)
+        radio._draws = state["draws"]
+        for a, *flat in state["rows"]:
+            radio._rows[a] = dict(zip(flat[::2], flat[1::2]))
+        return radio
@@ -0,0 +1,352 @@
+from __future__ import annotations
+import heapq
+import re
+import unicodedata
+from array import array
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, Iterable, Iterator, Sequence, Union
+
+from .models import Song
+
+# a posting list: one song id, or an array of ids in ascending order
+Posting = Union[int, "array[int]"]
+
+_WORD = re.compile(r"[^\W_]+")
+_NONZERO = re.compile(rb"[^\x00]")
+
+# weight of a query word matching a song, best match wins:
+# whole title word > title word prefix > whole artist word > artist word prefix
+TITLE, TITLE_PREFIX, ARTIST, ARTIST_PREFIX = 4, 3, 2, 1
+
+
+def tokenize(text: str) -> list[str]:
+    """Lower-cased words of ``text`` with accents stripped ("Beyoncé Knowles" -> ["beyonce", "knowles"])."""
+    text = text.casefold()
+    if not text.isascii():
+        text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    return _WORD.findall(text)
+
+
+# artists repeat across songs, titles mostly do not
+_artist_tokens = lru_cache(maxsize=4096)(lambda artist: frozenset(tokenize(artist)))
+
+
+def _contains(posting: Posting, song_id: int) -> bool:
+    if isinstance(posting, int):
+        return posting == song_id
+    i = bisect_left(posting, song_id)
+    return i < len(posting) and posting[i] == song_id
+
+
+def _size(posting: Posting) -> int:
+    return 1 if isinstance(posting, int) else len(posting)
+
+
+def _in_order(postings: list[Posting]) -> Iterable[int]:
+    # words seen in one song are common after prefix expansion: sort those together
+    single = sorted(p for p in postings if isinstance(p, int))
+    lists = [p for p in postings if not isinstance(p, int)]
+    if not lists:
+        return single
+    if single:
+        lists.append(single)  # type: ignore[arg-type]
+    return lists[0] if len(lists) == 1 else heapq.merge(*lists)
+
+
+def _set_bits(buf: bytearray, ids: Sequence[int]) -> None:
+    # ids are ascending, so the last one sizes the buffer
+    if ids and (ids[-1] >> 3) >= len(buf):
+        buf.extend(bytes((ids[-1] >> 3) + 1 - len(buf)))
+    for i in ids:
+        buf[i >> 3] |= 1 << (i & 7)
+
+
+def _to_bytes(bits: int) -> bytes:
+    return bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+
+
+_CHUNK = 1024
+_ZERO_CHUNK = bytes(_CHUNK)
+
+
+def _iter_bits(bits: int) -> Iterator[int]:
+    """Positions of the set bits of ``bits``, lowest first."""
+    data = _to_bytes(bits)
+    for start in range(0, len(data), _CHUNK):
+        # intersections are mostly zeros: skip empty stretches with a memcmp
+        if data[start : start + _CHUNK] == _ZERO_CHUNK:
+            continue
+        for m in _NONZERO.finditer(data, start, start + _CHUNK):
+            byte, base = data[m.start()], m.start() << 3
+            while byte:
+                low = byte & -byte
+                yield base + low.bit_length() - 1
+                byte ^= low
+
+
+def _filter_bits(ids: Iterable[int], data: bytes) -> Iterator[int]:
+    """The ``ids`` whose bit is set in ``data``."""
+    n = len(data)
+    for i in ids:
+        if i >> 3 < n and data[i >> 3] >> (i & 7) & 1:
+            yield i
+
+
+class _Term:
+    """One query word: its posting lists grouped by weight, best first."""
+
+    # posting lists up to this long go in a dict when probing; longer ones are bisected
+    SHORT = 16
+
+    def __init__(self, groups: list[tuple[int, list[Posting]]]) -> None:
+        self.groups = groups
+        self.size = sum(sum(map(_size, postings)) for _, postings in groups)
+        self.top = groups[0][0]
+        self._short: dict[int, int] | None = None
+        self._long: list[tuple[int, list[Posting]]] = []
+
+    def table(self) -> dict[int, int]:
+        """Best weight for every song this word matches."""
+        best: dict[int, int] = {}
+        for weight, postings in reversed(self.groups):
+            for p in postings:
+                best.update(dict.fromkeys((p,) if isinstance(p, int) else p, weight))
+        return best
+
+    def weight(self, song_id: int, default: int = 0) -> int:
+        """Weight of this word's best match in ``song_id``, ``default`` if none."""
+        if self._short is None:
+            # prefix expansion brings many one-song words; probe those with a single lookup
+            self._short = _Term([(w, [p for p in ps if _size(p) <= self.SHORT]) for w, ps in self.groups]).table()
+            self._long = [(w, [p for p in ps if _size(p) > self.SHORT]) for w, ps in self.groups]
+        best = self._short.get(song_id, 0)
+        for weight, postings in self._long:
+            if weight <= best:
+                break
+            for p in postings:
+                if _contains(p, song_id):
+                    return weight
+        return best or default
+
+
+class SearchIndex:
+    """Inverted index over song titles and artists, with prefix lookup.
+
+    Every normalized word maps to the ids of songs whose title (or artist)
+    contains it, one posting list per field. Ids are handed out in
+    increasing order, so adding a song appends to its lists. Removed songs
+    stay in the lists and are filtered through ``alive`` until they make up
+    half the index, when the lists are rebuilt.
+
+    For prefixes, words are also kept in a sorted vocabulary. New words go
+    to a small unsorted set that is scanned directly and merged into the
+    sorted list once it grows past ``FRESH_LIMIT``, so bulk adds never pay
+    for keeping the vocabulary sorted word by word.
+
+    ``search`` ANDs the query words, treating the last one as a prefix, and
+    ranks by summed match weight, then by id. It walks the rarest word's
+    posting lists best weight first and stops once no unseen song could
+    beat the results so far, so broad queries stay cheap on big libraries.
+    When even the rarest word matches thousands of songs, the other words
+    are first ANDed as bitmaps (cached for long posting lists) so only
+    songs matching all of them are visited.
+    """
+
+    FRESH_LIMIT = 512
+    # a prefix expands to at most this many vocabulary words
+    MAX_EXPANSIONS = 256
+    # words matching at most this many songs are probed through a dict
+    EAGER = 10_000
+    # posting lists at least this long get a bitmap (an int, bit i = song i) when
+    # intersected; the most recently used ones are kept
+    DENSE = 4096
+    BITMAP_CACHE = 64
+
+    def __init__(self, alive: Callable[[int], bool]) -> None:
+        self._alive = alive
+        self._title: dict[str, Posting] = {}
+        self._artist: dict[str, Posting] = {}
+        self._vocab: list[str] = []
+        self._fresh: set[str] = set()
+        self._size = 0
+        self._dead = 0
+        # id(posting) -> (posting, bits as bytearray, bits as int, ids covered, last id covered)
+        self._bitmaps: OrderedDict[int, tuple[array[int], bytearray, int, int, int]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return self._size - self._dead
+
+    def _post(self, postings: dict[str, Posting], other: dict[str, Posting], token: str, song_id: int) -> None:
+        p = postings.get(token)
+        if p is None:
+            if token not in other:
+                self._fresh.add(token)
+            postings[token] = song_id
+        elif isinstance(p, int):
+            postings[token] = array("q", (p, song_id) if p < song_id else (song_id, p))
+        elif p[-1] < song_id:
+            p.append(song_id)
+        else:
+            insort(p, song_id)
+
+    def add(self, song: Song) -> None:
+        song_id = song.id
+        for token in set(tokenize(song.title)):
+            self._post(self._title, self._artist, token, song_id)
+        for token in _artist_tokens(song.artist):
+            self._post(self._artist, self._title, token, song_id)
+        self._size += 1
+
+    def add_many(self, songs: Iterable[Song]) -> None:
+        for song in songs:
+            self.add(song)
+
+    def discard(self, song_id: int) -> None:
+        """Note that an indexed song is gone; its ids are dropped lazily."""
+        self._dead += 1
+        if self._dead > 1024 and self._dead * 2 > self._size:
+            self._prune()
+
+    def _prune(self) -> None:
+        alive = self._alive
+        for postings in (self._title, self._artist):
+            for token, p in list(postings.items()):
+                if isinstance(p, int):
+                    keep = p if alive(p) else None
+                else:
+                    ids = [i for i in p if alive(i)]
+                    keep = (ids[0] if len(ids) == 1 else array("q", ids)) if ids else None
+                if keep is None:
+                    del postings[token]
+                else:
+                    postings[token] = keep
+        self._vocab = sorted(self._title.keys() | self._artist.keys())
+        self._fresh.clear()
+        self._bitmaps.clear()
+        self._size -= self._dead
+        self._dead = 0
+
+    def _dense_bits(self, p: array[int]) -> int:
+        key = id(p)
+        cached = self._bitmaps.get(key)
+        if cached is None or cached[0] is not p or p[cached[3] - 1] != cached[4]:
+            # new, or an id was inserted out of order: start over
+            cached = (p, bytearray(), 0, 0, -1)
+        _, buf, bits, covered, _ = cached
+        if covered != len(p):
+            _set_bits(buf, p[covered:])
+            bits = int.from_bytes(buf, "little")
+        self._bitmaps[key] = (p, buf, bits, len(p), p[-1])
+        self._bitmaps.move_to_end(key)
+        if len(self._bitmaps) > self.BITMAP_CACHE:
+            self._bitmaps.popitem(last=False)
+        return bits
+
+    def _bits(self, postings: list[Posting]) -> int:
+        """Bitmap of every id in ``postings``."""
+        buf = bytearray()
+        bits = 0
+        for p in postings:
+            if isinstance(p, int):
+                continue
+            if len(p) >= self.DENSE:
+                bits |= self._dense_bits(p)
+            else:
+                _set_bits(buf, p)
+        _set_bits(buf, sorted(p for p in postings if isinstance(p, int)))
+        return bits | int.from_bytes(buf, "little")
+
+    def _expand(self, prefix: str) -> list[str]:
+        """Vocabulary words starting with ``prefix``, other than ``prefix`` itself."""
+        if len(self._fresh) > self.FRESH_LIMIT:
+            self._vocab.extend(sorted(self._fresh))
+            self._vocab.sort()  # two sorted runs: a linear merge
+            self._fresh.clear()
+        vocab = self._vocab
+        i = bisect_left(vocab, prefix)
+        if i < len(vocab) and vocab[i] == prefix:
+            i += 1
+        j = min(bisect_left(vocab, prefix + "\U0010ffff", i), i + self.MAX_EXPANSIONS)
+        out = vocab[i:j]
+        fresh = [t for t in self._fresh if t.startswith(prefix) and t != prefix]
+        return sorted(out + fresh)[: self.MAX_EXPANSIONS] if fresh else out
+
+    def _term(self, word: str, prefix: bool) -> _Term | None:
+        title, artist = self._title, self._artist
+        more = self._expand(word) if prefix else []
+        groups = [
+            (TITLE, [title[word]] if word in title else []),
+            (TITLE_PREFIX, [title[t] for t in more if t in title]),
+            (ARTIST, [artist[word]] if word in artist else []),
+            (ARTIST_PREFIX, [artist[t] for t in more if t in artist]),
+        ]
+        groups = [g for g in groups if g[1]]
+        return _Term(groups) if groups else None
+
+    def search(self, query: str, limit: int = 20) -> list[int]:
+        """Ids of up to ``limit`` songs matching every word of ``query``, best first."""
+        words = list(dict.fromkeys(tokenize(query)))
+        if not words or limit <= 0:
+            return []
+        # the word being typed is a prefix; a trailing space finishes it
+        prefix = not query[-1:].isspace()
+        terms = []
+        for i, word in enumerate(words):
+            term = self._term(word, prefix and i == len(words) - 1)
+            if term is None:
+                return []
+            terms.append(term)
+        terms.sort(key=lambda t: t.size)
+        driver, others = terms[0], terms[1:]
+        bound = sum(t.top for t in others)
+        # when even the rarest word is common, AND the words as bitmaps first instead of
+        # probing every candidate; worth it unless the other words are mostly short lists
+        mask = mask_bytes = None
+        if others and driver.size > self.EAGER // 4:
+            loose = sum(_size(p) for t in others for _, ps in t.groups for p in ps if _size(p) < self.DENSE)
+            if loose < driver.size:
+                mask = -1
+                for t in others:
+                    mask &= self._bits([p for _, ps in t.groups for p in ps])
+                if not mask:
+                    return []
+                mask_bytes = _to_bytes(mask)
+        # other words are probed per candidate: small ones go in a dict, big ones are bisected
+        lookups = [t.table().get if t.size <= min(self.EAGER, 4 * driver.size) else t.weight for t in others]
+        check_alive = self._alive if self._dead else None
+        # min-heap of (score, -id): the root is the weakest result kept
+        heap: list[tuple[int, int]] = []
+        seen: set[int] = set()
+        for weight, postings in driver.groups:
+            best_left = weight + bound
+            if len(heap) >= limit and heap[0][0] > best_left:
+                break
+            if mask is None:
+                candidates = _in_order(postings)
+            elif sum(map(_size, postings)) < self.DENSE:
+                candidates = _filter_bits(_in_order(postings), mask_bytes)
+            else:
+                candidates = _iter_bits(self._bits(postings) & mask)
+            for song_id in candidates:
+                if len(heap) >= limit and heap[0] >= (best_left, -song_id):
+                    # ids only grow from here, so nothing later in this group can get in
+                    break
+                if song_id in seen or (check_alive is not None and not check_alive(song_id)):
+                    continue
+                seen.add(song_id)
+                score = weight
+                for lookup in lookups:
+                    w = lookup(song_id, 0)
+                    if not w:
+                        break
+                    score += w
+                else:
+                    entry = (score, -song_id)
+                    if len(heap) < limit:
+                        heapq.heappush(heap, entry)
+                    elif entry > heap[0]:
+                        heapq.heapreplace(heap, entry)
+        return [-neg for _, neg in sorted(heap, reverse=True)]
+
@@ -0,0 +1,155 @@
+from __future__ import annotations
+from typing import Any, Callable, Optional
+
+_MASK = (1 << 64) - 1
+
+
+def _mix(seed: int, n: int) -> int:
+    # splitmix64 of (seed, n): the n-th draw depends only on the seed, so replays match
+    z = (seed + (n + 1) * 0x9E3779B97F4A7C15) & _MASK
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK
+    return z ^ (z >> 31)
+
+
+class ShuffleOrder:
+    """A lazily generated random permutation of song ids.
+
+    Think of an array of ids where slots ``[0, k)`` hold the songs played in
+    this pass, in order, and ``[k, n)`` the songs still to come. Picking the
+    next song is one Fisher–Yates step. Only slots that have been touched are
+    stored; untouched slot ``i`` holds id ``i + 1``, which is how playlists
+    number their songs, so turning shuffle on over a million songs allocates
+    nothing up front.
+
+    Ids in ``1..size`` that no longer exist are dropped when drawn, using
+    ``alive``. Songs added later join the unplayed part, and songs removed
+    while unplayed leave it in O(1).
+    """
+
+    def __init__(self, size: int, alive: Callable[[int], bool], seed: int) -> None:
+        self.seed = seed
+        self._alive = alive
+        self._base = size
+        self._n = size
+        self._k = 0
+        self._draws = 0
+        self._slots: dict[int, int] = {}
+        self._where: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return self._n
+
+    def _get(self, i: int) -> int:
+        return self._slots.get(i, i + 1)
+
+    def _set(self, i: int, song_id: int) -> None:
+        self._slots[i] = song_id
+        self._where[song_id] = i
+
+    def _swap(self, i: int, j: int) -> None:
+        if i != j:
+            a, b = self._get(i), self._get(j)
+            self._set(i, b)
+            self._set(j, a)
+
+    def _pos(self, song_id: int) -> int:
+        p = self._where.get(song_id)
+        if p is None:
+            p = song_id - 1 if song_id <= self._base else -1
+        return p if 0 <= p < self._n and self._get(p) == song_id else -1
+
+    def _drop(self, p: int) -> None:
+        self._swap(p, self._n - 1)
+        self._n -= 1
+        self._where.pop(self._get(self._n), None)
+        self._slots.pop(self._n, None)
+
+    def add(self, song_id: int) -> None:
+        self._set(self._n, song_id)
+        self._n += 1
+
+    def restore(self, song_id: int) -> None:
+        """Bring back a discarded song: unplayed again unless it never left its slot."""
+        if self._pos(song_id) < 0:
+            self.add(song_id)
+
+    def discard(self, song_id: int) -> None:
+        p = self._pos(song_id)
+        if p >= self._k:
+            self._drop(p)
+        # already played this pass: skipped when stepping back, dropped when drawn again
+
+    def start(self, song_id: Optional[int]) -> None:
+        """Begin a pass at ``song_id`` (the song playing when shuffle was turned on)."""
+        self._k = 0
+        p = self._pos(song_id) if song_id is not None else -1
+        if p >= 0:
+            self._swap(p, 0)
+            self._k = 1
+
+    def _draw(self, avoid: Optional[int]) -> Optional[int]:
+        if self._k >= self._n:
+            # everything played: start a new pass, keeping the last song out of the first draw
+            self._k = 0
+            p = self._pos(avoid) if avoid is not None else -1
+            if p >= 0 and self._n > 1:
+                self._swap(p, self._n - 1)
+        while self._k < self._n:
+            j = self._k + _mix(self.seed, self._draws) % (self._n - self._k)
+            self._draws += 1
+            self._swap(self._k, j)
+            song_id = self._get(self._k)
+            if self._alive(song_id):
+                self._k += 1
+                return song_id
+            self._drop(self._k)
+        return None
+
+    def after(self, song_id: int) -> Optional[int]:
+        """The song to play after ``song_id``: replays forward after stepping back, else draws."""
+        p = self._pos(song_id)
+        if p >= self._k:
+            # reached through the queue: count it as played in this pass
+            self._swap(p, self._k)
+            self._k += 1
+            p = self._k - 1
+        elif p < 0:
+            p = self._k - 1
+        for i in range(p + 1, self._k):
+            candidate = self._get(i)
+            if self._alive(candidate):
+                return candidate
+        return self._draw(song_id)
+
+    def before(self, song_id: int) -> Optional[int]:
+        """The song played before ``song_id`` in this pass, if any."""
+        p = self._pos(song_id)
+        if p < 0 or p >= self._k:
+            p = self._k
+        for i in range(p - 1, -1, -1):
+            candidate = self._get(i)
+            if self._alive(candidate):
+                return candidate
+        return None
+
+    def dump_state(self) -> dict[str, Any]:
+        return {
+            "seed": self.seed,
+            "base": self._base,
+            "n": self._n,
+            "k": self._k,
+            "draws": self._draws,
+            "slots": [x for item in self._slots.items() for x in item],
+        }
+
+    @classmethod
+    def load_state(cls, state: dict[str, Any], alive: Callable[[int], bool]) -> "ShuffleOrder":
+        order = cls(state["base"], alive, state["seed"])
+        order._n = state["n"]
+        order._k = state["k"]
+        order._draws = state["draws"]
+        slots = state["slots"]
+        for i in range(0, len(slots), 2):
+            order._set(slots[i], slots[i + 1])
+        return order
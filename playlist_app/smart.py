@@ -0,0 +1,196 @@
+from __future__ import annotations
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Iterable, Optional
+
+from .models import Song
+from .persistent import SongVector
+from .structures import Queue, Stack, _expect
+
+
+@dataclass(frozen=True, slots=True)
+class Rule:
+    """Which songs a smart playlist holds; every condition given must match.
+
+    ``artist`` is compared whole and ``title_contains`` as a substring, both
+    ignoring case; ``min_sec``/``max_sec`` bound the duration, inclusive.
+    """
+
+    artist: Optional[str] = None
+    title_contains: Optional[str] = None
+    min_sec: Optional[int] = None
+    max_sec: Optional[int] = None
+
+    def __post_init__(self) -> None:
+        if self.min_sec is not None and self.max_sec is not None and self.min_sec > self.max_sec:
+            raise ValueError("min_sec is above max_sec")
+
+    def to_json(self) -> dict[str, Any]:
+        return {k: v for k, v in asdict(self).items() if v is not None}
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> "Rule":
+        return cls(data.get("artist"), data.get("title_contains"), data.get("min_sec"), data.get("max_sec"))
+
+
+class SmartPlaylist:
+    """The songs of a playlist that match a ``Rule``, kept up to date as the library changes.
+
+    Members live in a ``SongVector`` (id order, which is playlist order), so
+    the playlist's adds and removes update the view in O(log n) each
+    instead of re-filtering the library, and a listing reads an O(1)
+    snapshot. The view plays as its own ring: a cursor, a queue and a
+    history of its own, with next and previous wrapping around at the ends.
+    Queue and history entries whose songs left the view are skipped when
+    reached. ``history`` builds that history from a lookup of members, so
+    the owning playlist can bound it the way it bounds its own; without it
+    the history is an unbounded ``Stack``.
+    """
+
+    def __init__(
+        self,
+        rule: Rule,
+        songs: Iterable[Song] = (),
+        history: Optional[Callable[[Callable[[int], Optional[Song]]], Stack[Song]]] = None,
+    ) -> None:
+        self.rule = rule
+        self._artist = rule.artist.casefold() if rule.artist is not None else None
+        self._title = rule.title_contains.casefold() if rule.title_contains is not None else None
+        self._songs = SongVector.build(song for song in songs if self.matches(song))
+        first = self._songs.after(None)
+        self._current: Optional[Song] = first[0] if first else None
+        self.up_next: Queue[Song] = Queue()
+        self.history: Stack[Song] = history(self._member) if history is not None else Stack()
+
+    def __len__(self) -> int:
+        return len(self._songs)
+
+    def __contains__(self, song_id: object) -> bool:
+        return isinstance(song_id, int) and self._songs.get(song_id) is not None
+
+    def matches(self, song: Song) -> bool:
+        if self._artist is not None and (song.artist or "").casefold() != self._artist:
+            return False
+        if self._title is not None and self._title not in (song.title or "").casefold():
+            return False
+        seconds = song.duration_sec or 0
+        if self.rule.min_sec is not None and seconds < self.rule.min_sec:
+            return False
+        return self.rule.max_sec is None or seconds <= self.rule.max_sec
+
+    def _member(self, song_id: int) -> Optional[Song]:
+        return self._songs.get(song_id)
+
+    def snapshot(self) -> SongVector:
+        """The view's songs as of now, in playlist order, in O(1)."""
+        return self._songs
+
+    # --- kept in step with the library ---
+
+    def add(self, song: Song) -> None:
+        """A song joined the library (or came back at its old id)."""
+        if self.matches(song):
+            self._songs = self._songs.set(song.id, song)
+            if self._current is None:
+                self._current = song
+
+    def add_many(self, songs: Iterable[Song]) -> None:
+        self._songs = self._songs.add_many(song for song in songs if self.matches(song))
+        if self._current is None:
+            first = self._songs.after(None)
+            self._current = first[0] if first else None
+
+    def discard(self, song_id: int) -> None:
+        """A song left the library; the cursor moves on to the next member if it was on it."""
+        if self._songs.get(song_id) is None:
+            return
+        self._songs = self._songs.set(song_id, None)
+        if self._current is not None and self._current.id == song_id:
+            self._current = self._wrap_after(song_id)
+
+    # --- playing ---
+
+    def play(self) -> Optional[Song]:
+        return self._current
+
+    def enqueue(self, song_id: int, lane: str = "end") -> Optional[int]:
+        """Queue a member of the view; returns the entry id, None if it is not one."""
+        song = self._songs.get(song_id)
+        return self.up_next.enqueue(song, lane) if song is not None else None
+
+    def next(self) -> Optional[Song]:
+        while True:
+            queued = self.up_next.dequeue()
+            if queued is None:
+                break
+            song = self._songs.get(queued.id)
+            if song is not None:
+                return self._move(song)
+        if self._current is None:
+            return None
+        return self._move(self._wrap_after(self._current.id))
+
+    def previous(self) -> Optional[Song]:
+        while True:
+            prev = self.history.pop()
+            if prev is None:
+                break
+            song = self._songs.get(prev.id)
+            if song is not None:
+                self._current = song
+                return song
+        if self._current is None:
+            return None
+        before = self._songs.before(self._current.id) or self._songs.before(None)
+        self._current = before[0] if before else None
+        return self._current
+
+    def _move(self, song: Optional[Song]) -> Optional[Song]:
+        if self._current is not None and song is not None:
+            self.history.push(self._current)
+        self._current = song
+        return song
+
+    def _wrap_after(self, song_id: int) -> Optional[Song]:
+        following = self._songs.after(song_id) or self._songs.after(None)
+        return following[0] if following else None
+
+    def dump_state(self) -> dict[str, Any]:
+        # entries that left the view would be skipped anyway, so they are not kept
+        return {
+            "rule": self.rule.to_json(),
+            "current": self._current.id if self._current is not None else None,
+            "queue": [[entry, lane, song.id] for entry, lane, song in self.up_next.entries() if song.id in self],
+            "queue_seq": self.up_next.next_entry_id,
+            "history": [song.id for song in self.history.dump() if song.id in self],
+        }
+
+    @classmethod
+    def load_state(
+        cls,
+        state: dict[str, Any],
+        songs: SongVector,
+        history: Optional[Callable[[Callable[[int], Optional[Song]]], Stack[Song]]] = None,
+    ) -> "SmartPlaylist":
+        """Rebuild a view over ``songs`` (the library); entries that are no longer members are dropped."""
+        view = cls(Rule.from_json(state["rule"]), songs, history)
+        current = state["current"]
+        view._current = view._songs.get(current) if current is not None else None
+        if view._current is None:
+            first = view._songs.after(None)
+            view._current = first[0] if first else None
+        for entry, lane, song_id in state["queue"]:
+            song = view._songs.get(song_id)
+            if song is not None:
+                view.up_next.enqueue(song, lane, entry)
+        view.up_next.next_entry_id = max(view.up_next.next_entry_id, state["queue_seq"])
+        for song_id in state["history"]:
+            song = view._songs.get(song_id)
+            if song is not None:
+                view.history.push(song)
+        return view
+
+    def check(self, library: list[Song]) -> None:
+        """Raise AssertionError unless the view holds exactly the matching songs of ``library``. O(n)."""
+        want = [song for song in library if self.matches(song)]
+        _expect(len(self._songs) == len(want) and all(a is b for a, b in zip(self._songs, want)), "smart playlist out of step with the library")
+        _expect(self._current is None if not want else self._current.id in self, "smart playlist cursor is not a member")
@@ -0,0 +1,102 @@
+from __future__ import annotations
+from array import array
+from typing import Optional
+
+from .models import Song, _song_json
+
+
+class SongTable:
+    """Columnar song storage for large libraries.
+
+    Ids and durations live in ``array`` buffers, artists are stored once and
+    referenced by index, titles sit in a shared list and audio URLs in a
+    sparse dict (most songs have none until they are played). Playlists built
+    with a table hold ``TableSong`` handles instead of ``Song`` objects.
+    """
+
+    def __init__(self) -> None:
+        self.ids = array("q")
+        self.durations = array("l")
+        self.artist_idx = array("L")
+        self.titles: list[str] = []
+        self.artists: list[str] = []
+        self._artist_pos: dict[str, int] = {}
+        self.audio_urls: dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _artist(self, artist: str) -> int:
+        pos = self._artist_pos.get(artist)
+        if pos is None:
+            pos = self._artist_pos[artist] = len(self.artists)
+            self.artists.append(artist)
+        return pos
+
+    def add(self, song_id: int, title: str, artist: str, duration_sec: int = 0, audio_url: str | None = None) -> "TableSong":
+        row = len(self.ids)
+        self.ids.append(song_id)
+        self.durations.append(duration_sec)
+        self.artist_idx.append(self._artist(artist))
+        self.titles.append(title)
+        if audio_url:
+            self.audio_urls[row] = audio_url
+        return TableSong(self, row)
+
+
+class TableSong:
+    """A ``Song``-shaped handle onto one row of a ``SongTable``.
+
+    Rows are never reused, so a handle stays valid after its song is removed
+    from a playlist (history and the queue may still reference it).
+    """
+
+    __slots__ = ("_table", "row")
+
+    def __init__(self, table: SongTable, row: int) -> None:
+        self._table = table
+        self.row = row
+
+    @property
+    def id(self) -> int:
+        return self._table.ids[self.row]
+
+    @property
+    def title(self) -> str:
+        return self._table.titles[self.row]
+
+    @property
+    def artist(self) -> str:
+        t = self._table
+        return t.artists[t.artist_idx[self.row]]
+
+    @property
+    def duration_sec(self) -> int:
+        return self._table.durations[self.row]
+
+    @property
+    def audio_url(self) -> Optional[str]:
+        return self._table.audio_urls.get(self.row)
+
+    @audio_url.setter
+    def audio_url(self, value: Optional[str]) -> None:
+        if value:
+            self._table.audio_urls[self.row] = value
+        else:
+            self._table.audio_urls.pop(self.row, None)
+
+    def to_song(self) -> Song:
+        return Song(self.id, self.title, self.artist, self.duration_sec, self.audio_url)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, TableSong):
+            return self._table is other._table and self.row == other.row
+        return NotImplemented
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f"TableSong(id={self.id!r}, title={self.title!r}, artist={self.artist!r})"
+
+    __str__ = Song.__str__
+    to_json = _song_json
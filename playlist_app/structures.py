@@ -1,10 +1,18 @@
 from __future__ import annotations
+import tempfile
+from array import array
 from dataclasses import dataclass
-from typing import Generic, Iterable, Iterator, Optional, TypeVar
+from typing import IO, Callable, Generic, Hashable, Iterable, Iterator, Optional, TypeVar
 
 T = TypeVar("T")
 
 
+def _expect(ok: bool, what: str) -> None:
+    # invariant checks must survive python -O, so no bare assert
+    if not ok:
+        raise AssertionError(what)
+
+
 class Stack(Generic[T]):
     def __init__(self) -> None:
         self._data: list[T] = []
@@ -27,41 +35,405 @@ class Stack(Generic[T]):
     def __iter__(self) -> Iterator[T]:
         return reversed(self._data)
 
+    def items(self, offset: int, limit: int) -> list[T]:
+        """``limit`` items starting ``offset`` below the top, newest first."""
+        end = len(self._data) - offset
+        if end <= 0:
+            return []
+        return self._data[max(end - limit, 0) : end][::-1]
 
-class Queue(Generic[T]):
-    def __init__(self) -> None:
+    def dump(self) -> list[T]:
+        """Every item, oldest first, for saving."""
+        return list(self._data)
+
+
+class BoundedStack(Generic[T]):
+    """A ``Stack`` that keeps only the newest ``capacity`` items in memory.
+
+    When the buffer fills up, its older half is either dropped or, with
+    ``spill_dir``, appended to an anonymous temp file as 8-byte ids
+    (``key``); halving keeps eviction amortised O(1) while push and pop stay
+    plain list operations. Popping past the buffer reads records back in
+    chunks and turns ids into items with ``resolve``. Items whose id no
+    longer resolves (songs removed from the library) are skipped, in the
+    buffer and in the file alike, and ``pop`` passes over them; ``peek``
+    does not, so reading the top never changes what is kept. ``len()`` and
+    the positions ``items`` takes count every record, skipped or not, so
+    pages never shift under a removal. ``dropped`` counts items lost
+    for good, so ``len() + dropped`` only moves on push/pop.
+    """
+
+    _READ_CHUNK = 4096
+
+    def __init__(
+        self,
+        capacity: int,
+        key: Callable[[T], int],
+        resolve: Callable[[int], Optional[T]],
+        spill_dir: Optional[str] = None,
+    ) -> None:
+        if capacity < 2:
+            raise ValueError("capacity must be at least 2")
+        self.capacity = capacity
+        self._key = key
+        self._resolve = resolve
+        self._spill_dir = spill_dir
         self._data: list[T] = []
-        self._head = 0
+        self._file: Optional[IO[bytes]] = None
+        self._spilled = 0
+        self.dropped = 0
 
-    def enqueue(self, item: T) -> None:
+    def __len__(self) -> int:
+        return len(self._data) + self._spilled
+
+    def is_empty(self) -> bool:
+        return not self._data and not self._spilled
+
+    def push(self, item: T) -> None:
+        if len(self._data) >= self.capacity:
+            self._evict(self.capacity // 2)
         self._data.append(item)
 
-    def dequeue(self) -> Optional[T]:
-        if self._head < len(self._data):
-            item = self._data[self._head]
-            self._head += 1
-            # compact occasionally
-            if self._head > 32 and self._head > len(self._data) // 2:
-                self._data = self._data[self._head :]
-                self._head = 0
-            return item
+    def pop(self) -> Optional[T]:
+        self._settle()
+        return self._data.pop() if self._data else None
+
+    def peek(self) -> Optional[T]:
+        """The newest record, even one ``pop`` would pass over; unlike ``pop`` it changes nothing."""
+        if self._data:
+            return self._data[-1]
+        return next(iter(self), None)
+
+    def _settle(self) -> None:
+        # drop skipped items off the top until a live one (or nothing) is there
+        while True:
+            if not self._data:
+                self._refill()
+                if not self._data:
+                    return
+            if self._live(self._data[-1]):
+                return
+            self._data.pop()
+            self.dropped += 1
+
+    def _live(self, item: T) -> bool:
+        return self._resolve(self._key(item)) is not None
+
+    def __iter__(self) -> Iterator[T]:
+        yield from filter(self._live, reversed(self._data))
+        end = self._spilled
+        while end > 0:
+            start = max(end - self._READ_CHUNK, 0)
+            yield from self._read(start, end)
+            end = start
+
+    def items(self, offset: int, limit: int) -> list[T]:
+        """The items at positions ``offset`` to ``offset + limit`` below the top, newest first.
+
+        Skipped items are left out, so the list can be shorter than ``limit``
+        with more records still below it.
+        """
+        buffered = len(self._data)
+        end = buffered - offset
+        out = list(filter(self._live, self._data[max(end - limit, 0) : end][::-1])) if end > 0 else []
+        if offset + limit > buffered and self._spilled:
+            # the rest comes from the file; positions count back from its end
+            end = self._spilled - max(offset - buffered, 0)
+            if end > 0:
+                out += self._read(max(self._spilled - (offset + limit - buffered), 0), end)
+        return out
+
+    def dump(self) -> list[T]:
+        """Every item, oldest first, for saving: skipped items still in the buffer are kept, as they may resolve again."""
+        out: list[T] = []
+        for start in range(0, self._spilled, self._READ_CHUNK):
+            out += self._read(start, min(start + self._READ_CHUNK, self._spilled))[::-1]
+        return out + self._data
+
+    def _evict(self, n: int) -> None:
+        oldest = self._data[:n]
+        del self._data[:n]
+        if self._spill_dir is None:
+            self.dropped += n
+            return
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(dir=self._spill_dir or None)
+        self._file.seek(self._spilled * 8)
+        self._file.write(array("q", map(self._key, oldest)).tobytes())
+        self._spilled += n
+
+    def _read_ids(self, start: int, end: int) -> array:
+        assert self._file is not None
+        self._file.seek(start * 8)
+        ids = array("q")
+        ids.frombytes(self._file.read((end - start) * 8))
+        return ids
+
+    def _read(self, start: int, end: int) -> list[T]:
+        # records [start, end) from the file, newest first, skipping ids that no longer resolve
+        out = []
+        for item_id in reversed(self._read_ids(start, end)):
+            item = self._resolve(item_id)
+            if item is not None:
+                out.append(item)
+        return out
+
+    def _refill(self) -> None:
+        # move the newest file records back into the (empty) buffer
+        while self._spilled and not self._data:
+            start = max(self._spilled - self.capacity // 2, 0)
+            ids = self._read_ids(start, self._spilled)
+            self._spilled = start
+            for item_id in ids:
+                item = self._resolve(item_id)
+                if item is None:
+                    self.dropped += 1
+                else:
+                    self._data.append(item)
+        if self._file is not None and not self._spilled:
+            self._file.truncate(0)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.dropped += self._spilled
+        self._spilled = 0
+
+
+class _Ring(Generic[T]):
+    """Power-of-two ring buffer of entries for one queue lane.
+
+    Entry ids and items sit in parallel buffers, addressed by absolute
+    position (``head`` and ``tail`` only grow), so ``where`` can map an
+    entry id to its slot and removal just leaves a hole that ``popleft``
+    steps over. Pages come out as at most two list slices.
+    """
+
+    __slots__ = ("ids", "items", "mask", "head", "tail", "where")
+
+    def __init__(self, capacity: int = 16) -> None:
+        self.ids: list[Optional[int]] = [None] * capacity
+        self.items: list[Optional[T]] = [None] * capacity
+        self.mask = capacity - 1
+        self.head = 0
+        self.tail = 0
+        self.where: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.where)
+
+    def append(self, entry_id: int, item: T) -> None:
+        tail = self.tail
+        if tail - self.head > self.mask:
+            self._fill(self.live(), 2 * len(self.ids))
+            tail = self.tail
+        slot = tail & self.mask
+        self.ids[slot] = entry_id
+        self.items[slot] = item
+        self.where[entry_id] = tail
+        self.tail = tail + 1
+
+    def popleft(self) -> Optional[T]:
+        ids, mask = self.ids, self.mask
+        while self.head < self.tail:
+            slot = self.head & mask
+            entry_id = ids[slot]
+            self.head += 1
+            if entry_id is not None:
+                ids[slot] = None
+                del self.where[entry_id]
+                item, self.items[slot] = self.items[slot], None
+                return item
         return None
 
+    def first(self) -> Optional[int]:
+        """Slot of the front entry, if any."""
+        for pos in range(self.head, self.tail):
+            if self.ids[pos & self.mask] is not None:
+                return pos & self.mask
+        return None
+
+    def get(self, entry_id: int) -> Optional[T]:
+        pos = self.where.get(entry_id)
+        return self.items[pos & self.mask] if pos is not None else None
+
+    def remove(self, entry_id: int) -> bool:
+        pos = self.where.pop(entry_id, None)
+        if pos is None:
+            return False
+        self.ids[pos & self.mask] = None
+        self.items[pos & self.mask] = None
+        holes = self.tail - self.head - len(self.where)
+        if holes > 32 and holes > len(self.where):
+            self._fill(self.live(), len(self.ids))
+        return True
+
+    def live(self) -> list[tuple[int, T]]:
+        ids, items = self._span(self.ids), self._span(self.items)
+        return [(i, item) for i, item in zip(ids, items) if i is not None]  # type: ignore[misc]
+
+    def _span(self, buf: list, start: int = 0, stop: Optional[int] = None) -> list:
+        # buf[head + start : head + stop] in ring order, as one or two slices
+        n = self.tail - self.head
+        stop = n if stop is None else min(stop, n)
+        if start >= stop:
+            return []
+        a = (self.head + start) & self.mask
+        b = a + stop - start
+        return buf[a:b] if b <= len(buf) else buf[a:] + buf[: b - len(buf)]
+
+    def page(self, attr: str, start: int, stop: int) -> list:
+        """``ids`` or ``items`` (per ``attr``) at live positions ``[start, stop)``."""
+        if self.tail - self.head != len(self.where):
+            # holes break position arithmetic: squeeze them out once
+            self._fill(self.live(), len(self.ids))
+        return self._span(getattr(self, attr), start, stop)
+
+    def insert(self, index: int, entry_id: int, item: T) -> None:
+        entries = self.live()
+        entries.insert(index, (entry_id, item))
+        capacity = len(self.ids)
+        self._fill(entries, capacity if len(entries) <= capacity else 2 * capacity)
+
+    def _fill(self, entries: list[tuple[int, T]], capacity: int) -> None:
+        pad = [None] * (capacity - len(entries))
+        self.ids = [entry_id for entry_id, _ in entries] + pad
+        self.items = [item for _, item in entries] + pad
+        self.mask = capacity - 1
+        self.head = 0
+        self.tail = len(entries)
+        self.where = {entry_id: pos for pos, (entry_id, _) in enumerate(entries)}
+
+    def check(self) -> None:
+        _expect(0 <= self.tail - self.head <= len(self.ids) == self.mask + 1, "ring bounds")
+        _expect(len(self.ids) == len(self.items), "ring buffers differ in length")
+        for entry_id, pos in self.where.items():
+            _expect(self.head <= pos < self.tail, f"entry {entry_id} outside the ring")
+            _expect(self.ids[pos & self.mask] == entry_id, f"entry {entry_id} not at its slot")
+        live = sum(i is not None for i in self._span(self.ids))
+        _expect(live == len(self.where), "ring holds entries missing from its index")
+
+
+class Queue(Generic[T]):
+    """FIFO queue with two lanes: everything in ``"next"`` plays before ``"end"``.
+
+    Each lane is a ring buffer, so enqueue and dequeue are O(1) and only a
+    full buffer (doubling) or a build-up of removed entries ever copies.
+    Every enqueue gets an entry id; ``remove`` finds the entry through the
+    lane's id index in O(1) and leaves a hole. ``move`` re-inserts an entry
+    at a new position and is O(queue length).
+    """
+
+    LANES = ("next", "end")
+
+    def __init__(self) -> None:
+        self._next: _Ring[T] = _Ring()
+        self._end: _Ring[T] = _Ring()
+        self._lanes = {"next": self._next, "end": self._end}
+        self.next_entry_id = 1
+
+    def enqueue(self, item: T, lane: str = "end", entry_id: Optional[int] = None) -> int:
+        """Add ``item`` to the back of ``lane``; returns its entry id."""
+        if entry_id is None:
+            entry_id = self.next_entry_id
+            self.next_entry_id += 1
+        elif entry_id >= self.next_entry_id:
+            self.next_entry_id = entry_id + 1
+        (self._end if lane == "end" else self._lanes[lane]).append(entry_id, item)
+        return entry_id
+
+    def dequeue(self) -> Optional[T]:
+        if self._next.where:
+            return self._next.popleft()
+        return self._end.popleft() if self._end.where else None
+
     def peek(self) -> Optional[T]:
-        return self._data[self._head] if self._head < len(self._data) else None
+        for ring in (self._next, self._end):
+            slot = ring.first()
+            if slot is not None:
+                return ring.items[slot]
+        return None
 
     def is_empty(self) -> bool:
-        return self._head >= len(self._data)
+        return not self._next.where and not self._end.where
 
     def __len__(self) -> int:
-        return len(self._data) - self._head
+        return len(self._next.where) + len(self._end.where)
+
+    def lane_size(self, lane: str) -> int:
+        return len(self._lanes[lane])
+
+    def _page(self, attr: str, offset: int, limit: Optional[int]) -> list:
+        # one buffer ("ids" or "items") across both lanes, in play order
+        start = max(offset, 0)
+        stop = len(self) if limit is None else start + limit
+        nxt, end = self._next, self._end
+        split = len(nxt.where)
+        if start >= split:
+            return end.page(attr, start - split, stop - split)
+        out = nxt.page(attr, start, stop)
+        if stop > split:
+            out += end.page(attr, 0, stop - split)
+        return out
 
     def __iter__(self) -> Iterator[T]:
-        for i in range(self._head, len(self._data)):
-            yield self._data[i]
+        for ring in (self._next, self._end):
+            for _, item in ring.live():
+                yield item
+
+    def entries(self, offset: int = 0, limit: Optional[int] = None) -> list[tuple[int, str, T]]:
+        """``(entry id, lane, item)`` in play order, starting ``offset`` places from the front."""
+        ids = self._page("ids", offset, limit)
+        items = self._page("items", offset, limit)
+        # the first lane_size("next") places are in the "next" lane
+        split = len(self._next.where) - max(offset, 0)
+        return [(entry_id, "next" if i < split else "end", item) for i, (entry_id, item) in enumerate(zip(ids, items))]
+
+    def items(self, offset: int, limit: int) -> list[T]:
+        """``limit`` items starting ``offset`` places from the front."""
+        return self._page("items", offset, limit)
+
+    def get(self, entry_id: int) -> Optional[T]:
+        item = self._next.get(entry_id)
+        return item if item is not None else self._end.get(entry_id)
+
+    def first_in(self, lane: str) -> Optional[int]:
+        """Entry id at the front of ``lane``, if any."""
+        ring = self._lanes[lane]
+        slot = ring.first()
+        return ring.ids[slot] if slot is not None else None
 
+    def remove(self, entry_id: int) -> bool:
+        return self._next.remove(entry_id) or self._end.remove(entry_id)
 
-@dataclass
+    def move(self, entry_id: int, index: int) -> Optional[str]:
+        """Move an entry to position ``index`` in play order; returns the lane it lands in.
+
+        Positions before the end of the ``"next"`` lane go into that lane,
+        the rest into ``"end"``.
+        """
+        item = self.get(entry_id)
+        if item is None or not self.remove(entry_id):
+            return None
+        index = min(max(index, 0), len(self))
+        split = len(self._next)
+        if index < split:
+            self._next.insert(index, entry_id, item)
+            return "next"
+        self._end.insert(index - split, entry_id, item)
+        return "end"
+
+    def check(self) -> None:
+        """Raise AssertionError unless both lanes and their id indexes agree."""
+        self._next.check()
+        self._end.check()
+        _expect(not self._next.where.keys() & self._end.where.keys(), "entry in both lanes")
+        _expect(all(e < self.next_entry_id for e in self._next.where.keys() | self._end.where.keys()), "entry id ahead of next_entry_id")
+
+
+# slotted and compared by identity: one per song, so keep them small
+@dataclass(slots=True, eq=False)
 class _Node(Generic[T]):
     value: T
     prev: Optional["_Node[T]"] = None
@@ -69,9 +441,12 @@ class _Node(Generic[T]):
 
 
 class CircularDoublyLinkedList(Generic[T]):
-    def __init__(self, items: Optional[Iterable[T]] = None) -> None:
+    def __init__(self, items: Optional[Iterable[T]] = None, key: Optional[Callable[[T], Hashable]] = None) -> None:
         self._head: Optional[_Node[T]] = None
         self._size = 0
+        # optional key -> node index for O(1) lookup and unlink
+        self._key = key
+        self._index: dict[Hashable, _Node[T]] = {}
         if items:
             for item in items:
                 self.append(item)
@@ -85,7 +460,10 @@ class CircularDoublyLinkedList(Generic[T]):
     def head(self) -> Optional[T]:
         return self._head.value if self._head else None
 
-    def append(self, value: T) -> None:
+    def head_node(self) -> Optional[_Node[T]]:
+        return self._head
+
+    def append(self, value: T) -> _Node[T]:
         node = _Node(value)
         if not self._head:
             node.prev = node.next = node
@@ -98,26 +476,82 @@ class CircularDoublyLinkedList(Generic[T]):
             tail.next = node
             self._head.prev = node
         self._size += 1
+        if self._key is not None:
+            self._index[self._key(value)] = node
+        return node
+
+    def insert_before(self, node: _Node[T], value: T) -> _Node[T]:
+        """Link ``value`` in just ahead of ``node``; ahead of the head it becomes the new head."""
+        new = _Node(value, node.prev, node)
+        node.prev.next = new  # type: ignore[union-attr]
+        node.prev = new
+        if node is self._head:
+            self._head = new
+        self._size += 1
+        if self._key is not None:
+            self._index[self._key(value)] = new
+        return new
+
+    def extend(self, values: Iterable[T]) -> Optional[_Node[T]]:
+        """Append many values in one pass; returns the first new node."""
+        first: Optional[_Node[T]] = None
+        last: Optional[_Node[T]] = None
+        count = 0
+        key, index = self._key, self._index
+        for value in values:
+            node = _Node(value, last)
+            if last is None:
+                first = node
+            else:
+                last.next = node
+            last = node
+            if key is not None:
+                index[key(value)] = node
+            count += 1
+        if first is None or last is None:
+            return None
+        if self._head is None:
+            self._head = first
+        else:
+            tail = self._head.prev
+            assert tail is not None
+            tail.next = first
+            first.prev = tail
+        last.next = self._head
+        self._head.prev = last
+        self._size += count
+        return first
+
+    def remove_node(self, node: _Node[T]) -> None:
+        if self._size == 1:
+            self._head = None
+        else:
+            node.prev.next = node.next  # type: ignore[union-attr]
+            node.next.prev = node.prev  # type: ignore[union-attr]
+            if node is self._head:
+                self._head = node.next
+        self._size -= 1
+        if self._key is not None:
+            self._index.pop(self._key(node.value), None)
+        # detach so stale references cannot walk back into the ring
+        node.prev = node.next = None
 
     def remove(self, value: T) -> bool:
-        if not self._head:
+        node = self.find_node(value)
+        if node is None:
             return False
-        curr = self._head
-        for _ in range(self._size):
-            if curr.value == value:
-                if self._size == 1:
-                    self._head = None
-                else:
-                    curr.prev.next = curr.next  # type: ignore[union-attr]
-                    curr.next.prev = curr.prev  # type: ignore[union-attr]
-                    if curr is self._head:
-                        self._head = curr.next
-                self._size -= 1
-                return True
-            curr = curr.next  # type: ignore[assignment]
-        return False
+        self.remove_node(node)
+        return True
+
+    def find_by_key(self, key: Hashable) -> Optional[_Node[T]]:
+        if self._key is None:
+            raise TypeError("list was created without a key function")
+        return self._index.get(key)
 
     def find_node(self, value: T) -> Optional[_Node[T]]:
+        if self._key is not None:
+            node = self._index.get(self._key(value))
+            return node if node is not None and node.value == value else None
         if not self._head:
             return None
         curr = self._head
@@ -156,3 +590,21 @@ class CircularDoublyLinkedList(Generic[T]):
     def node_before(self, node: _Node[T]) -> _Node[T]:
         assert node.prev is not None
         return node.prev
+
+    def check(self) -> None:
+        """Raise AssertionError unless every link is mirrored, the size is right and the index matches the ring."""
+        if self._head is None:
+            _expect(self._size == 0 and not self._index, "empty ring with a size or index")
+            return
+        node, seen = self._head, 0
+        while True:
+            _expect(node.next is not None and node.next.prev is node, "next.prev does not point back")
+            if self._key is not None:
+                _expect(self._index.get(self._key(node.value)) is node, "index does not point at ring node")
+            seen += 1
+            _expect(seen <= self._size, "ring longer than its size")
+            node = node.next
+            if node is self._head:
+                break
+        _expect(seen == self._size, "ring shorter than its size")
+        _expect(self._key is None or len(self._index) == self._size, "index holds nodes outside the ring")
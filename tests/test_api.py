@@ -0,0 +1,130 @@
+"""The HTTP API through its ASGI app, one fresh session per test."""
+from __future__ import annotations
+import asyncio
+import json
+import os
+from typing import Any, Awaitable, Callable
+
+# nothing in these tests may reach the real preview search
+os.environ.setdefault("PREVIEW_SEARCH_URL", "http://127.0.0.1:9/search")
+
+import httpx  # noqa: E402
+
+from playlist_api import server  # noqa: E402
+
+Client = Callable[..., Awaitable[httpx.Response]]
+
+
+def _run(test: Callable[[Client], Awaitable[None]]) -> None:
+    async def main() -> None:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test") as client:
+            r = await client.get("/play", headers={"x-session-token": "new"})
+            token = r.headers["set-cookie"].split(";", 1)[0].split("=", 1)[1]
+
+            async def call(method: str, path: str, **kwargs: Any) -> httpx.Response:
+                headers = {"x-session-token": token, **kwargs.pop("headers", {})}
+                return await client.request(method, path, headers=headers, **kwargs)
+
+            try:
+                await test(call)
+            finally:
+                # leave the shared session manager as it was for the checks in test_checks.py
+                server.sessions.drop(token)
+
+    asyncio.run(main())
+
+
+async def _titles(call: Client) -> list[str]:
+    r = await call("GET", "/songs")
+    r.raise_for_status()
+    return [song["title"] for song in r.json()]
+
+
+def test_import_with_a_bad_audio_url_is_rejected() -> None:
+    async def test(call: Client) -> None:
+        before = await _titles(call)
+        body = '{"title": "A", "artist": "X", "audio_url": "https://example.com/a.mp3"}\n{"title": "B", "artist": "X", "audio_url": 7}\n'
+        r = await call("POST", "/songs/import?format=ndjson", content=body)
+        assert r.status_code == 422
+        assert r.json()["detail"]["imported"] == 0 and "line 2" in r.json()["detail"]["error"]
+        assert await _titles(call) == before
+
+    _run(test)
+
+
+def test_failing_batch_changes_nothing() -> None:
+    async def test(call: Client) -> None:
+        before = [(await call("GET", path)).json() for path in ("/songs", "/play", "/queue", "/favorites")]
+        ops = [
+            {"op": "add", "title": "New", "artist": "X", "audio_url": "https://example.com/new.mp3"},
+            {"op": "favorite", "ref": 0},
+            {"op": "enqueue", "ref": 0, "lane": "next"},
+            {"op": "next"},
+            {"op": "remove", "song_id": 999},
+        ]
+        r = await call("POST", "/batch", json={"ops": ops})
+        assert r.status_code == 422 and r.json()["detail"]["index"] == 4
+        assert [(await call("GET", path)).json() for path in ("/songs", "/play", "/queue", "/favorites")] == before
+
+        r = await call("POST", "/batch", json={"ops": ops[:-1]})
+        assert r.status_code == 200 and len(r.json()["results"]) == 4
+        assert (await call("GET", "/play")).json()["song"]["title"] == "New"
+        # the whole batch is one undo step
+        await call("POST", "/undo")
+        assert (await call("GET", "/songs")).json() == before[0]
+
+    _run(test)
+
+
+def test_unchanged_listings_answer_304() -> None:
+    async def test(call: Client) -> None:
+        songs, queue = await call("GET", "/songs"), await call("GET", "/queue")
+        assert (await call("GET", "/songs", headers={"If-None-Match": songs.headers["etag"]})).status_code == 304
+
+        await call("POST", "/songs", json={"title": "New", "artist": "X", "audio_url": "https://example.com/new.mp3"})
+        r = await call("GET", "/songs", headers={"If-None-Match": songs.headers["etag"]})
+        assert r.status_code == 200 and r.headers["etag"] != songs.headers["etag"] and r.json()[-1]["title"] == "New"
+        # the queue has its own version, which adding a song leaves alone
+        assert (await call("GET", "/queue", headers={"If-None-Match": queue.headers["etag"]})).status_code == 304
+
+        await call("POST", "/queue", json={"song_id": 1})
+        assert (await call("GET", "/queue", headers={"If-None-Match": queue.headers["etag"]})).status_code == 200
+
+    _run(test)
+
+
+async def _pages(call: Client, path: str, limit: int) -> list[list[dict]]:
+    pages, cursor = [], None
+    while True:
+        params = {"limit": limit} if cursor is None else {"limit": limit, "cursor": cursor}
+        r = await call("GET", path, params=params)
+        pages.append(r.json())
+        cursor = r.headers.get("x-next-cursor")
+        if cursor is None:
+            return pages
+
+
+def test_cursor_pages_cover_the_listing_once() -> None:
+    async def test(call: Client) -> None:
+        body = "".join('{"title": "Song %d", "artist": "X", "audio_url": "https://example.com/%d.mp3"}\n' % (i, i) for i in range(23))
+        await call("POST", "/songs/import", content=body, headers={"Content-Type": "application/x-ndjson"})
+        everything = (await call("GET", "/songs")).json()
+        pages = await _pages(call, "/songs", 5)
+        assert [len(p) for p in pages] == [5, 5, 5, 5, 5, 2]
+        assert [s for p in pages for s in p] == everything
+
+        # a song id cursor survives removals before it
+        r = await call("GET", "/songs", params={"limit": 5})
+        await call("DELETE", f"/songs/{everything[0]['id']}")
+        r = await call("GET", "/songs", params={"limit": 5, "cursor": r.headers["x-next-cursor"]})
+        assert r.json() == everything[5:10]
+
+        streamed = (await call("GET", "/songs", params={"format": "ndjson"})).text.splitlines()
+        assert [json.loads(line) for line in streamed] == everything[1:]
+
+        for _ in range(7):
+            await call("POST", "/next")
+        history = (await call("GET", "/history")).json()
+        assert len(history) == 7 and [s for p in await _pages(call, "/history", 3) for s in p] == history
+
+    _run(test)
@@ -0,0 +1,30 @@
+"""Short, fixed-seed runs of the randomized checks in ``benchmarks``.
+
+The full runs (``python -m benchmarks.concurrency``, ``benchmarks.differential``)
+take minutes; these cover a few hundred operations each so a regression
+shows up in the test run.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from benchmarks import concurrency, differential
+
+
+@pytest.mark.parametrize("options", [{}, {"history_cap": 8, "spill_dir": ""}], ids=["unbounded", "history-cap-8"])
+def test_implementations_agree(options: dict) -> None:
+    for seed in range(3):
+        assert differential.run(seed, 300, options) is None
+
+
+def test_concurrent_requests_keep_invariants_and_replay(tmp_path: Path) -> None:
+    args = argparse.Namespace(
+        sessions=2, songs=50, requests=400, clients=20, threads=1, hold_ms=5, compact_every=200, seed=0
+    )
+    out = asyncio.run(concurrency.run(args, str(tmp_path)))
+    assert out["failed"] == 0
+    assert out["replay_diverged"] == 0
+    assert out["playlists_checked"] > 0
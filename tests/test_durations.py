@@ -0,0 +1,51 @@
+"""Timeline queries against sums over the song list, through adds, removes and undo."""
+from __future__ import annotations
+import random
+from itertools import accumulate
+
+import pytest
+
+from playlist_app.playlist import CircularPlaylist, ListPlaylist
+
+
+def _expect_timeline(pl) -> None:
+    songs = pl.list_songs()
+    starts = [0, *accumulate(s.duration_sec for s in songs)]
+    assert pl.total_duration() == starts[-1]
+    for position, song in enumerate(songs):
+        assert pl.song_at(position) == (song, starts[position])
+        if song.duration_sec:
+            # the song's last second, not the next song's first
+            assert pl.song_at_offset(starts[position + 1] - 1) == (song, song.duration_sec - 1)
+    assert pl.song_at(len(songs)) is None and pl.song_at_offset(starts[-1]) is None
+
+
+@pytest.mark.parametrize("cls", [CircularPlaylist, ListPlaylist])
+def test_timeline_follows_library_changes(cls) -> None:
+    rng = random.Random(3)
+    pl = cls()
+    pl.add_songs_bulk((f"Song {i}", "Artist", rng.choice((0, 30, 200)), None) for i in range(20))
+    _expect_timeline(pl)
+    for _ in range(60):
+        r = rng.random()
+        songs = pl.list_songs()
+        if r < 0.4 and songs:
+            pl.remove_song(rng.choice(songs).id)
+        elif r < 0.7:
+            pl.add_song("Added", "Artist", rng.randint(0, 300))
+        elif r < 0.85:
+            pl.undo()
+        else:
+            pl.redo()
+        _expect_timeline(pl)
+
+
+@pytest.mark.parametrize("cls", [CircularPlaylist, ListPlaylist])
+def test_seek_and_progress(cls) -> None:
+    pl = cls()
+    pl.add_songs_bulk((f"Song {i}", "Artist", 100, None) for i in range(4))
+    assert pl.progress() == {"songs": 4, "total_sec": 400, "position": 0, "elapsed_sec": 0, "remaining_sec": 400}
+    song, into = pl.seek(250)
+    assert (song.id, into) == (3, 50) and pl.play().id == 3 and [s.id for s in pl.history] == [1]
+    assert pl.progress() == {"songs": 4, "total_sec": 400, "position": 2, "elapsed_sec": 200, "remaining_sec": 200}
+    assert pl.seek(400) is None and pl.play().id == 3
@@ -0,0 +1,83 @@
+"""History pages over a bounded, spilling history with songs removed from the library."""
+from __future__ import annotations
+
+import pytest
+
+from playlist_api.commands import _history_page
+from playlist_app.playlist import CircularPlaylist, ListPlaylist
+from playlist_app.smart import Rule
+from playlist_app.structures import BoundedStack
+
+
+def _pages(pl, n: int) -> list[int]:
+    ids, cursor = [], None
+    while True:
+        page, cursor = _history_page(pl, cursor, n)
+        ids += [song.id for song in page]
+        if cursor is None:
+            return ids
+
+
+@pytest.mark.parametrize("cls", [CircularPlaylist, ListPlaylist])
+def test_pages_cover_the_history_after_removals(cls, tmp_path) -> None:
+    pl = cls(history_cap=4, spill_dir=str(tmp_path))
+    pl.add_songs_bulk((f"Song {i}", "Artist", 60, None) for i in range(10))
+    for _ in range(30):
+        pl.next()
+    tag = pl.versions.tag("history")
+    for song_id in range(2, 6):
+        pl.remove_song(song_id)
+    assert pl.versions.tag("history") != tag
+
+    want = [song.id for song in pl.history]
+    assert want and not set(want) & {2, 3, 4, 5}
+    for n in (1, 2, 3, 5, 100):
+        assert _pages(pl, n) == want
+
+    tag = pl.versions.tag("history")
+    pl.undo()
+    assert pl.versions.tag("history") != tag
+    assert 5 in [song.id for song in pl.history]
+
+
+@pytest.mark.parametrize("cls", [CircularPlaylist, ListPlaylist])
+def test_peek_keeps_removed_songs(cls) -> None:
+    # the SSE encoder peeks after every push; that must not change what a journal replay rebuilds
+    pl = cls(history_cap=4)
+    pl.add_songs_bulk((f"Song {i}", "Artist", 60, None) for i in range(3))
+    pl.next()
+    pl.remove_song(1)
+    state = pl.dump_state()
+    assert pl.history.peek().id == 1
+    assert pl.dump_state() == state
+    pl.undo()
+    assert [song.id for song in pl.history] == [1]
+
+
+@pytest.mark.parametrize("cls", [CircularPlaylist, ListPlaylist])
+def test_smart_history_follows_the_history_cap(cls, tmp_path) -> None:
+    pl = cls(history_cap=4, spill_dir=str(tmp_path))
+    pl.add_songs_bulk((f"Song {i}", "Artist", 60 if i % 2 else 300, None) for i in range(20))
+    pl.set_smart("short", Rule(max_sec=120))
+    for _ in range(30):
+        pl.smart_next("short")
+    history = pl.smart["short"].history
+    assert isinstance(history, BoundedStack) and history.capacity == 4
+    # all 30 steps are kept, most of them in the spill file
+    assert len(history) == 30
+    assert history.peek().id == 20
+    assert [song.id for song in history.items(0, 30)] == list(range(20, 0, -2)) * 3
+
+    state = pl.dump_state()
+    again = cls.load_state(state, history_cap=4, spill_dir=str(tmp_path))
+    assert again.dump_state() == state
+    steps = [pl.smart_previous("short").id for _ in range(30)]
+    assert steps == [again.smart_previous("short").id for _ in range(30)]
+    assert steps == list(range(20, 0, -2)) * 3
+
+    capped = cls(history_cap=4)
+    capped.add_songs_bulk((f"Song {i}", "Artist", 60, None) for i in range(20))
+    capped.set_smart("all", Rule())
+    for _ in range(30):
+        capped.smart_next("all")
+    assert len(capped.smart["all"].history) <= 4
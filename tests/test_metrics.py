@@ -0,0 +1,55 @@
+"""Operation timing counts each call once; event streams stay out of request latency."""
+from __future__ import annotations
+import asyncio
+
+from playlist_api import metrics
+from playlist_app.playlist import CircularPlaylist, ListPlaylist
+
+
+def _observed(child) -> int:
+    return sum(child.counts)
+
+
+def test_nested_operations_are_timed_once() -> None:
+    # subclasses, so the wrappers do not stay on the real playlist classes
+    for base in (CircularPlaylist, ListPlaylist):
+        cls = type(f"Timed{base.__name__}", (base,), {})
+        impl = f"test-{base.__name__}"
+        metrics.time_methods(cls, impl, ("add_song", "add_songs_bulk", "remove_song", "next", "apply_batch", "undo"))
+        pl = cls()
+        pl.apply_batch([{"op": "add", "title": "A", "artist": "X"}, {"op": "add", "title": "B", "artist": "X"}])
+        pl.remove_song(1)
+        pl.undo()
+
+        def count(op: str) -> int:
+            return _observed(metrics.PLAYLIST_OPS.labels(impl, op))
+
+        assert count("apply_batch") == 1 and count("undo") == 1 and count("remove_song") == 1
+        # the batch's adds and the removal's move off the current song are part of the outer calls
+        assert count("add_songs_bulk") == 0 and count("add_song") == 0 and count("next") == 0
+
+
+async def _get(content_type: bytes) -> None:
+    async def app(scope, receive, send) -> None:
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", content_type)]})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def receive() -> dict:
+        return {"type": "http.request"}
+
+    async def send(message) -> None:
+        pass
+
+    await metrics.HTTPMetricsMiddleware(app)({"type": "http", "method": "GET", "path": "/x"}, receive, send)
+
+
+def test_event_streams_are_counted_but_not_timed() -> None:
+    latency = metrics.HTTP_LATENCY.labels("GET", "other")
+    requests = metrics.HTTP_REQUESTS.labels("GET", "other", "200")
+    timed, counted = _observed(latency), requests.value
+
+    asyncio.run(_get(b"text/event-stream"))
+    assert (_observed(latency), requests.value) == (timed, counted + 1)
+
+    asyncio.run(_get(b"application/json"))
+    assert (_observed(latency), requests.value) == (timed + 1, counted + 2)
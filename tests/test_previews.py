@@ -0,0 +1,156 @@
+"""PreviewResolver against a stand-in search server on 127.0.0.1."""
+from __future__ import annotations
+import asyncio
+import json
+import threading
+import time
+from collections import Counter
+from typing import Optional
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from playlist_api.commands import make_resolver
+from playlist_api.previews import PreviewCache
+
+
+class _Search(BaseHTTPRequestHandler):
+    # terms starting with "found" have a preview, "broken" ones fail with a 500; anything else has no results
+    hits: Counter[str] = Counter()
+
+    def do_GET(self) -> None:
+        term = parse_qs(urlparse(self.path).query)["term"][0]
+        self.hits[term] += 1
+        # slow enough that concurrent lookups overlap
+        time.sleep(0.2)
+        if term.casefold().startswith("found"):
+            body = json.dumps({"results": [{"previewUrl": f"https://previews.test/{term}.m4a"}]}).encode()
+            self.send_response(200)
+        elif term.casefold().startswith("broken"):
+            body = b"{}"
+            self.send_response(500)
+        else:
+            body = b'{"results": []}'
+            self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: object) -> None:
+        pass
+
+
+@pytest.fixture
+def search_url(monkeypatch: pytest.MonkeyPatch):
+    _Search.hits = Counter()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Search)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/search"
+    monkeypatch.setenv("PREVIEW_SEARCH_URL", url)
+    yield url
+    server.shutdown()
+    server.server_close()
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _resolver(clock: _Clock):
+    resolver = make_resolver()
+    resolver.cache = PreviewCache(ttl=100, negative_ttl=10, clock=clock)
+    return resolver
+
+
+def test_concurrent_lookups_share_one_request(search_url: str) -> None:
+    resolver = _resolver(_Clock())
+
+    async def run() -> list:
+        try:
+            return await asyncio.gather(*(resolver.resolve("Found", "Artist") for _ in range(20)))
+        finally:
+            await resolver.aclose()
+
+    urls = asyncio.run(run())
+    assert urls == ["https://previews.test/Found Artist.m4a"] * 20
+    assert _Search.hits == {"Found Artist": 1}
+
+
+def test_not_found_is_cached_until_the_negative_ttl_expires(search_url: str) -> None:
+    clock = _Clock()
+    resolver = _resolver(clock)
+
+    async def run() -> tuple[list, int]:
+        try:
+            seen = [await resolver.resolve("Missing", "Artist")]
+            clock.now = 9
+            seen.append(await resolver.resolve("missing ", " ARTIST"))
+            hits_within_ttl = _Search.hits["Missing Artist"]
+            clock.now = 11
+            seen.append(await resolver.resolve("Missing", "Artist"))
+            return seen, hits_within_ttl
+        finally:
+            await resolver.aclose()
+
+    seen, hits_within_ttl = asyncio.run(run())
+    assert seen == [None, None, None]
+    assert hits_within_ttl == 1
+    assert _Search.hits["Missing Artist"] == 2
+
+
+def test_found_is_refetched_after_the_ttl_expires(search_url: str) -> None:
+    clock = _Clock()
+    resolver = _resolver(clock)
+
+    async def run() -> int:
+        try:
+            await resolver.resolve("Found", "Artist")
+            clock.now = 99
+            await resolver.resolve("Found", "Artist")
+            hits_within_ttl = _Search.hits["Found Artist"]
+            clock.now = 101
+            await resolver.resolve("Found", "Artist")
+            return hits_within_ttl
+        finally:
+            await resolver.aclose()
+
+    assert asyncio.run(run()) == 1
+    assert _Search.hits["Found Artist"] == 2
+
+
+def test_failed_lookups_are_not_cached(search_url: str) -> None:
+    resolver = _resolver(_Clock())
+
+    async def run() -> list:
+        try:
+            return [await resolver.resolve("Broken", "Artist") for _ in range(2)]
+        finally:
+            await resolver.aclose()
+
+    assert asyncio.run(run()) == [None, None]
+    assert _Search.hits["Broken Artist"] == 2
+    assert len(resolver.cache) == 0
+
+
+def test_cancelled_caller_leaves_the_shared_lookup_running(search_url: str) -> None:
+    resolver = _resolver(_Clock())
+
+    async def run() -> Optional[str]:
+        try:
+            first = asyncio.create_task(resolver.resolve("Found", "Artist"))
+            second = asyncio.create_task(resolver.resolve("Found", "Artist"))
+            await asyncio.sleep(0.05)
+            first.cancel()
+            return await second
+        finally:
+            await resolver.aclose()
+
+    assert asyncio.run(run()) == "https://previews.test/Found Artist.m4a"
+    assert _Search.hits == {"Found Artist": 1}
@@ -0,0 +1,60 @@
+"""The two-lane up-next queue, alone and as playlists play from it."""
+from __future__ import annotations
+
+import pytest
+
+from playlist_app.playlist import CircularPlaylist, ListPlaylist
+from playlist_app.structures import Queue
+
+
+def _lanes(q: Queue) -> list[tuple[str, str]]:
+    return [(lane, item) for _, lane, item in q.entries()]
+
+
+def test_next_lane_plays_before_end_lane() -> None:
+    q: Queue[str] = Queue()
+    a = q.enqueue("a")
+    q.enqueue("b", "next")
+    q.enqueue("c")
+    q.enqueue("d", "next")
+    assert _lanes(q) == [("next", "b"), ("next", "d"), ("end", "a"), ("end", "c")]
+    assert q.lane_size("next") == 2 and q.first_in("end") == a
+
+    assert q.remove(a) and not q.remove(a)
+    # position 0 is in the "next" lane, the last position in "end"
+    assert q.move(q.first_in("end"), 0) == "next"
+    assert q.move(q.first_in("next"), 9) == "end"
+    assert _lanes(q) == [("next", "b"), ("next", "d"), ("end", "c")]
+    q.check()
+    assert [q.dequeue() for _ in range(4)] == ["b", "d", "c", None]
+
+
+def test_ring_buffers_wrap_and_grow() -> None:
+    q: Queue[int] = Queue()
+    model: list[int] = []
+    entries: dict[int, int] = {}
+    for i in range(200):
+        entries[i] = q.enqueue(i)
+        model.append(i)
+        if i % 3 == 0:
+            assert q.dequeue() == model.pop(0)
+        if i % 7 == 0 and model:
+            victim = model.pop(len(model) // 2)
+            assert q.remove(entries[victim])
+        q.check()
+        assert list(q) == model and len(q) == len(model)
+    assert q.items(5, 3) == model[5:8]
+
+
+@pytest.mark.parametrize("cls", [CircularPlaylist, ListPlaylist])
+def test_playlist_plays_the_queue_then_carries_on(cls) -> None:
+    pl = cls()
+    pl.add_songs_bulk((f"Song {i}", "Artist", 60, None) for i in range(6))
+    pl.enqueue_next(5)
+    pl.enqueue_next(3, "next")
+    entry = pl.enqueue_next(6)
+    assert pl.enqueue_next(99) is None
+    assert pl.move_queued(entry, 0) == "next"
+    assert [pl.next().id for _ in range(5)] == [6, 3, 5, 6, 1]
+    assert len(pl.up_next) == 0 and len(pl) == 6
+    pl.check()
@@ -0,0 +1,68 @@
+"""Radio picks: learned neighbours only, reproducible from the seed, and carried through a state dump."""
+from __future__ import annotations
+from collections import Counter
+
+import pytest
+
+from playlist_app.playlist import CircularPlaylist, ListPlaylist
+from playlist_app.radio import Radio
+
+
+def _row(radio: Radio, song_id: int) -> dict[int, int]:
+    for a, *flat in radio.dump_state()["rows"]:
+        if a == song_id:
+            return dict(zip(flat[::2], flat[1::2]))
+    return {}
+
+
+def test_picks_come_from_the_row_and_skip_recent_and_removed_songs() -> None:
+    removed = {4}
+    radio = Radio(7, lambda song_id: song_id not in removed, lambda song_id: song_id == 3)
+    radio.learn_all([1, 2, 1, 3, 1, 4, 1, 5])
+    assert _row(radio, 1) == {2: 3, 3: 3, 4: 3, 5: 2}
+    picks = Counter(radio.pick(1, recent=[5]) for _ in range(600))
+    assert set(picks) == {2, 3}
+    # the favorite counts double
+    assert 1.6 < picks[3] / picks[2] < 2.5
+    assert radio.pick(1, recent=[2, 3, 5]) is None and radio.pick(9, recent=[]) is None
+
+
+def test_same_seed_and_plays_pick_the_same_songs() -> None:
+    def picks(seed: int) -> list:
+        radio = Radio(seed, lambda _: True, lambda _: False)
+        radio.learn_all(i % 13 for i in range(0, 500, 7))
+        return [radio.pick(i % 13, recent=[]) for i in range(50)]
+
+    assert picks(1) == picks(1) != picks(2)
+
+
+def test_rows_keep_their_strongest_half_past_the_cap() -> None:
+    radio = Radio(0, lambda _: True, lambda _: False)
+    for b in range(2, Radio.ROW_CAP + 2):
+        radio.learn(1, b)
+    radio.learn(1, 2)
+    radio.learn(1, Radio.ROW_CAP + 2)
+    row = _row(radio, 1)
+    assert len(row) == Radio.ROW_CAP // 2 and row[2] == 4 and Radio.ROW_CAP + 2 not in row
+
+
+@pytest.mark.parametrize("cls", [CircularPlaylist, ListPlaylist])
+def test_radio_plays_learned_neighbours_and_replays_from_a_dump(cls) -> None:
+    pl = cls()
+    pl.add_songs_bulk((f"Song {i}", "Artist", 60, None) for i in range(40))
+    pl.set_radio(True, seed=5)
+    # teach it 1, 21, 2, 22, ...: long enough that the start has left the recent window
+    for i in range(1, 21):
+        pl.jump_to(i)
+        pl.jump_to(i + 20)
+    pl.jump_to(1)
+    # each step's only neighbour not played recently is the one it was taught
+    assert [pl.next().id for _ in range(6)] == [21, 2, 22, 3, 23, 4]
+
+    copy = cls.load_state(pl.dump_state())
+    assert [pl.next().id for _ in range(20)] == [copy.next().id for _ in range(20)]
+    pl.check()
+
+    pl.set_radio(False)
+    current = pl.play().id
+    assert pl.next().id == current % 40 + 1
@@ -0,0 +1,49 @@
+"""Playlist search: matching, ranking, and keeping up with library changes."""
+from __future__ import annotations
+
+import pytest
+
+from playlist_app.playlist import CircularPlaylist, ListPlaylist
+
+SONGS = [
+    ("Blue Moon", "Beyoncé"),
+    ("Moonlight", "Frank"),
+    ("Walking on the Moon", "The Police"),
+    ("Halo", "Beyoncé Knowles"),
+    ("Moon River", "Moonshine"),
+]
+
+
+def _titles(songs) -> list[str]:
+    return [song.title for song in songs]
+
+
+@pytest.mark.parametrize("cls", [CircularPlaylist, ListPlaylist])
+def test_search_matches_every_word_and_ranks_title_words_first(cls) -> None:
+    pl = cls()
+    pl.add_songs_bulk((title, artist, 60, None) for title, artist in SONGS)
+    # whole title words, then title prefixes, then artist matches; ties by id
+    assert _titles(pl.search("moon ")) == ["Blue Moon", "Walking on the Moon", "Moon River"]
+    assert _titles(pl.search("moon")) == ["Blue Moon", "Walking on the Moon", "Moon River", "Moonlight"]
+    # accents and case are ignored, and the last word may be partial
+    assert _titles(pl.search("BEYONCE bl")) == ["Blue Moon"]
+    assert _titles(pl.search("beyonc")) == ["Blue Moon", "Halo"]
+    assert _titles(pl.search("moon", limit=2)) == ["Blue Moon", "Walking on the Moon"]
+    assert pl.search("moon police river") == [] and pl.search("  ") == []
+
+
+@pytest.mark.parametrize("cls", [CircularPlaylist, ListPlaylist])
+def test_search_follows_adds_removes_and_undo(cls) -> None:
+    pl = cls()
+    pl.add_songs_bulk((title, artist, 60, None) for title, artist in SONGS)
+    assert _titles(pl.search("halo")) == ["Halo"]
+
+    pl.remove_song(4)
+    assert pl.search("halo") == []
+    pl.add_song("Halo Again", "Someone", 60)
+    assert _titles(pl.search("halo")) == ["Halo Again"]
+    pl.undo()
+    pl.undo()
+    assert _titles(pl.search("halo")) == ["Halo"]
+    pl.redo()
+    assert pl.search("halo") == []
@@ -0,0 +1,66 @@
+"""Smart playlists against filtering the library afresh, and playing them."""
+from __future__ import annotations
+import random
+
+import pytest
+
+from playlist_app.playlist import CircularPlaylist, ListPlaylist
+from playlist_app.smart import Rule
+
+RULES = {
+    "a": Rule(artist="artist a"),
+    "long": Rule(min_sec=150),
+    "love": Rule(title_contains="LOVE", max_sec=200),
+}
+
+
+def _check_views(pl) -> None:
+    library = pl.list_songs()
+    for name, view in pl.smart.items():
+        view.check(library)
+        assert [s.id for s in view.snapshot()] == [s.id for s in library if view.matches(s)], name
+
+
+@pytest.mark.parametrize("cls", [CircularPlaylist, ListPlaylist])
+def test_views_follow_adds_removes_undo_and_redo(cls) -> None:
+    rng = random.Random(11)
+    pl = cls()
+    pl.add_songs_bulk((rng.choice(("Love Song", "Other")), rng.choice(("Artist A", "Artist B")), rng.randint(0, 300), None) for _ in range(30))
+    for name, rule in RULES.items():
+        pl.set_smart(name, rule)
+    _check_views(pl)
+    for _ in range(100):
+        r = rng.random()
+        songs = pl.list_songs()
+        if r < 0.3 and songs:
+            pl.remove_song(rng.choice(songs).id)
+        elif r < 0.55:
+            pl.add_song(rng.choice(("Lovely", "Else")), rng.choice(("artist a", "Artist B")), rng.randint(0, 300))
+        elif r < 0.65:
+            pl.apply_batch([{"op": "add", "title": "Love", "artist": "Artist A", "duration_sec": 100}, {"op": "remove", "ref": 0}])
+        elif r < 0.8:
+            pl.undo()
+        elif r < 0.9:
+            pl.redo()
+        else:
+            pl.smart_next(rng.choice(list(RULES)))
+        _check_views(pl)
+
+
+@pytest.mark.parametrize("cls", [CircularPlaylist, ListPlaylist])
+def test_smart_playback_wraps_and_skips_songs_that_left(cls) -> None:
+    pl = cls()
+    pl.add_songs_bulk((f"Song {i}", "Artist", 100 if i % 2 else 300, None) for i in range(8))
+    view = pl.set_smart("short", Rule(max_sec=120))
+    assert [s.id for s in view.snapshot()] == [2, 4, 6, 8] and view.play().id == 2
+    assert [pl.smart_next("short").id for _ in range(5)] == [4, 6, 8, 2, 4]
+
+    # the main playlist's cursor is its own
+    assert pl.play().id == 1
+    assert pl.smart_enqueue("short", 1) is None and pl.smart_enqueue("short", 8) is not None
+    pl.remove_song(8)
+    pl.remove_song(4)
+    # the current song left: the cursor moved on, and the queued song that left is skipped
+    assert view.play().id == 6
+    assert [pl.smart_next("short").id for _ in range(2)] == [2, 6]
+    assert [pl.smart_previous("short").id for _ in range(3)] == [2, 6, 2]
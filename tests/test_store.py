@@ -0,0 +1,105 @@
+"""Evicted sessions stay on disk; only an explicit drop deletes one."""
+from __future__ import annotations
+from pathlib import Path
+
+from playlist_api.sessions import SessionManager
+from playlist_api.store import PlaylistStore
+
+
+def _open(directory: Path, **kwargs) -> tuple[SessionManager, PlaylistStore]:
+    manager = SessionManager(**kwargs)
+    store = PlaylistStore(directory)
+    store.open(manager)
+    return manager, store
+
+
+def _titles(manager: SessionManager, token: str) -> list[str]:
+    session = manager.get(token)
+    assert session is not None, f"session {token} is gone"
+    return [song.title for song in session.active().list_songs()]
+
+
+def _fill(manager: SessionManager, n: int) -> list[str]:
+    tokens = []
+    for i in range(n):
+        session, _ = manager.get_or_create(None)
+        session.active().add_song(f"Song {i}", "Artist", 100 + i)
+        tokens.append(session.token)
+    return tokens
+
+
+def test_evicted_session_survives_a_restart(tmp_path: Path) -> None:
+    manager, store = _open(tmp_path, max_sessions=2)
+    tokens = _fill(manager, 3)
+    assert len(manager) == 2 and manager.evictions == 1
+    store.close()
+
+    manager, store = _open(tmp_path, max_sessions=2)
+    assert [_titles(manager, token) for token in tokens] == [["Song 0"], ["Song 1"], ["Song 2"]]
+    store.close()
+
+
+def test_evicted_session_loads_back_and_keeps_journaling(tmp_path: Path) -> None:
+    manager, store = _open(tmp_path, max_sessions=1)
+    first, second = _fill(manager, 2)
+    store.close()
+    # wait for the parked file, so the reload below reads it from disk
+    assert (tmp_path / "parked" / f"{first}.json").exists()
+
+    manager, store = _open(tmp_path, max_sessions=1)
+    manager.get(first).active().add_song("Later", "Artist", 90)
+    assert _titles(manager, second) == ["Song 1"]
+    store.close()
+
+    manager, store = _open(tmp_path, max_sessions=1)
+    assert _titles(manager, first) == ["Song 0", "Later"]
+    store.close()
+
+
+def test_idle_sessions_survive_compaction(tmp_path: Path) -> None:
+    now = [0.0]
+    manager, store = _open(tmp_path, idle_ttl=10, clock=lambda: now[0])
+    (old,) = _fill(manager, 1)
+    now[0] = 20
+    (new,) = _fill(manager, 1)
+    assert len(manager) == 1
+    store.compact()
+    store.close()
+
+    manager, store = _open(tmp_path, idle_ttl=10, clock=lambda: now[0])
+    assert _titles(manager, old) == ["Song 0"]
+    assert _titles(manager, new) == ["Song 0"]
+    store.close()
+
+
+def test_drop_deletes_an_evicted_session(tmp_path: Path) -> None:
+    manager, store = _open(tmp_path, max_sessions=1)
+    first, second = _fill(manager, 2)
+    assert manager.drop(first)
+    store.close()
+
+    manager, store = _open(tmp_path, max_sessions=1)
+    assert manager.get(first) is None
+    assert _titles(manager, second) == ["Song 1"]
+    assert not (tmp_path / "parked" / f"{first}.json").exists()
+    store.close()
+
+
+def test_reopened_playlist_has_nothing_to_undo(tmp_path: Path) -> None:
+    manager, store = _open(tmp_path)
+    session, _ = manager.get_or_create(None)
+    pl = session.active()
+    pl.add_song("A", "Artist", 100)
+    pl.add_song("B", "Artist", 100)
+    pl.remove_song(2)
+    pl.undo()
+    assert pl.undo_depth() == (2, 1)
+    store.close()
+
+    manager, store = _open(tmp_path)
+    pl = manager.get(session.token).active()
+    # the replayed remove and restore must not pass for undo steps of their own
+    assert pl.undo_depth() == (0, 0)
+    assert not pl.undo()
+    assert _titles(manager, session.token) == ["A", "B"]
+    store.close()
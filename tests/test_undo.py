@@ -0,0 +1,40 @@
+"""Undo and redo around the song that is playing, on both playlist classes."""
+from __future__ import annotations
+
+import pytest
+
+from playlist_app.playlist import CircularPlaylist, ListPlaylist
+
+
+def _ids(pl) -> list[int]:
+    return [song.id for song in pl.list_songs()]
+
+
+@pytest.mark.parametrize("cls", [CircularPlaylist, ListPlaylist])
+def test_undo_and_redo_across_removing_the_current_song(cls) -> None:
+    pl = cls()
+    pl.add_songs_bulk((f"Song {i}", "Artist", 60, None) for i in range(5))
+    pl.jump_to(3)
+    pl.add_favorite(3)
+    pl.remove_song(3)
+    assert _ids(pl) == [1, 2, 4, 5] and pl.play().id == 4 and not pl.favorites
+    pl.check()
+
+    # the song comes back in its place and favorited again, but playback stays where it went
+    assert pl.undo()
+    assert _ids(pl) == [1, 2, 3, 4, 5] and pl.play().id == 4 and [s.id for s in pl.favorites] == [3]
+    pl.check()
+
+    # redo while it is current moves playback off it again
+    pl.jump_to(3)
+    assert pl.redo()
+    assert _ids(pl) == [1, 2, 4, 5] and pl.play().id == 4
+    pl.check()
+
+    assert pl.undo() and pl.undo()
+    assert _ids(pl) == [] and pl.play() is None
+    pl.check()
+    assert pl.redo() and pl.redo()
+    assert _ids(pl) == [1, 2, 4, 5] and pl.play().id == 1
+    assert not pl.redo() and pl.next().id == 2
+    pl.check()